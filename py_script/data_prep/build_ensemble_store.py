@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import argparse
+import os
+from pathlib import Path
+
+from mozzie.data_prep import build_ensemble_store, load_test_train
+
+
+def main(rel_config_path: str, workers: int):
+    main_dir = Path(__file__).resolve().parent.parent.parent
+
+    config_path = main_dir / rel_config_path
+    train_config, test_config = load_test_train(config_path)
+
+    build_ensemble_store(config_path.parent, train_config, workers, progress=True)
+    store_dir = build_ensemble_store(
+        config_path.parent, test_config, workers, progress=True
+    )
+    print(f"Ensemble store written to {store_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Gather the outputs of GDSiMS experiments into one store."
+    )
+    parser.add_argument(
+        "config_path",
+        type=str,
+        help="Relative path to the GDSiMS config file.",
+    )
+    workers = os.environ.get("WORKERS_FOR_MOZZIE", "4")
+    main(parser.parse_args().config_path, int(workers))
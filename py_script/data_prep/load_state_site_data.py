@@ -13,39 +13,48 @@ from mozzie.data_prep import (
 )
 
 
-def main(rel_config_path: str, state_timestamp: int):
+def main(rel_config_path: str, state_timestamps: list[int]):
     main_dir = Path(__file__).resolve().parent.parent.parent
 
     config_path = main_dir / rel_config_path
     train_config, test_config = load_test_train(config_path)
 
+    # Every LocalData file is read once for all of the timestamps
     sample_values_train = load_samples_values(
         config_path.parent, train_config, add_sites=True
     )
-    state_data_train = load_state_values(
-        config_path.parent, train_config, state_timestamp
-    )
-    X_train, y_train = construct_state_x_and_y(state_data_train, sample_values_train)
-
-    print("X train shape:", X_train.shape)
-    print("y train shape:", y_train.shape)
-
+    states_train = load_state_values(config_path.parent, train_config, state_timestamps)
     sample_values_test = load_samples_values(
         config_path.parent, test_config, add_sites=True
     )
-    state_data_test = load_state_values(
-        config_path.parent, test_config, state_timestamp
-    )
-    X_test, y_test = construct_state_x_and_y(state_data_test, sample_values_test)
-    print("X test shape:", X_test.shape)
-    print("y test shape:", y_test.shape)
+    states_test = load_state_values(config_path.parent, test_config, state_timestamps)
+
+    for tidx, state_timestamp in enumerate(state_timestamps):
+        state_data_train = dict(
+            zip(sample_values_train, states_train[:, tidx], strict=True)
+        )
+        X_train, y_train = construct_state_x_and_y(
+            state_data_train, sample_values_train
+        )
+        state_data_test = dict(
+            zip(sample_values_test, states_test[:, tidx], strict=True)
+        )
+        X_test, y_test = construct_state_x_and_y(state_data_test, sample_values_test)
+
+        print(f"Timestamp {state_timestamp}:")
+        print("X train shape:", X_train.shape)
+        print("y train shape:", y_train.shape)
+        print("X test shape:", X_test.shape)
+        print("y test shape:", y_test.shape)
 
-    processed_data_dir = config_path.parent / f"processed_site_state_{state_timestamp}"
-    processed_data_dir.mkdir(exist_ok=True)
-    pd.DataFrame(X_train).to_csv(processed_data_dir / "X_train.csv", index=False)
-    pd.DataFrame(y_train).to_csv(processed_data_dir / "y_train.csv", index=False)
-    pd.DataFrame(X_test).to_csv(processed_data_dir / "X_test.csv", index=False)
-    pd.DataFrame(y_test).to_csv(processed_data_dir / "y_test.csv", index=False)
+        processed_data_dir = (
+            config_path.parent / f"processed_site_state_{state_timestamp}"
+        )
+        processed_data_dir.mkdir(exist_ok=True)
+        pd.DataFrame(X_train).to_csv(processed_data_dir / "X_train.csv", index=False)
+        pd.DataFrame(y_train).to_csv(processed_data_dir / "y_train.csv", index=False)
+        pd.DataFrame(X_test).to_csv(processed_data_dir / "X_test.csv", index=False)
+        pd.DataFrame(y_test).to_csv(processed_data_dir / "y_test.csv", index=False)
 
 
 if __name__ == "__main__":
@@ -58,9 +67,10 @@ if __name__ == "__main__":
         help="Relative path to the GDSiMS config file.",
     )
     parser.add_argument(
-        "state_timestamp",
+        "state_timestamps",
         type=int,
-        help="The timestamp to extract state data for.",
+        nargs="+",
+        help="The timestamps to extract state data for.",
     )
     args = parser.parse_args()
-    main(args.config_path, args.state_timestamp)
+    main(args.config_path, args.state_timestamps)
@@ -0,0 +1,154 @@
+import argparse
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from mozzie.active import active_learning, autoemulate_predict, autoemulate_train
+from mozzie.coords import extend_release_store, release_store_name
+from mozzie.data_prep import load_test_train
+from mozzie.generate import (
+    load_params_table,
+    output_files_for,
+    parameter_order,
+    params_table_name,
+)
+
+
+def coords_writer(config: dict, main_dir: Path) -> Callable[[list[int]], None] | None:
+    """Draw the release sites of new runs into the campaign's release site store,
+    for campaigns with a coordinates file per run.
+
+    Args:
+        config (dict): The campaign config.
+        main_dir (Path): The main directory that `coords_path` is relative to.
+
+    Returns:
+        Callable | None: Adds the runs with the given labels to the store, or
+            None if the runs do not have coordinates of their own.
+    """
+    coords_set = config.get("coords_set")
+    if coords_set is None:
+        return None
+    coords_path = main_dir / coords_set.get("coords_path", "")
+    if coords_path.is_file():
+        # Every run uses the same coordinates file
+        return None
+
+    store_path = coords_path.parent / release_store_name
+    if not store_path.is_file():
+        msg = (
+            f"Release site store {store_path} not found, which is needed to draw "
+            "the release sites of new runs. Build it with build_coord_files.py."
+        )
+        raise FileNotFoundError(msg)
+    seed = coords_set.get("seed")
+    min_separation = coords_set.get("min_separation")
+
+    def write_coords(labels: list[int]) -> None:
+        # Seeded by the first label too, so each round draws new sites
+        rng = np.random.default_rng(None if seed is None else [seed, labels[0]])
+        extend_release_store(
+            store_path,
+            labels[0],
+            len(labels),
+            None if min_separation is None else float(min_separation),
+            rng,
+        )
+
+    return write_coords
+
+
+def main(
+    config_loc: str,
+    num_points: int,
+    num_rounds: int,
+    target_r2: float | None,
+    number_of_workers: int,
+):
+    """This script adds GDSiMS runs to a campaign where a Gaussian process emulator
+    of the Totals is least certain, a batch at a time, until the emulator reaches
+    `target_r2` on the test runs of the config. The training runs are the training
+    split of the config together with any runs added by earlier calls.
+
+    Args:
+        config_loc (str): Path to the config file from the main directory.
+        num_points (int): Number of runs to add each round.
+        num_rounds (int): Largest number of rounds of runs to add.
+        target_r2 (float, optional): R² on the test runs to stop at.
+        number_of_workers (int): Number of simultaneous GDSiMS runs.
+    """
+    main_dir = Path(__file__).resolve().parent.parent.parent
+    script_path = main_dir / "GeneralMetapop/build/gdsimsapp"
+    config_path = main_dir / config_loc
+    working_dir = config_path.parent
+
+    if not script_path.exists():
+        msg = f"GDSiMS script not found at {script_path}"
+        raise FileNotFoundError(msg)
+
+    with open(config_path) as file:
+        config = yaml.safe_load(file)
+    train_set, test_set = load_test_train(config_path)
+
+    test_labels = list(
+        range(
+            test_set["start_index"], test_set["start_index"] + test_set["num_samples"]
+        )
+    )
+    # Runs after the config's range were added by earlier rounds, less any
+    # that failed and have no outputs
+    table = load_params_table(working_dir / "params" / params_table_name)
+    labels = table[:, parameter_order.index("set_label")].astype(int)
+    train_labels = [
+        int(label)
+        for label in labels
+        if label >= train_set["start_index"]
+        and label not in test_labels
+        and output_files_for(working_dir, label)
+    ]
+
+    history = active_learning(
+        config,
+        main_dir,
+        script_path,
+        working_dir,
+        autoemulate_train,
+        autoemulate_predict,
+        train_labels,
+        num_points,
+        num_rounds,
+        test_labels=test_labels,
+        target_r2=target_r2,
+        write_coords=coords_writer(config, main_dir),
+        max_concurrency=number_of_workers,
+        scratch_root=os.environ.get("SCRATCH_FOR_MOZZIE"),
+        log_dir=working_dir / "logs",
+    )
+    print(history.to_string(index=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Add GDSiMS runs where the emulator is least certain."
+    )
+    parser.add_argument(
+        "config_path",
+        type=str,
+        help="Path to the experiment config set from the main directory.",
+    )
+    parser.add_argument("--points", type=int, default=10, help="Runs per round.")
+    parser.add_argument("--rounds", type=int, default=5, help="Number of rounds.")
+    parser.add_argument(
+        "--target", type=float, default=None, help="Test R² to stop at."
+    )
+    args = parser.parse_args()
+    main(
+        args.config_path,
+        args.points,
+        args.rounds,
+        args.target,
+        int(os.environ.get("WORKERS_FOR_MOZZIE", "4")),
+    )
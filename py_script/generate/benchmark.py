@@ -0,0 +1,68 @@
+import argparse
+import os
+from pathlib import Path
+
+import yaml
+
+from mozzie.generate import benchmark, default_benchmark_grid
+
+
+def main(params_loc: str, model_loc: str, grid_loc: str | None = None):
+    """This script times GDSiMS over a small grid of run sizes and saves a cost model
+    fitted to the timings, which `predict_campaign.py` uses to predict how long a
+    campaign will take. The timings are saved next to the model as a .csv file.
+
+    Args:
+        params_loc (str): Path to the parameters file to base the runs on, from the
+            main directory.
+        model_loc (str): Path to save the cost model to, from the main directory.
+        grid_loc (str, optional): Path to a YAML file mapping parameter names, or
+            `num_coords`, to the values to sweep. Defaults to None, which uses the
+            default grid.
+    """
+    main_dir = Path(__file__).resolve().parent.parent.parent
+    script_path = main_dir / "GeneralMetapop/build/gdsimsapp"
+    model_path = main_dir / model_loc
+
+    if not script_path.exists():
+        msg = f"GDSiMS script not found at {script_path}"
+        raise FileNotFoundError(msg)
+
+    grid = default_benchmark_grid
+    if grid_loc is not None:
+        with open(main_dir / grid_loc) as file:
+            grid = yaml.safe_load(file)
+
+    work_dir = Path(os.environ.get("SCRATCH_FOR_MOZZIE", model_path.parent))
+    timings, model = benchmark(
+        script_path, main_dir / params_loc, work_dir, grid, model_path=model_path
+    )
+    timings.to_csv(model_path.with_suffix(".csv"), index=False)
+
+    print(timings.to_string(index=False))
+    for name, coefficient in model.coefficients.items():
+        print(f"{name}: {coefficient:.3g} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time GDSiMS over a grid of run sizes and fit a cost model."
+    )
+    parser.add_argument(
+        "params_path",
+        type=str,
+        help="Path to the parameters file to base the runs on from the main directory.",
+    )
+    parser.add_argument(
+        "model_path",
+        type=str,
+        help="Path to save the cost model to from the main directory.",
+    )
+    parser.add_argument(
+        "--grid",
+        type=str,
+        default=None,
+        help="YAML file with the values to sweep for each parameter.",
+    )
+    args = parser.parse_args()
+    main(args.params_path, args.model_path, args.grid)
@@ -2,11 +2,16 @@ import argparse
 from pathlib import Path
 
 import numpy as np
-import pandas as pd
 import yaml
-from tqdm import tqdm
 
-from mozzie.coords import make_grid_coords
+from mozzie.coords import (
+    coords_types,
+    draw_release_sites,
+    draw_separated_release_sites,
+    make_coords,
+    release_store_name,
+    save_release_store,
+)
 from mozzie.data_prep import read_config
 
 
@@ -16,8 +21,8 @@ def load_coords_set(config: dict) -> dict:
     if coords_set is None:
         msg = "coords_set section missing in config."
         raise ValueError(msg)
-    if coords_set.get("coords_type") not in ["grid"]:
-        msg = "coords_type must be 'grid' for this script."
+    if coords_set.get("coords_type") not in coords_types:
+        msg = f"coords_type must be one of {coords_types} for this script."
         raise NotImplementedError(msg)
     required_top = ["coords_path", "coords_type", "release_sites"]
     for key in required_top:
@@ -57,60 +62,31 @@ def main(rel_config_path: str):
         msg = f"Coordinates path {coords_path} already exists as a file."
         raise FileExistsError(msg)
 
-    if coords_set.get("coords_type") == "grid":
-        coord_list = make_grid_coords(coords_set)
-    else:
-        msg = "Only 'grid' coords_type is supported in this script."
-        raise NotImplementedError(msg)
-
+    rng = np.random.default_rng(coords_set.get("seed"))
+    coords = make_coords(coords_set, rng, main_dir)
     num_release_sites = int(coords_set["release_sites"])
-    if num_release_sites <= 0:
-        msg = "Number of release sites must be a positive integer."
-        raise ValueError(msg)
-    if num_release_sites > len(coord_list):
-        msg = (
-            f"Number of release sites ({num_release_sites}) exceeds "
-            f"available coordinates ({len(coord_list)})."
-        )
-        raise ValueError(msg)
 
-    col_names = [[f"x_{i+1}", f"y_{i+1}"] for i in range(num_release_sites)]
-
-    release_sites_df = pd.DataFrame(
-        columns=np.concatenate([["sample_idx"], *col_names]),
-    )
+    # Pick num_release_sites coordinates without replacement for every sample,
+    # keeping them min_separation apart if it is set
+    if coords_set.get("min_separation") is None:
+        release_indices = draw_release_sites(
+            len(coords), num_release_sites, num_samples, rng
+        )
+    else:
+        release_indices = draw_separated_release_sites(
+            coords,
+            num_release_sites,
+            num_samples,
+            float(coords_set["min_separation"]),
+            rng,
+        )
 
-    coords_default = pd.DataFrame(
-        {
-            "x": [coord[0] for coord in coord_list],
-            "y": [coord[1] for coord in coord_list],
-            "if": ["n" for _ in coord_list],
-        }
+    # Save the shared coordinates and the release sites of every sample, from
+    # which the coordinates file of a run is written when it is launched
+    save_release_store(
+        coords_path.parent / release_store_name, coords, release_indices, start_index
     )
 
-    for s_i in tqdm(range(start_index, start_index + num_samples)):
-        # Pick num_release_sites coordinates without replacement
-        selected_indices = np.random.choice(
-            len(coord_list) - 1, num_release_sites, replace=False
-        )  # -1 is to avoid the off-by-one error in GDSiMS
-        selected_coords = [coord_list[i] for i in selected_indices]
-
-        # Place selected coordinates into the dataframe
-        row = [s_i] + [coord for pair in selected_coords for coord in pair]
-        release_sites_df.loc[len(release_sites_df)] = row
-
-        # Update 'if' column in these_coords for selected coordinates
-        these_coords = coords_default.copy()
-        these_coords.loc[selected_indices, "if"] = "y"
-
-        # Save the coordinates for this sample
-        sample_coords_path = coords_path / f"coords_{s_i}.csv"
-        these_coords.to_csv(sample_coords_path, sep="\t", index=False)
-
-    # Save the dataframe to a CSV file
-    release_sites_df["sample_idx"] = release_sites_df["sample_idx"].astype(int)
-    release_sites_df.to_csv(coords_path.parent / "release_sites.csv", index=False)
-
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
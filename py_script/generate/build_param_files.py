@@ -2,20 +2,42 @@ import argparse
 from pathlib import Path
 
 import yaml
-from tqdm import tqdm
 
-from mozzie.construct import generate_parameter_samples
+from mozzie.construct import (
+    build_params_rows,
+    extend_params_table,
+    generate_parameter_samples,
+    sample_discrepancy,
+)
 from mozzie.data_prep import read_config
-from mozzie.generate import parameter_order
+from mozzie.generate import (
+    load_params_table,
+    parameter_order,
+    params_table_name,
+    save_params_table,
+)
 
 
-def main(rel_config_path: str):
+def main(rel_config_path: str, extend: int | None = None, method: str = "maximin"):
+    """Sample the parameters of a campaign and add them to its parameter table,
+    `params/params.npz` next to the config file. The GDSiMS parameters file of a
+    run is only written while the run is going.
+
+    Args:
+        rel_config_path (str): Relative path to the sampling config setting.
+        extend (int, optional): Instead of drawing the design in the config, add
+            this many samples to the existing table, labelled on from its last
+            run and spread out from the samples already in it. Defaults to None.
+        method (str): How to extend the design, "maximin" or "sobol". Defaults
+            to "maximin".
+    """
     main_dir = Path(__file__).resolve().parent.parent.parent
 
     # Make Parameters folder
     config_path = Path(rel_config_path)
-    params_folder = config_path.parent / "params"
+    params_folder = main_dir / config_path.parent / "params"
     params_folder.mkdir(exist_ok=True)
+    table_path = params_folder / params_table_name
 
     # Load Config and Check Validity
     with (main_dir / config_path).open() as file:
@@ -23,28 +45,30 @@ def main(rel_config_path: str):
 
     set_values, to_sample, num_samples, start_index, _ = read_config(config)
 
-    # Generate parameter samples
-    samples = generate_parameter_samples(to_sample, num_samples)
-    cube_names = list(to_sample.keys())
-
-    # Write the parameter files
-    for i, sample in tqdm(
-        enumerate(samples, start=start_index),
-        total=num_samples,
-    ):
-        this_set = set_values.copy()
-        for j, param_name in enumerate(cube_names):
-            this_set[param_name] = sample[j]
-
-        this_set["set_label"] = i
-        params_path = params_folder / f"params_{i}.txt"
-        with params_path.open("w") as params_file:
-            for param_name in parameter_order:
-                if param_name in this_set:
-                    params_file.write(f"{this_set[param_name]}\n")
-                else:
-                    msg = f"Parameter {param_name} not found in the set."
-                    raise ValueError(msg)
+    if extend is not None:
+        # Add to the existing design
+        values = extend_params_table(
+            table_path, set_values, to_sample, extend, config.get("seed"), method
+        )
+        labels = values[:, parameter_order.index("set_label")]
+        print(f"Added samples {int(labels[0])} to {int(labels[-1])} by {method}.")
+    else:
+        # Generate parameter samples
+        design = config.get("design", "lhs")
+        samples = generate_parameter_samples(
+            to_sample, num_samples, config.get("seed"), design
+        )
+        print(f"Drew {num_samples} samples by {design}.")
+        values = build_params_rows(set_values, to_sample, samples, start_index)
+        save_params_table(table_path, values)
+
+    table = load_params_table(table_path)
+    columns = [parameter_order.index(name) for name in to_sample]
+    discrepancy = sample_discrepancy(table[:, columns], to_sample)
+    print(
+        f"Parameter table {table_path} has {len(table)} runs, "
+        f"discrepancy {discrepancy:.3g}."
+    )
 
 
 if __name__ == "__main__":
@@ -56,4 +80,18 @@ if __name__ == "__main__":
         type=str,
         help="Relative path to the sampling config setting.",
     )
-    main(parser.parse_args().config_path)
+    parser.add_argument(
+        "--extend",
+        type=int,
+        default=None,
+        help="Number of samples to add to the existing parameter table.",
+    )
+    parser.add_argument(
+        "--method",
+        type=str,
+        default="maximin",
+        choices=["maximin", "sobol"],
+        help="How to extend the existing design.",
+    )
+    args = parser.parse_args()
+    main(args.config_path, args.extend, args.method)
@@ -1,34 +1,53 @@
 import argparse
+import asyncio
 import os
-from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import yaml
 from tqdm import tqdm
 
-from mozzie.generate import run_custom
-
-
-def run_for_parallel(
-    x: tuple[str | Path, str | Path, str | Path, str | Path | None],
-) -> str:
-    return run_custom(*x)
-
-
-def main(config_loc: str, number_of_workers: int):
+from mozzie.campaign import (
+    estimate_costs,
+    find_jobs,
+    longest_first,
+    pending_jobs,
+    predict_makespan,
+    record_run,
+    run_limits,
+    stopping_rule,
+)
+from mozzie.generate import failure_report, file_hash, is_cached, run_many
+
+
+def main(
+    config_loc: str,
+    number_of_workers: int,
+    scratch_root: str | None = None,
+    cache_dir: str | None = None,
+):
     """This script runs GDSiMS for all .txt params in a folder and will use fixed
     coordinates if provided in the config file. It expects a config file that specifies
-    the coordinates path and other parameters if needed.
+    the coordinates path and other parameters if needed. Runs that fail, even after
+    the retries set in the `run_limits` of the config, are listed in `failures.csv`
+    next to the config file instead of stopping the campaign.
 
     Args:
         config_loc (str): Path to the config file from the main directory.
-        number_of_workers (int): Number of parallel workers to use.
+        number_of_workers (int): Maximum number of simultaneous GDSiMS runs.
+        scratch_root (str, optional): Directory to give each run its own scratch
+            directory in, e.g. "/dev/shm". Defaults to None.
+        cache_dir (str, optional): Directory of the output cache shared between
+            campaigns. Defaults to None.
     """
     main_dir = Path(__file__).resolve().parent.parent.parent
     script_path = main_dir / "GeneralMetapop/build/gdsimsapp"
     config_path = main_dir / config_loc
     working_dir = main_dir / config_path.parent
     params_dir = working_dir / "params"
+    manifest_path = working_dir / "manifest.jsonl"
+    ledger_path = working_dir / "ledger"
+    log_dir = working_dir / "logs"
 
     if not config_path.is_file():
         msg = f"Config file not found at {config_path}"
@@ -45,62 +64,72 @@ def main(config_loc: str, number_of_workers: int):
     with open(config_path) as file:
         config = yaml.safe_load(file)
 
-    txt_files = sorted(params_dir.glob("*.txt"))
-    if not txt_files:
-        print(f"No .txt files found in {params_dir}")
+    all_jobs = find_jobs(config, main_dir, script_path, working_dir)
+    if not all_jobs:
+        print(f"No params files or table found in {params_dir}")
         return
 
-    input_values: list[tuple[str, str, str, str | None]] = []  # for mypy
-
-    coords_set = config.get("coords_set")
-    if coords_set is not None:
-        coords_path = main_dir / coords_set.get("coords_path", "")
-        if coords_path.is_file():
-            # If coords_path is a file, we use it every time
-            input_values = [
-                (str(script_path), str(working_dir), str(params_path), str(coords_path))
-                for params_path in txt_files
-            ]
-        elif coords_path.is_dir():
-            # If coords_path is a directory, we look for corresponding coords files
-            coords_files = []
-            for params_path in txt_files:
-                coords_name = params_path.stem.replace("params_", "coords_")
-                coord_loc = coords_path / f"{coords_name}.csv"
-                if not coord_loc.exists():
-                    msg = f"Coordinates file {coord_loc} does not exist."
-                    raise FileNotFoundError(msg)
-                coords_files.append(coord_loc)
-
-            input_values = [
-                (str(script_path), str(working_dir), str(params_path), str(coords_file))
-                for params_path, coords_file in zip(
-                    txt_files, coords_files, strict=True
-                )
-            ]
-        else:
-            msg = (
-                "coords_path in config included must be a file or directory."
-                f"Coordinates file or directory not found at {coords_path}"
-            )
-            raise FileNotFoundError(msg)
-    else:
-        # If no coords_set, we assume no coordinates are to be used
-        input_values = [
-            (str(script_path), str(working_dir), str(params_path), None)
-            for params_path in txt_files
-        ]
+    # Skip the runs already recorded as complete in the manifest
+    script_hash = file_hash(script_path)
+    input_values = pending_jobs(all_jobs, manifest_path, script_hash)
+    print(f"{len(all_jobs) - len(input_values)} runs already complete.")
 
-    print(f"Found {len(input_values)} .txt files to process in {params_dir}")
+    print(f"Found {len(input_values)} runs left to process in {params_dir}")
     print(f"Using {number_of_workers} workers for processing.")
-    with ProcessPoolExecutor(max_workers=number_of_workers) as executor:
-        list(
-            tqdm(
-                executor.map(run_for_parallel, input_values),
-                total=len(input_values),
+
+    # Start the longest runs first so they do not hold up the end of the campaign
+    costs, calibrated = estimate_costs(input_values, manifest_path)
+    input_values = longest_first(input_values, costs)
+    if calibrated:
+        makespan = predict_makespan(np.sort(costs)[::-1], number_of_workers)
+        print(
+            f"Predicted campaign time: {makespan / 3600:.2f} hours "
+            f"({costs.sum() / 3600:.2f} core-hours)."
+        )
+    else:
+        print("No recorded run times yet, so no prediction of the campaign time.")
+
+    # Runs served from the cache take no simulation time, so they are not timed
+    cached = {
+        index
+        for index, (script, _, params_path, coords_path) in enumerate(input_values)
+        if cache_dir is not None
+        and is_cached(cache_dir, script, params_path, coords_path)
+    }
+
+    with tqdm(total=len(input_values)) as pbar:
+
+        def on_finished(index: int, _: str, wall_time: float) -> None:
+            record_run(
+                manifest_path,
+                input_values[index],
+                0,
+                script_hash,
+                wall_time,
+                index in cached,
+            )
+            pbar.update()
+
+        results = asyncio.run(
+            run_many(
+                input_values,
+                max_concurrency=number_of_workers,
+                callback=on_finished,
+                scratch_root=scratch_root,
+                cache_dir=cache_dir,
+                ledger_path=ledger_path,
+                log_dir=log_dir,
+                stopping_rule=stopping_rule(config),
+                return_exceptions=True,
+                **run_limits(config),
             )
         )
 
+    failures = failure_report(input_values, results)
+    if not failures.empty:
+        failures.to_csv(working_dir / "failures.csv", index=False)
+        print(f"{len(failures)} runs failed, see {working_dir / 'failures.csv'}")
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -112,4 +141,11 @@ if __name__ == "__main__":
         help="Path to the experiment config set from the main directory.",
     )
     number_of_workers = os.environ.get("WORKERS_FOR_MOZZIE", "4")
-    main(parser.parse_args().config_path, int(number_of_workers))
+    scratch_root = os.environ.get("SCRATCH_FOR_MOZZIE")
+    cache_dir = os.environ.get("CACHE_FOR_MOZZIE")
+    main(
+        parser.parse_args().config_path,
+        int(number_of_workers),
+        scratch_root,
+        cache_dir,
+    )
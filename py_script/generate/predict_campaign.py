@@ -0,0 +1,67 @@
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from mozzie.campaign import estimate_costs, find_jobs, predict_makespan
+from mozzie.generate import CostModel, file_hash
+
+
+def main(config_loc: str, model_loc: str, number_of_workers: int):
+    """This script predicts how long the runs of a campaign will take, from the
+    params files written by `build_param_files.py` and a cost model saved by
+    `benchmark.py`, so the campaign can be sized before it is submitted.
+
+    Args:
+        config_loc (str): Path to the config file from the main directory.
+        model_loc (str): Path to the cost model from the main directory.
+        number_of_workers (int): Number of simultaneous GDSiMS runs.
+    """
+    main_dir = Path(__file__).resolve().parent.parent.parent
+    script_path = main_dir / "GeneralMetapop/build/gdsimsapp"
+    config_path = main_dir / config_loc
+    working_dir = main_dir / config_path.parent
+
+    if not config_path.is_file():
+        msg = f"Config file not found at {config_path}"
+        raise FileNotFoundError(msg)
+
+    with open(config_path) as file:
+        config = yaml.safe_load(file)
+
+    model = CostModel.load(main_dir / model_loc)
+    if script_path.exists() and model.script_hash not in (None, file_hash(script_path)):
+        print("Warning: the cost model was fitted with a different GDSiMS build.")
+
+    jobs = find_jobs(config, main_dir, script_path, working_dir)
+    costs, _ = estimate_costs(jobs, cost_model=model)
+    makespan = predict_makespan(np.sort(costs)[::-1], number_of_workers)
+    print(f"{len(jobs)} runs, longest {costs.max() / 60:.1f} minutes.")
+    print(
+        f"Predicted campaign time on {number_of_workers} workers: "
+        f"{makespan / 3600:.2f} hours ({costs.sum() / 3600:.2f} core-hours)."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Predict the wall time and core-hours of a campaign."
+    )
+    parser.add_argument(
+        "config_path",
+        type=str,
+        help="Path to the experiment config set from the main directory.",
+    )
+    parser.add_argument(
+        "model_path",
+        type=str,
+        help="Path to the cost model from the main directory.",
+    )
+    args = parser.parse_args()
+    main(
+        args.config_path,
+        args.model_path,
+        int(os.environ.get("WORKERS_FOR_MOZZIE", "4")),
+    )
@@ -0,0 +1,116 @@
+import argparse
+import os
+import threading
+from pathlib import Path
+
+import yaml
+
+from mozzie.campaign import (
+    JobQueue,
+    estimate_costs,
+    find_jobs,
+    pending_jobs,
+    run_limits,
+    run_worker,
+    stopping_rule,
+)
+from mozzie.generate import file_hash
+
+
+def main(
+    config_loc: str,
+    number_of_workers: int,
+    scratch_root: str | None = None,
+    cache_dir: str | None = None,
+):
+    """This script takes GDSiMS runs from a job queue shared by any number of hosts.
+    The first host to start fills the queue with the runs that are not yet complete,
+    and every host then claims runs from it until it is empty. A run whose host dies
+    is handed to another host once its lease runs out. The queue lives next to the
+    config file, so the experiment folder must be on storage all hosts can see.
+
+    Args:
+        config_loc (str): Path to the config file from the main directory.
+        number_of_workers (int): Number of simultaneous GDSiMS runs on this host.
+        scratch_root (str, optional): Directory to give each run its own scratch
+            directory in, e.g. "/dev/shm". Defaults to None.
+        cache_dir (str, optional): Directory of the output cache shared between
+            campaigns. Defaults to None.
+    """
+    main_dir = Path(__file__).resolve().parent.parent.parent
+    script_path = main_dir / "GeneralMetapop/build/gdsimsapp"
+    config_path = main_dir / config_loc
+    working_dir = main_dir / config_path.parent
+    manifest_path = working_dir / "manifest.jsonl"
+    ledger_path = working_dir / "ledger"
+    log_dir = working_dir / "logs"
+
+    if not config_path.is_file():
+        msg = f"Config file not found at {config_path}"
+        raise FileNotFoundError(msg)
+
+    if not script_path.exists():
+        msg = f"GDSiMS script not found at {script_path}"
+        raise FileNotFoundError(msg)
+
+    with open(config_path) as file:
+        config = yaml.safe_load(file)
+
+    # Runs already in the queue are skipped, so every host can safely do this
+    script_hash = file_hash(script_path)
+    jobs = pending_jobs(
+        find_jobs(config, main_dir, script_path, working_dir),
+        manifest_path,
+        script_hash,
+    )
+    costs, _ = estimate_costs(jobs, manifest_path)
+    queue = JobQueue(working_dir / "queue.sqlite")
+    print(f"Added {queue.add_jobs(jobs, costs)} runs to the queue.")
+
+    workers = [
+        threading.Thread(
+            target=run_worker,
+            args=(queue,),
+            kwargs={
+                "manifest_path": manifest_path,
+                "script_hash": script_hash,
+                "scratch_root": scratch_root,
+                "cache_dir": cache_dir,
+                "ledger_path": ledger_path,
+                "log_dir": log_dir,
+                "stopping_rule": stopping_rule(config),
+                **run_limits(config),
+            },
+        )
+        for _ in range(number_of_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    counts = queue.counts()
+    print(
+        f"Queue: {counts['done']} done, {counts['failed']} failed, "
+        f"{counts['running']} running on other hosts, {counts['pending']} pending."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run GDSiMS for all .txt params in a folder from a shared queue."
+    )
+    parser.add_argument(
+        "config_path",
+        type=str,
+        help="Path to the experiment config set from the main directory.",
+    )
+    number_of_workers = os.environ.get("WORKERS_FOR_MOZZIE", "4")
+    scratch_root = os.environ.get("SCRATCH_FOR_MOZZIE")
+    cache_dir = os.environ.get("CACHE_FOR_MOZZIE")
+    main(
+        parser.parse_args().config_path,
+        int(number_of_workers),
+        scratch_root,
+        cache_dir,
+    )
@@ -1,25 +1,46 @@
 import argparse
+import os
+import subprocess
+import time
 from pathlib import Path
 
 import yaml
 from tqdm import tqdm
 
-from mozzie.generate import run_custom
+from mozzie.campaign import (
+    find_jobs,
+    pending_jobs,
+    record_run,
+    run_limits,
+    stopping_rule,
+)
+from mozzie.generate import failure_report, file_hash, is_cached, run_custom
 
 
-def main(config_loc: str):
+def main(
+    config_loc: str, scratch_root: str | None = None, cache_dir: str | None = None
+):
     """This script runs GDSiMS for all .txt params in a folder and will use fixed
     coordinates if provided in the config file. It expects a config file that specifies
-    the coordinates path and other parameters if needed.
+    the coordinates path and other parameters if needed. Runs that fail, even after
+    the retries set in the `run_limits` of the config, are listed in `failures.csv`
+    next to the config file instead of stopping the campaign.
 
     Args:
         config_loc (str): Path to the config file from the main directory.
+        scratch_root (str, optional): Directory to give each run its own scratch
+            directory in, e.g. "/dev/shm". Defaults to None.
+        cache_dir (str, optional): Directory of the output cache shared between
+            campaigns. Defaults to None.
     """
     main_dir = Path(__file__).resolve().parent.parent.parent
     script_path = main_dir / "GeneralMetapop/build/gdsimsapp"
     config_path = main_dir / config_loc
     working_dir = main_dir / config_path.parent
     params_dir = working_dir / "params"
+    manifest_path = working_dir / "manifest.jsonl"
+    ledger_path = working_dir / "ledger"
+    log_dir = working_dir / "logs"
 
     if not config_path.is_file():
         msg = f"Config file not found at {config_path}"
@@ -36,58 +57,55 @@ def main(config_loc: str):
     with open(config_path) as file:
         config = yaml.safe_load(file)
 
-    txt_files = sorted(params_dir.glob("*.txt"))
-    if not txt_files:
-        print(f"No .txt files found in {params_dir}")
+    all_jobs = find_jobs(config, main_dir, script_path, working_dir)
+    if not all_jobs:
+        print(f"No params files or table found in {params_dir}")
         return
 
-    input_values: list[tuple[str, str, str, str | None]] = []  # for mypy
-
-    coords_set = config.get("coords_set")
-    if coords_set is not None:
-        coords_path = main_dir / coords_set.get("coords_path", "")
-        if coords_path.is_file():
-            # If coords_path is a file, we use it every time
-            input_values = [
-                (str(script_path), str(working_dir), str(params_path), str(coords_path))
-                for params_path in txt_files
-            ]
-        elif coords_path.is_dir():
-            # If coords_path is a directory, we look for corresponding coords files
-            coords_files = []
-            for params_path in txt_files:
-                coords_name = params_path.stem.replace("params_", "coords_")
-                coord_loc = coords_path / f"{coords_name}.csv"
-                if not coord_loc.exists():
-                    msg = f"Coordinates file {coord_loc} does not exist."
-                    raise FileNotFoundError(msg)
-                coords_files.append(coord_loc)
-
-            input_values = [
-                (str(script_path), str(working_dir), str(params_path), str(coords_file))
-                for params_path, coords_file in zip(
-                    txt_files, coords_files, strict=True
-                )
-            ]
-        else:
-            msg = (
-                "coords_path in config included must be a file or directory."
-                f"Coordinates file or directory not found at {coords_path}"
-            )
-            raise FileNotFoundError(msg)
-    else:
-        # If no coords_set, we assume no coordinates are to be used
-        input_values = [
-            (str(script_path), str(working_dir), str(params_path), None)
-            for params_path in txt_files
-        ]
-
-    print(f"Found {len(input_values)} .txt files to process in {params_dir}")
+    # Skip the runs already recorded as complete in the manifest
+    script_hash = file_hash(script_path)
+    input_values = pending_jobs(all_jobs, manifest_path, script_hash)
+    print(f"{len(all_jobs) - len(input_values)} runs already complete.")
+
+    print(f"Found {len(input_values)} runs left to process in {params_dir}")
     print("Only using one worker for processing.")
 
+    limits = run_limits(config)
+    rule = stopping_rule(config)
+    results: list[str | BaseException] = []
     for settings in (pbar := tqdm(input_values)):
-        pbar.set_postfix_str(Path(settings[2]).name)
-        run_custom(*settings)
+        script, run_dir, params_path, coords_path = settings
+        pbar.set_postfix_str(Path(params_path).name)
+        start_time = time.monotonic()
+        try:
+            cached = cache_dir is not None and is_cached(
+                cache_dir, script, params_path, coords_path
+            )
+            output = run_custom(
+                script,
+                run_dir,
+                params_path,
+                coords_path,
+                scratch_root=scratch_root,
+                cache_dir=cache_dir,
+                ledger_path=ledger_path,
+                log_dir=log_dir,
+                stopping_rule=rule,
+                **limits,
+            )
+        except (subprocess.CalledProcessError, RuntimeError, TimeoutError) as e:
+            if isinstance(e, subprocess.CalledProcessError):
+                record_run(manifest_path, settings, e.returncode, script_hash)
+            results.append(e)
+            continue
+        wall_time = time.monotonic() - start_time
+        record_run(manifest_path, settings, 0, script_hash, wall_time, cached)
+        results.append(output)
+
+    failures = failure_report(input_values, results)
+    if not failures.empty:
+        failures.to_csv(working_dir / "failures.csv", index=False)
+        print(f"{len(failures)} runs failed, see {working_dir / 'failures.csv'}")
 
 
 if __name__ == "__main__":
@@ -99,4 +117,8 @@ if __name__ == "__main__":
         type=str,
         help="Path to the experiment config set from the main directory.",
     )
-    main(parser.parse_args().config_path)
+    main(
+        parser.parse_args().config_path,
+        os.environ.get("SCRATCH_FOR_MOZZIE"),
+        os.environ.get("CACHE_FOR_MOZZIE"),
+    )
@@ -8,6 +8,8 @@ from importlib.metadata import version
 
 __all__ = (
     "__version__",
+    "active",
+    "campaign",
     "construct",
     "coords",
     "data_prep",
@@ -18,6 +20,8 @@ __all__ = (
 __version__ = version(__name__)
 
 from . import (
+    active,
+    campaign,
     construct,
     coords,
     data_prep,
@@ -0,0 +1,352 @@
+"""
+Active: This module contains functions to choose new GDSiMS runs where an
+emulator is least certain, so it can be trained with fewer simulations.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import cdist
+
+from mozzie.campaign import find_jobs
+from mozzie.construct import build_params_rows, scale_samples, unit_samples
+from mozzie.data_prep import (
+    contruct_total_x_and_y,
+    load_samples_values,
+    load_total_values,
+)
+from mozzie.generate import (
+    failure_report,
+    load_params_table,
+    parameter_order,
+    params_table_name,
+    run_many,
+    save_params_table,
+)
+
+__all__ = [
+    "Ingest",
+    "Predict",
+    "Train",
+    "active_learning",
+    "autoemulate_predict",
+    "autoemulate_train",
+    "r2_score",
+    "score_candidates",
+    "select_diverse",
+    "total_xy",
+]
+
+# Trains an emulator on inputs X and outputs y and returns it.
+Train = Callable[[np.ndarray, np.ndarray], Any]
+
+# Predicts the mean and variance of an emulator's outputs for inputs X.
+Predict = Callable[[Any, np.ndarray], tuple[np.ndarray, np.ndarray]]
+
+# Loads the inputs X and outputs y of the runs in a config dictionary, as used
+# by the `mozzie.data_prep` loaders, from a campaign directory.
+Ingest = Callable[[Path, dict], tuple[np.ndarray, np.ndarray]]
+
+
+def autoemulate_train(x: np.ndarray, y: np.ndarray, n_components: int = 10) -> Any:
+    """
+    Train an AutoEmulate Gaussian process, as in the example notebooks.
+
+    Args:
+        x (np.ndarray): The sampled parameters of each run.
+        y (np.ndarray): The flattened outputs of each run.
+        n_components (int): Number of principal components of the outputs to
+            emulate. Defaults to 10.
+
+    Returns:
+        The best fitted AutoEmulate model.
+    """
+    # AutoEmulate is only needed for this emulator, so it is imported here
+    from autoemulate import AutoEmulate  # noqa: PLC0415
+    from autoemulate.transforms import PCATransform  # noqa: PLC0415
+
+    emulator = AutoEmulate(
+        x,
+        y,
+        models=["GaussianProcessRBF"],
+        y_transforms_list=[[PCATransform(n_components=n_components)]],
+    )
+    return emulator.best_result().model
+
+
+def autoemulate_predict(
+    model: Any,
+    x: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Predict the mean and variance of the outputs of an AutoEmulate model.
+
+    Args:
+        model: A model from `autoemulate_train`.
+        x (np.ndarray): The parameters to predict for.
+
+    Returns:
+        mean (np.ndarray): The predicted outputs.
+        variance (np.ndarray): The predictive variance of each output.
+    """
+    from torch import Tensor  # noqa: PLC0415
+
+    prediction = model.predict(Tensor(x))
+    return (
+        prediction.mean.detach().numpy(),
+        prediction.variance.detach().numpy(),
+    )
+
+
+def r2_score(y_true: np.ndarray, y_pred: np.ndarray) -> float:
+    """The coefficient of determination over all outputs together."""
+    residual = np.sum((y_true - y_pred) ** 2)
+    total = np.sum((y_true - y_true.mean(axis=0)) ** 2)
+    return float(1 - residual / total) if total > 0 else 0.0
+
+
+def score_candidates(
+    model: Any,
+    predict: Predict,
+    candidates: np.ndarray,
+    batch_size: int = 4096,
+) -> np.ndarray:
+    """
+    Score candidate parameters by the emulator's total predictive variance.
+
+    The candidates are predicted in batches so a large pool does not have to
+    fit in memory at once.
+
+    Args:
+        model: The trained emulator.
+        predict (Predict): Predicts the mean and variance of `model`.
+        candidates (np.ndarray): One row of parameters per candidate.
+        batch_size (int): Number of candidates to predict at once. Defaults
+            to 4096.
+
+    Returns:
+        np.ndarray: The sum of the predictive variances of each candidate.
+    """
+    scores = np.empty(len(candidates))
+    for start in range(0, len(candidates), batch_size):
+        _, variance = predict(model, candidates[start : start + batch_size])
+        variance = np.asarray(variance, dtype=float)
+        scores[start : start + batch_size] = variance.reshape(len(variance), -1).sum(
+            axis=1
+        )
+    return scores
+
+
+def select_diverse(
+    unit_candidates: np.ndarray,
+    scores: np.ndarray,
+    num_points: int,
+    min_distance: float | None = None,
+) -> np.ndarray:
+    """
+    Pick the highest scoring candidates that are not too close to each other.
+
+    Candidates are taken in order of score, skipping any closer than
+    `min_distance` to one already picked. If that leaves too few, the rest
+    are filled in with the best of the skipped ones.
+
+    Args:
+        unit_candidates (np.ndarray): The candidates in the unit hypercube.
+        scores (np.ndarray): The score of each candidate, higher is better.
+        num_points (int): Number of candidates to pick.
+        min_distance (float, optional): Smallest distance between picked
+            candidates. Defaults to half the spacing of `num_points` evenly
+            spread points.
+
+    Returns:
+        np.ndarray: The indices of the picked candidates.
+    """
+    if min_distance is None:
+        min_distance = 0.5 * num_points ** (-1 / unit_candidates.shape[1])
+
+    order = np.argsort(-scores, kind="stable")
+    picked: list[int] = []
+    for idx in order:
+        if len(picked) == num_points:
+            break
+        if picked:
+            closest = cdist(unit_candidates[[idx]], unit_candidates[picked]).min()
+            if closest < min_distance:
+                continue
+        picked.append(int(idx))
+
+    if len(picked) < num_points:
+        skipped = order[~np.isin(order, picked)]
+        picked.extend(int(idx) for idx in skipped[: num_points - len(picked)])
+    return np.array(picked)
+
+
+def total_xy(working_dir: Path, config_dict: dict) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Load the sampled parameters and the flattened Totals of some runs.
+
+    Args:
+        working_dir (Path): The campaign directory.
+        config_dict (dict): The `start_index`, `num_samples` and `to_sample` of
+            the runs, as for `mozzie.data_prep.load_total_values`.
+
+    Returns:
+        X (np.ndarray): The sampled parameters of each run.
+        y (np.ndarray): The flattened Totals of each run.
+    """
+    sample_values = load_samples_values(working_dir, config_dict)
+    total_data = load_total_values(working_dir, config_dict)
+    return contruct_total_x_and_y(total_data, sample_values)
+
+
+def _load_xy(
+    ingest: Ingest, working_dir: Path, config: dict, labels: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Load the runs with the given labels, a block of consecutive labels at a time."""
+    labels = np.sort(labels)
+    breaks = np.flatnonzero(np.diff(labels) != 1) + 1
+    xs, ys = [], []
+    for block in np.split(labels, breaks):
+        x, y = ingest(
+            working_dir,
+            config | {"start_index": int(block[0]), "num_samples": len(block)},
+        )
+        xs.append(x)
+        ys.append(y)
+    return np.concatenate(xs), np.concatenate(ys)
+
+
+def active_learning(
+    config: dict,
+    main_dir: str | Path,
+    script_path: str | Path,
+    working_dir: str | Path,
+    train: Train,
+    predict: Predict,
+    train_labels: list[int],
+    num_points: int,
+    num_rounds: int,
+    test_labels: list[int] | None = None,
+    target_r2: float | None = None,
+    num_candidates: int = 10_000,
+    ingest: Ingest = total_xy,
+    write_coords: Callable[[list[int]], None] | None = None,
+    seed: int | None = None,
+    max_concurrency: int = 4,
+    **run_kwargs,
+) -> pd.DataFrame:
+    """
+    Grow a campaign where the emulator is least certain, until it is accurate.
+
+    Each round trains the emulator on the runs so far, scores a Sobol pool of
+    `num_candidates` parameter sets by their predictive variance, picks the
+    `num_points` best that are spread apart, adds them to the campaign's
+    parameter table and runs them with `mozzie.generate.run_many`. It stops
+    after `num_rounds` rounds, or as soon as the R² on the test runs reaches
+    `target_r2`.
+
+    A run that fails does not stop the others. It is left out of the training
+    runs, but its row stays in the parameter table so it can be run again
+    later.
+
+    Args:
+        config (dict): The campaign config, with `set_values` and `to_sample`.
+        main_dir (str): The main directory that `coords_path` is relative to.
+        script_path (str): Path to the GDSiMS script.
+        working_dir (str): Directory of the campaign, with its parameter table.
+        train (Train): Trains an emulator, e.g. `autoemulate_train`.
+        predict (Predict): Predicts with an emulator, e.g.
+            `autoemulate_predict`.
+        train_labels (list[int]): Labels of the finished runs to start from.
+        num_points (int): Number of runs to add each round.
+        num_rounds (int): Largest number of rounds of runs to add.
+        test_labels (list[int], optional): Labels of finished runs to measure
+            the R² of the emulator on. Defaults to None.
+        target_r2 (float, optional): R² on the test runs to stop at. Defaults
+            to None, which carries on for `num_rounds`.
+        num_candidates (int): Size of the pool of candidates each round.
+            Defaults to 10000.
+        ingest (Ingest): Loads the inputs and outputs of finished runs.
+            Defaults to `total_xy`.
+        write_coords (Callable, optional): Writes the coordinates files of the
+            new runs, given their labels, for campaigns with a coordinates
+            file per run. Defaults to None.
+        seed (int, optional): Seed of the candidate pools. Defaults to None.
+        max_concurrency (int): Number of simultaneous GDSiMS runs.
+        **run_kwargs: Further arguments for `run_many`, e.g. `scratch_root`.
+
+    Returns:
+        pd.DataFrame: One row per round with the number of training runs, the
+            R² on the test runs, the largest score in the pool, the labels of
+            the runs added and the labels of the runs that failed.
+    """
+    working_dir = Path(working_dir)
+    table_path = working_dir / "params" / params_table_name
+    to_sample = config["to_sample"]
+    label_idx = parameter_order.index("set_label")
+
+    x, y = _load_xy(ingest, working_dir, config, np.array(train_labels))
+    x_test = y_test = None
+    if test_labels is not None:
+        x_test, y_test = _load_xy(ingest, working_dir, config, np.array(test_labels))
+
+    history: list[dict[str, Any]] = []
+    for round_idx in range(num_rounds + 1):
+        model = train(x, y)
+        r2 = None
+        if x_test is not None and y_test is not None:
+            r2 = r2_score(y_test, predict(model, x_test)[0])
+        row = {"round": round_idx, "num_train": len(x), "r2": r2}
+        if round_idx == num_rounds or (
+            target_r2 is not None and r2 is not None and r2 >= target_r2
+        ):
+            history.append(row)
+            break
+
+        round_seed = None if seed is None else seed + round_idx
+        unit = unit_samples(len(to_sample), num_candidates, "sobol", round_seed)
+        candidates = scale_samples(unit, to_sample)
+        scores = score_candidates(model, predict, candidates)
+        picked = select_diverse(unit, scores, num_points)
+
+        start_index = int(load_params_table(table_path)[:, label_idx].max()) + 1
+        values = build_params_rows(
+            config["set_values"], to_sample, candidates[picked], start_index
+        )
+        save_params_table(table_path, values)
+        new_labels = [int(label) for label in values[:, label_idx]]
+        if write_coords is not None:
+            write_coords(new_labels)
+
+        names = {f"params_{label}.txt": label for label in new_labels}
+        jobs = [
+            job
+            for job in find_jobs(config, main_dir, script_path, working_dir)
+            if Path(job[2]).name in names
+        ]
+        results = asyncio.run(
+            run_many(jobs, max_concurrency, return_exceptions=True, **run_kwargs)
+        )
+        failures = failure_report(jobs, results)
+        failed = [names[name] for name in failures["params"]]
+        added = [label for label in new_labels if label not in failed]
+
+        if added:
+            x_new, y_new = _load_xy(ingest, working_dir, config, np.array(added))
+            x, y = np.concatenate([x, x_new]), np.concatenate([y, y_new])
+        history.append(
+            row
+            | {
+                "max_score": float(scores.max()),
+                "labels_added": added,
+                "labels_failed": failed,
+            }
+        )
+
+    return pd.DataFrame(history)
@@ -0,0 +1,768 @@
+"""
+Campaign: This module contains functions to organise and keep track of the
+many GDSiMS runs that make up a data generation campaign.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from mozzie.coords import coords_available
+from mozzie.data_prep import read_values_from_params
+from mozzie.generate import (
+    CostModel,
+    RunArgs,
+    StoppingRule,
+    coords_hash,
+    file_hash,
+    is_cached,
+    load_params_table,
+    output_files_for,
+    parameter_order,
+    params_hash,
+    params_table_name,
+    population_eliminated,
+    read_set_label,
+    run_custom,
+    stop_marker_path,
+    wild_allele_lost,
+)
+
+__all__ = [
+    "JobQueue",
+    "cost_units",
+    "count_rows",
+    "estimate_costs",
+    "find_jobs",
+    "is_complete",
+    "load_manifest",
+    "longest_first",
+    "pending_jobs",
+    "predict_makespan",
+    "record_run",
+    "run_limits",
+    "run_worker",
+    "seconds_per_unit",
+    "stopping_rule",
+]
+
+stopping_rules = {
+    "wild_allele_lost": wild_allele_lost,
+    "population_eliminated": population_eliminated,
+}
+
+
+def find_jobs(
+    config: dict,
+    main_dir: str | Path,
+    script_path: str | Path,
+    working_dir: str | Path,
+) -> list[RunArgs]:
+    """
+    Find the runs of a campaign from the params folder and the config file.
+
+    Every .txt file in `working_dir/params` is one run. If the folder has a
+    parameter table, see `mozzie.generate.save_params_table`, each of its rows
+    is a run instead, named `params_{set_label}.txt` as if it had its own file,
+    which is only written while the run is going. If the config has a
+    `coords_set`, its `coords_path` is either a single coordinates file used
+    for every run or a directory holding a `coords_N.csv` for each
+    `params_N.txt`, or a `mozzie.coords` release site store next to the
+    directory that they are written from.
+
+    Args:
+        config (dict): The campaign configuration dictionary.
+        main_dir (str): The main directory that `coords_path` is relative to.
+        script_path (str): Path to the GDSiMS script.
+        working_dir (str): Directory of the campaign, containing `params`.
+
+    Returns:
+        list[RunArgs]: The `(script_path, working_dir, params_path, coords_path)`
+            arguments for each run, sorted by params file name, or by
+            `set_label` for a parameter table.
+    """
+    params_dir = Path(working_dir) / "params"
+    if not params_dir.is_dir():
+        msg = f"Params folder not found at {params_dir}"
+        raise FileNotFoundError(msg)
+
+    table_path = params_dir / params_table_name
+    if table_path.is_file():
+        labels = load_params_table(table_path)[:, parameter_order.index("set_label")]
+        txt_files = [params_dir / f"params_{int(label)}.txt" for label in labels]
+    else:
+        txt_files = sorted(params_dir.glob("*.txt"))
+
+    coords_set = config.get("coords_set")
+    if coords_set is None:
+        # If no coords_set, we assume no coordinates are to be used
+        return [
+            (str(script_path), str(working_dir), str(params_path), None)
+            for params_path in txt_files
+        ]
+
+    coords_path = Path(main_dir) / coords_set.get("coords_path", "")
+    if coords_path.is_file():
+        # If coords_path is a file, we use it every time
+        return [
+            (str(script_path), str(working_dir), str(params_path), str(coords_path))
+            for params_path in txt_files
+        ]
+
+    if coords_path.is_dir():
+        # If coords_path is a directory, we look for corresponding coords files
+        input_values: list[RunArgs] = []
+        for params_path in txt_files:
+            coords_name = params_path.stem.replace("params_", "coords_")
+            coord_loc = coords_path / f"{coords_name}.csv"
+            if not coords_available(coord_loc):
+                msg = f"Coordinates file {coord_loc} does not exist."
+                raise FileNotFoundError(msg)
+            input_values.append(
+                (str(script_path), str(working_dir), str(params_path), str(coord_loc))
+            )
+        return input_values
+
+    msg = (
+        "coords_path in config included must be a file or directory."
+        f"Coordinates file or directory not found at {coords_path}"
+    )
+    raise FileNotFoundError(msg)
+
+
+def run_limits(config: dict) -> dict:
+    """
+    Read the optional `run_limits` section of a campaign config.
+
+    The section can set `timeout`, `stall_timeout`, `retries` and
+    `retry_backoff`, which are passed on to `run_custom` for every run.
+
+    Args:
+        config (dict): The campaign config.
+
+    Returns:
+        dict: The keyword arguments for `run_custom`.
+    """
+    limits = dict(config.get("run_limits") or {})
+    unknown = sorted(
+        set(limits) - {"timeout", "stall_timeout", "retries", "retry_backoff"}
+    )
+    if unknown:
+        msg = f"Unknown run limits in config: {', '.join(unknown)}"
+        raise ValueError(msg)
+    return limits
+
+
+def stopping_rule(config: dict) -> StoppingRule | None:
+    """
+    Read the optional `stop_early` section of a campaign config.
+
+    The section names one of `stopping_rules` as `rule` and the number of
+    consecutive recorded days it has to hold for as `days`.
+
+    Args:
+        config (dict): The campaign config.
+
+    Returns:
+        StoppingRule | None: The stopping rule for `run_custom`, or None if the
+            runs should go on until `max_t`.
+    """
+    stop_early = config.get("stop_early")
+    if not stop_early:
+        return None
+    if stop_early.get("rule") not in stopping_rules:
+        msg = (
+            f"Unknown stopping rule {stop_early.get('rule')!r}, "
+            f"expected one of {', '.join(stopping_rules)}."
+        )
+        raise ValueError(msg)
+    return stopping_rules[stop_early["rule"]](int(stop_early.get("days", 1)))
+
+
+def count_rows(file_path: str | Path) -> int:
+    """Count the data rows in a GDSiMS output file, excluding the two header lines."""
+    with open(str(file_path), "rb") as file:
+        num_lines = sum(1 for _ in file)
+    return max(num_lines - 2, 0)
+
+
+def load_manifest(manifest_path: str | Path) -> dict[str, dict]:
+    """
+    Load the completion manifest of a campaign.
+
+    The manifest is a JSON lines file with one entry per finished run attempt.
+    Only the latest entry for each params file is kept.
+
+    Args:
+        manifest_path (str): Path to the manifest file.
+
+    Returns:
+        dict[str, dict]: The latest entry for each params file name.
+    """
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        return {}
+
+    entries = {}
+    with manifest_path.open() as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash while it was being written
+                continue
+            entries[entry["params"]] = entry
+    return entries
+
+
+def record_run(
+    manifest_path: str | Path,
+    run_args: RunArgs,
+    exit_status: int,
+    script_hash: str | None = None,
+    wall_time: float | None = None,
+    cached: bool = False,
+) -> dict:
+    """
+    Append an entry for a finished run to the completion manifest.
+
+    The entry records the hashes of the inputs, the exit status and the number
+    of rows in each output file, so a later run can check it is still valid.
+    The wall time and `cost_units` of the run are kept to calibrate the cost
+    estimates of later campaigns, except for runs restored from the output
+    cache or stopped early, whose wall time says little about their cost.
+
+    Args:
+        manifest_path (str): Path to the manifest file.
+        run_args (RunArgs): The `(script_path, working_dir, params_path,
+            coords_path)` arguments of the run.
+        exit_status (int): The exit status of GDSiMS.
+        script_hash (str, optional): Hash of the GDSiMS script, to avoid
+            hashing it again for every run. Defaults to None.
+        wall_time (float, optional): How long the run took in seconds.
+            Defaults to None.
+        cached (bool): Whether the run was restored from the output cache,
+            see `mozzie.generate.is_cached`. Defaults to False.
+
+    Returns:
+        dict: The manifest entry.
+    """
+    script_path, working_dir, params_path, coords_path = run_args
+    set_label = read_set_label(params_path)
+    stopped = stop_marker_path(working_dir, set_label).exists()
+
+    entry = {
+        "params": Path(params_path).name,
+        "set_label": set_label,
+        "params_hash": params_hash(params_path),
+        "coords_hash": None if coords_path is None else coords_hash(coords_path),
+        "script_hash": script_hash or file_hash(script_path),
+        "exit_status": exit_status,
+        "output_rows": {
+            p.name: count_rows(p) for p in output_files_for(working_dir, set_label)
+        },
+        "cost_units": cost_units(params_path),
+        "wall_time": None if cached or stopped else wall_time,
+        "cached": cached,
+        "stopped": stopped,
+        "finished_at": time.time(),
+    }
+    with open(str(manifest_path), "a") as file:
+        file.write(json.dumps(entry) + "\n")
+    return entry
+
+
+def is_complete(
+    entry: dict | None, run_args: RunArgs, script_hash: str | None = None
+) -> bool:
+    """
+    Check whether a manifest entry shows the run as complete and still valid.
+
+    A run is complete if GDSiMS exited successfully, the inputs and the GDSiMS
+    script are unchanged and the output files still have the recorded rows.
+
+    Args:
+        entry (dict, optional): The manifest entry for the run, if any.
+        run_args (RunArgs): The `(script_path, working_dir, params_path,
+            coords_path)` arguments of the run.
+        script_hash (str, optional): Hash of the GDSiMS script. Defaults to None.
+
+    Returns:
+        bool: Whether the run can be skipped.
+    """
+    if entry is None or entry["exit_status"] != 0:
+        return False
+
+    script_path, working_dir, params_path, coords_path = run_args
+    if entry["params_hash"] != params_hash(params_path):
+        return False
+    coords_digest = None if coords_path is None else coords_hash(coords_path)
+    if entry["coords_hash"] != coords_digest:
+        return False
+    if entry["script_hash"] != (script_hash or file_hash(script_path)):
+        return False
+
+    output_files = output_files_for(working_dir, entry["set_label"])
+    if not entry["output_rows"] or len(output_files) != len(entry["output_rows"]):
+        return False
+    return all(entry["output_rows"].get(p.name) == count_rows(p) for p in output_files)
+
+
+def pending_jobs(
+    jobs: list[RunArgs],
+    manifest_path: str | Path,
+    script_hash: str | None = None,
+) -> list[RunArgs]:
+    """
+    Drop the runs that the manifest shows as complete and still valid.
+
+    Runs that failed, were left partial or whose inputs have changed since
+    are kept, so they will be run again.
+
+    Args:
+        jobs (list[RunArgs]): The runs of the campaign.
+        manifest_path (str): Path to the manifest file.
+        script_hash (str, optional): Hash of the GDSiMS script. Defaults to None.
+
+    Returns:
+        list[RunArgs]: The runs which still need to be carried out.
+    """
+    manifest = load_manifest(manifest_path)
+    return [
+        job
+        for job in jobs
+        if not is_complete(manifest.get(Path(job[2]).name), job, script_hash)
+    ]
+
+
+def cost_units(params_path: str | Path) -> float:
+    """
+    Relative cost of a run, taken as `num_runs * max_t * num_pat`.
+
+    Args:
+        params_path (str): Path to the GDSiMS parameters file.
+
+    Returns:
+        float: The cost of the run in arbitrary units.
+    """
+    values = read_values_from_params(params_path, ["num_runs", "max_t", "num_pat"])
+    return values["num_runs"] * values["max_t"] * values["num_pat"]
+
+
+def seconds_per_unit(manifest_path: str | Path) -> float | None:
+    """
+    Calibrate `cost_units` against the wall times recorded in a manifest.
+
+    Args:
+        manifest_path (str): Path to the manifest file.
+
+    Returns:
+        float | None: The median number of seconds per cost unit of the
+            successful runs that were neither restored from the cache nor
+            stopped early, or None if no timings have been recorded.
+    """
+    rates = [
+        entry["wall_time"] / entry["cost_units"]
+        for entry in load_manifest(manifest_path).values()
+        if entry["exit_status"] == 0
+        and not entry.get("cached")
+        and not entry.get("stopped")
+        and entry.get("wall_time") is not None
+        and entry.get("cost_units")
+    ]
+    if not rates:
+        return None
+    return float(np.median(rates))
+
+
+def estimate_costs(
+    jobs: Sequence[RunArgs],
+    manifest_path: str | Path | None = None,
+    cost_model: CostModel | None = None,
+) -> tuple[np.ndarray, bool]:
+    """
+    Estimate the cost of each run of a campaign from its parameters file.
+
+    Args:
+        jobs (Sequence[RunArgs]): The runs of the campaign.
+        manifest_path (str, optional): Manifest with timings of earlier runs,
+            used to turn the estimates into seconds. Defaults to None.
+        cost_model (CostModel, optional): Cost model fitted by
+            `mozzie.generate.benchmark`, which is used instead of the manifest
+            if given. Defaults to None.
+
+    Returns:
+        costs (np.ndarray): The estimated cost of each run.
+        calibrated (bool): Whether the costs are in seconds. If not, they are
+            in the relative units of `cost_units`.
+    """
+    if cost_model is not None:
+        predicted = [
+            cost_model.predict(params_path, coords_path)
+            for *_, params_path, coords_path in jobs
+        ]
+        return np.array(predicted, dtype=float), True
+
+    costs = np.array([cost_units(job[2]) for job in jobs], dtype=float)
+    rate = None if manifest_path is None else seconds_per_unit(manifest_path)
+    if rate is None:
+        return costs, False
+    return costs * rate, True
+
+
+def longest_first(jobs: Sequence[RunArgs], costs: np.ndarray) -> list[RunArgs]:
+    """
+    Order the runs from the most to the least expensive.
+
+    Starting the long runs first stops them from landing at the end of a
+    parallel campaign while most workers sit idle.
+
+    Args:
+        jobs (Sequence[RunArgs]): The runs of the campaign.
+        costs (np.ndarray): The estimated cost of each run.
+
+    Returns:
+        list[RunArgs]: The reordered runs, ties kept in their original order.
+    """
+    order = np.argsort(-np.asarray(costs), kind="stable")
+    return [jobs[i] for i in order]
+
+
+def predict_makespan(costs: np.ndarray, num_workers: int) -> float:
+    """
+    Predict how long a campaign takes when the runs are started in order.
+
+    Each run is given to whichever worker becomes free first.
+
+    Args:
+        costs (np.ndarray): The estimated cost of each run, in start order.
+        num_workers (int): The number of runs carried out at the same time.
+
+    Returns:
+        float: The predicted time until the last run finishes.
+    """
+    if num_workers < 1:
+        msg = "num_workers must be a positive integer."
+        raise ValueError(msg)
+
+    workers = [0.0] * num_workers
+    for cost in costs:
+        heapq.heappush(workers, heapq.heappop(workers) + float(cost))
+    return max(workers)
+
+
+class JobQueue:
+    """
+    A work queue of GDSiMS runs kept in an SQLite database on shared storage.
+
+    Any number of worker processes, on any number of hosts that can see the
+    database file, can claim runs from the queue. A claimed run holds a lease
+    which the worker renews with `heartbeat` while the simulation is going.
+    If a worker dies, its lease runs out and the run is handed to the next
+    worker that asks, up to `max_attempts` times.
+
+    SQLite relies on file locking, so the database should sit on a filesystem
+    with working POSIX locks (e.g. NFSv4 or Lustre with locking enabled).
+
+    Args:
+        db_path (str): Path to the SQLite database, created if missing.
+        lease_seconds (float): How long a claim lasts without a heartbeat.
+            Defaults to 600.
+        max_attempts (int): How many times a run is tried before it is marked
+            as failed. Defaults to 3.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        lease_seconds: float = 600.0,
+        max_attempts: int = 3,
+    ):
+        self.db_path = Path(db_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY,
+                    script_path TEXT NOT NULL,
+                    working_dir TEXT NOT NULL,
+                    params_path TEXT NOT NULL UNIQUE,
+                    coords_path TEXT,
+                    priority REAL NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    exit_status INTEGER,
+                    error TEXT
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection and hold a write lock for the whole block."""
+        conn = sqlite3.connect(str(self.db_path), timeout=60, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def add_jobs(
+        self, jobs: list[RunArgs], priorities: np.ndarray | None = None
+    ) -> int:
+        """
+        Add runs to the queue, skipping any params file that is already queued.
+
+        Args:
+            jobs (list[RunArgs]): The runs to add.
+            priorities (np.ndarray, optional): Runs with a higher priority are
+                claimed first, e.g. the costs from `estimate_costs`.
+                Defaults to None.
+
+        Returns:
+            int: The number of runs that were added.
+        """
+        if priorities is None:
+            priorities = np.zeros(len(jobs))
+        rows = [
+            (
+                str(script_path),
+                str(working_dir),
+                str(params_path),
+                None if coords_path is None else str(coords_path),
+                float(priority),
+            )
+            for (script_path, working_dir, params_path, coords_path), priority in zip(
+                jobs, priorities, strict=True
+            )
+        ]
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs "
+                "(script_path, working_dir, params_path, coords_path, priority) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            return conn.total_changes - before
+
+    def claim(self, worker: str) -> tuple[int, RunArgs] | None:
+        """
+        Claim the next run, taking over runs whose lease has run out.
+
+        Args:
+            worker (str): Name of the worker, e.g. host name and process id.
+
+        Returns:
+            tuple[int, RunArgs] | None: The job id and the run arguments, or
+                None if there is nothing left to claim.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            # Runs whose worker disappeared too often are given up on
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'lease expired' "
+                "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT id, script_path, working_dir, params_path, coords_path "
+                "FROM jobs WHERE status = 'pending' "
+                "OR (status = 'running' AND lease_expires < ?) "
+                "ORDER BY priority DESC, id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker, now + self.lease_seconds, row[0]),
+            )
+        return row[0], (row[1], row[2], row[3], row[4])
+
+    def heartbeat(self, job_id: int, worker: str) -> bool:
+        """
+        Renew the lease on a claimed run.
+
+        Returns:
+            bool: False if the run is no longer held by this worker.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str) -> bool:
+        """
+        Mark a claimed run as done.
+
+        Returns:
+            bool: False if the run is no longer held by this worker, in which
+                case it is left as it is.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'done', exit_status = 0, "
+                "lease_expires = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (job_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def fail(
+        self, job_id: int, worker: str, error: str, exit_status: int | None = None
+    ) -> bool:
+        """
+        Release a claimed run after a failure.
+
+        The run goes back in the queue unless it has used up `max_attempts`.
+
+        Returns:
+            bool: False if the run is no longer held by this worker, in which
+                case it is left as it is.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' "
+                "ELSE 'pending' END, error = ?, exit_status = ?, "
+                "lease_expires = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (self.max_attempts, error, exit_status, job_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def counts(self) -> dict[str, int]:
+        """Number of runs in each state: pending, running, done and failed."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {"pending": 0, "running": 0, "done": 0, "failed": 0} | dict(rows)
+
+
+def run_worker(
+    queue: JobQueue,
+    worker: str | None = None,
+    manifest_path: str | Path | None = None,
+    script_hash: str | None = None,
+    max_jobs: int | None = None,
+    **run_kwargs,
+) -> int:
+    """
+    Claim and run jobs from a queue until it is empty.
+
+    While a run is going, a background thread renews its lease every third of
+    `queue.lease_seconds`. If the lease cannot be renewed because another
+    worker has taken the run over, the run is killed and left to that worker
+    without being completed, failed or recorded here. The same goes for a run
+    that finishes after its lease was taken over but before it was renewed.
+
+    Args:
+        queue (JobQueue): The queue to take runs from.
+        worker (str, optional): Name of the worker. Defaults to the host name
+            and process and thread ids.
+        manifest_path (str, optional): Completion manifest to record finished
+            runs in, see `record_run`. Defaults to None.
+        script_hash (str, optional): Hash of the GDSiMS executable to record in
+            the manifest. Defaults to None.
+        max_jobs (int, optional): Stop after this many runs. Defaults to None.
+        **run_kwargs: Further arguments for `run_custom`, e.g. `scratch_root`.
+
+    Returns:
+        int: The number of runs that finished successfully.
+    """
+    if worker is None:
+        worker = f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+
+    num_done = 0
+    num_claimed = 0
+    while max_jobs is None or num_claimed < max_jobs:
+        claimed = queue.claim(worker)
+        if claimed is None:
+            break
+        num_claimed += 1
+        job_id, run_args = claimed
+
+        finished = threading.Event()
+        lost = threading.Event()
+
+        def keep_alive(
+            job_id: int = job_id,
+            finished: threading.Event = finished,
+            lost: threading.Event = lost,
+        ):
+            while not finished.wait(queue.lease_seconds / 3):
+                if not queue.heartbeat(job_id, worker):
+                    lost.set()
+                    return
+
+        heartbeat_thread = threading.Thread(target=keep_alive, daemon=True)
+        heartbeat_thread.start()
+        start_time = time.monotonic()
+        error = None
+        exit_status = None
+        cached = False
+        try:
+            script_path, _, params_path, coords_path = run_args
+            cache_dir = run_kwargs.get("cache_dir")
+            if cache_dir is not None:
+                cached = is_cached(cache_dir, script_path, params_path, coords_path)
+            run_custom(*run_args, cancel=lost, **run_kwargs)
+        except subprocess.CalledProcessError as e:
+            error, exit_status = f"exit status {e.returncode}", e.returncode
+        except (OSError, RuntimeError, TimeoutError, ValueError) as e:
+            error = repr(e)
+        finally:
+            finished.set()
+            heartbeat_thread.join()
+
+        if lost.is_set():
+            # The lease ran out and the run was handed to another worker,
+            # which now records it
+            continue
+        if error is not None:
+            held = queue.fail(job_id, worker, error, exit_status)
+            if held and exit_status is not None and manifest_path is not None:
+                record_run(manifest_path, run_args, exit_status, script_hash)
+            continue
+
+        # The lease can also be lost after the last heartbeat of the run
+        if not queue.complete(job_id, worker):
+            continue
+        if manifest_path is not None:
+            record_run(
+                manifest_path,
+                run_args,
+                0,
+                script_hash,
+                time.monotonic() - start_time,
+                cached,
+            )
+        num_done += 1
+
+    return num_done
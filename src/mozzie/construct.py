@@ -1,41 +1,334 @@
+from pathlib import Path
+
 import numpy as np
+from scipy.spatial import cKDTree
 from scipy.stats import qmc
 
+from mozzie.generate import load_params_table, parameter_order, save_params_table
+
+# Designs that `generate_parameter_samples` can draw.
+sampling_methods = ("lhs", "maximin_lhs", "sobol", "halton")
+
+# Ways `extend_parameter_samples` can add points to an existing design.
+extension_methods = ("maximin", "sobol")
+
+# Types of parameter that can be sampled, see `scale_samples`.
+parameter_types = ("float", "log_float", "int")
+
+
+def _check_to_sample(to_sample: dict) -> None:
+    """Raise a ValueError if any of the parameter options are not supported."""
+    for param_name, param_options in to_sample.items():
+        if param_options["type"] not in parameter_types:
+            msg = f"Unsupported type {param_options['type']} for {param_name}."
+            raise ValueError(msg)
+        if not param_options["min"] < param_options["max"]:
+            msg = (
+                f"Invalid range for {param_name}: "
+                f"{param_options['min']} >= {param_options['max']}."
+            )
+            raise ValueError(msg)
+        if param_options["type"] == "log_float" and param_options["min"] <= 0:
+            msg = f"Invalid range for {param_name}: log_float needs a positive min."
+            raise ValueError(msg)
+
+
+def _closest_pair_distance(points: np.ndarray) -> float:
+    """The distance between the two closest points, without all the pairs."""
+    return float(cKDTree(points).query(points, k=2)[0][:, 1].min())
+
+
+def _maximin_lhs(
+    num_params: int, num_samples: int, seed: int | None, num_candidates: int
+) -> np.ndarray:
+    """Draw several Latin Hypercubes and keep the one whose closest points are
+    furthest apart."""
+    rng = np.random.default_rng(seed)
+    candidates = [
+        qmc.LatinHypercube(d=num_params, seed=rng).random(num_samples)
+        for _ in range(num_candidates)
+    ]
+    if num_samples < 2:
+        return candidates[0]
+    return max(candidates, key=_closest_pair_distance)
+
+
+def unit_samples(
+    num_params: int,
+    num_samples: int,
+    method: str = "lhs",
+    seed: int | None = None,
+    num_candidates: int = 50,
+) -> np.ndarray:
+    """
+    Draw a space-filling design in the unit hypercube.
+
+    Sobol points are only balanced in blocks of a power of two, so for other
+    sizes the first `num_samples` points of the next block are used.
+
+    Args:
+        num_params (int): Number of dimensions.
+        num_samples (int): Number of points.
+        method (str): One of `sampling_methods`. Defaults to "lhs".
+        seed (int, optional): Seed of the random numbers. Defaults to None.
+        num_candidates (int): Number of Latin Hypercubes to choose from for
+            "maximin_lhs". Defaults to 50.
+
+    Returns:
+        ndarray: Array of points with shape (num_samples, num_params).
+    """
+    if method == "lhs":
+        return qmc.LatinHypercube(d=num_params, seed=seed).random(num_samples)
+    if method == "maximin_lhs":
+        return _maximin_lhs(num_params, num_samples, seed, num_candidates)
+    if method == "sobol":
+        sobol = qmc.Sobol(d=num_params, scramble=True, seed=seed)
+        power = max(int(np.ceil(np.log2(num_samples))), 0)
+        return sobol.random_base2(power)[:num_samples]
+    if method == "halton":
+        return qmc.Halton(d=num_params, scramble=True, seed=seed).random(num_samples)
+
+    msg = f"Unknown sampling method {method}, expected one of {sampling_methods}."
+    raise ValueError(msg)
+
+
+def scale_samples(unit: np.ndarray, to_sample: dict) -> np.ndarray:
+    """
+    Map points in the unit hypercube onto the parameter ranges.
+
+    A "float" is spread evenly between `min` and `max`, a "log_float" evenly
+    in its logarithm and an "int" evenly over the whole numbers from `min` to
+    `max` inclusive.
+
+    Args:
+        unit (ndarray): Points in the unit hypercube, one column per parameter.
+        to_sample (dict): Dictionary of parameters to sample with their options
+
+    Returns:
+        ndarray: The parameter values, with the same shape as `unit`.
+    """
+    samples = np.empty_like(unit, dtype=float)
+    for j, param_options in enumerate(to_sample.values()):
+        low, high = param_options["min"], param_options["max"]
+        if param_options["type"] == "log_float":
+            samples[:, j] = low * (high / low) ** unit[:, j]
+        elif param_options["type"] == "int":
+            values = np.floor(low + unit[:, j] * (high - low + 1))
+            samples[:, j] = np.clip(values, low, high)
+        else:
+            samples[:, j] = low + unit[:, j] * (high - low)
+    return samples
+
+
+def unscale_samples(samples: np.ndarray, to_sample: dict) -> np.ndarray:
+    """
+    Map parameter values back into the unit hypercube, undoing `scale_samples`.
+
+    Whole numbers of an "int" parameter go to the middle of their slice.
+
+    Args:
+        samples (ndarray): The parameter values, one column per parameter.
+        to_sample (dict): Dictionary of parameters to sample with their options
+
+    Returns:
+        ndarray: Points in the unit hypercube, with the same shape as `samples`.
+    """
+    unit = np.empty_like(samples, dtype=float)
+    for j, param_options in enumerate(to_sample.values()):
+        low, high = param_options["min"], param_options["max"]
+        if param_options["type"] == "log_float":
+            unit[:, j] = np.log(samples[:, j] / low) / np.log(high / low)
+        elif param_options["type"] == "int":
+            unit[:, j] = (samples[:, j] - low + 0.5) / (high - low + 1)
+        else:
+            unit[:, j] = (samples[:, j] - low) / (high - low)
+    return np.clip(unit, 0.0, 1.0)
+
+
+def sample_discrepancy(
+    samples: np.ndarray, to_sample: dict, method: str = "CD"
+) -> float:
+    """
+    Measure how evenly a design fills the parameter space.
+
+    Args:
+        samples (ndarray): The parameter values, one column per parameter.
+        to_sample (dict): Dictionary of parameters to sample with their options
+        method (str): Type of discrepancy, as in `scipy.stats.qmc.discrepancy`.
+            Defaults to "CD", the centred discrepancy.
+
+    Returns:
+        float: The discrepancy, lower for a more even design.
+    """
+    return float(qmc.discrepancy(unscale_samples(samples, to_sample), method=method))
+
 
 def generate_parameter_samples(
     to_sample: dict,
     num_samples: int,
     seed: int | None = None,
+    method: str = "lhs",
 ) -> np.ndarray:
     """
-    Generate Latin Hypercube samples for the given parameters.
+    Generate space-filling samples for the given parameters.
 
     Args:
         to_sample (dict): Dictionary of parameters to sample with their options
         num_samples (int): Number of samples to generate
+        seed (int, optional): Seed of the random numbers. Defaults to None.
+        method (str): One of `sampling_methods`, see `unit_samples`. Defaults
+            to "lhs", a plain Latin Hypercube.
 
     Returns:
         samples (ndarray): Array of samples with shape (num_samples, num_parameters)
     """
-    # Pull out the parameters to sample
-    cube_ranges = []
-    for param_name, param_options in to_sample.items():
-        if param_options["type"] != "float":
-            msg = f"Unsupported type {param_options['type']} for {param_name}."
-            raise ValueError(msg)
-        if not param_options["min"] < param_options["max"]:
+    _check_to_sample(to_sample)
+    unit = unit_samples(len(to_sample), num_samples, method, seed)
+    return scale_samples(unit, to_sample)
+
+
+def _greedy_maximin(
+    existing: np.ndarray, candidates: np.ndarray, num_samples: int
+) -> np.ndarray:
+    """Pick candidates one at a time, each as far as possible from all the
+    points so far."""
+    if len(existing):
+        # A tree query keeps memory linear in the pool and the existing design
+        min_distance = cKDTree(existing).query(candidates)[0]
+    else:
+        min_distance = np.full(len(candidates), np.inf)
+    picked = []
+    for _ in range(num_samples):
+        best = int(np.argmax(min_distance))
+        picked.append(best)
+        distance = np.linalg.norm(candidates - candidates[best], axis=1)
+        np.minimum(min_distance, distance, out=min_distance)
+    return candidates[picked]
+
+
+def extend_parameter_samples(
+    existing: np.ndarray,
+    to_sample: dict,
+    num_samples: int,
+    seed: int | None = None,
+    method: str = "maximin",
+    num_candidates: int | None = None,
+) -> np.ndarray:
+    """
+    Generate new samples that keep an existing design space-filling.
+
+    With "maximin", new points are picked greedily from a large Sobol pool,
+    each as far as possible from the existing points and the ones picked so
+    far. With "sobol", the existing design must be the first points of the
+    Sobol sequence drawn by `generate_parameter_samples` with the same `seed`,
+    and the sequence is carried on from where it stopped.
+
+    Args:
+        existing (ndarray): The samples already in the design, with one column
+            per parameter in `to_sample`.
+        to_sample (dict): Dictionary of parameters to sample with their options
+        num_samples (int): Number of new samples to generate
+        seed (int, optional): Seed of the random numbers. Defaults to None.
+        method (str): One of `extension_methods`. Defaults to "maximin".
+        num_candidates (int, optional): Size of the pool to pick from for
+            "maximin". Defaults to 100 times `num_samples`, at least 4096.
+
+    Returns:
+        samples (ndarray): Array of new samples with shape
+            (num_samples, num_parameters)
+    """
+    _check_to_sample(to_sample)
+    existing = np.asarray(existing, dtype=float).reshape(-1, len(to_sample))
+
+    if method == "sobol":
+        if seed is None:
             msg = (
-                f"Invalid range for {param_name}: "
-                f"{param_options['min']} >= {param_options['max']}."
+                "A sobol design can only be carried on with the seed it was drawn with."
             )
             raise ValueError(msg)
+        total = len(existing) + num_samples
+        unit = unit_samples(len(to_sample), total, "sobol", seed)[len(existing) :]
+        return scale_samples(unit, to_sample)
+
+    if method == "maximin":
+        if num_candidates is None:
+            num_candidates = max(100 * num_samples, 4096)
+        candidates = unit_samples(len(to_sample), num_candidates, "sobol", seed)
+        unit = _greedy_maximin(
+            unscale_samples(existing, to_sample), candidates, num_samples
+        )
+        return scale_samples(unit, to_sample)
+
+    msg = f"Unknown extension method {method}, expected one of {extension_methods}."
+    raise ValueError(msg)
+
+
+def build_params_rows(
+    set_values: dict, to_sample: dict, samples: np.ndarray, start_index: int
+) -> np.ndarray:
+    """
+    Put samples together with the fixed values into rows of a parameter table.
+
+    Args:
+        set_values (dict): The fixed value of each parameter that is not sampled.
+        to_sample (dict): Dictionary of parameters to sample with their options
+        samples (ndarray): The sampled values, one column per parameter in
+            `to_sample`.
+        start_index (int): The `set_label` of the first sample, with the rest
+            numbered on from it.
+
+    Returns:
+        ndarray: One row per sample with a column for each parameter in
+            `parameter_order`, see `mozzie.generate.save_params_table`.
+    """
+    cube_names = list(to_sample)
+    values = np.empty((len(samples), len(parameter_order)))
+    for j, param_name in enumerate(parameter_order):
+        if param_name in cube_names:
+            values[:, j] = samples[:, cube_names.index(param_name)]
+        elif param_name == "set_label":
+            values[:, j] = np.arange(start_index, start_index + len(samples))
+        elif param_name in set_values:
+            values[:, j] = set_values[param_name]
+        else:
+            msg = f"Parameter {param_name} not found in the set."
+            raise ValueError(msg)
+    return values
+
+
+def extend_params_table(
+    table_path: str | Path,
+    set_values: dict,
+    to_sample: dict,
+    num_samples: int,
+    seed: int | None = None,
+    method: str = "maximin",
+) -> np.ndarray:
+    """
+    Add new samples to a campaign's parameter table, see `extend_parameter_samples`.
+
+    Every run already in the table counts as part of the design. The new runs
+    are labelled on from the highest `set_label` in the table.
 
-        cube_ranges.append((param_options["min"], param_options["max"]))
+    Args:
+        table_path (str): Path to the parameter table.
+        set_values (dict): The fixed value of each parameter that is not sampled.
+        to_sample (dict): Dictionary of parameters to sample with their options
+        num_samples (int): Number of new samples to generate
+        seed (int, optional): Seed of the random numbers. Defaults to None.
+        method (str): One of `extension_methods`. Defaults to "maximin".
 
-    # Generate the Latin Hypercube samples
-    lhc_sampler = qmc.LatinHypercube(d=len(cube_ranges), seed=seed)
-    return qmc.scale(
-        lhc_sampler.random(num_samples),
-        [r[0] for r in cube_ranges],
-        [r[1] for r in cube_ranges],
+    Returns:
+        ndarray: The rows added to the table.
+    """
+    table = load_params_table(table_path)
+    columns = [parameter_order.index(name) for name in to_sample]
+    existing = table[:, columns]
+    start_index = (
+        int(table[:, parameter_order.index("set_label")].max()) + 1 if len(table) else 0
     )
+
+    samples = extend_parameter_samples(existing, to_sample, num_samples, seed, method)
+    values = build_params_rows(set_values, to_sample, samples, start_index)
+    save_params_table(table_path, values)
+    return values
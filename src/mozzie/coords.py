@@ -1,30 +1,671 @@
+from __future__ import annotations
+
+import functools
+import os
+import re
+import tempfile
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
 import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import cdist
 
+# Layouts that `make_coords` can generate.
+coords_types = ("grid", "random", "hex", "clustered", "csv")
 
-def make_grid_coords(coords_set: dict) -> list[tuple[float, float]]:
-    """Generate a grid of coordinates based on the x_set and y_set."""
 
-    # Validate x_set
-    if "x_set" not in coords_set or not isinstance(coords_set["x_set"], dict):
-        msg = "coords_set must contain an x_set mapping."
+def _axis_bounds(coords_set: dict, axis: str, keys: tuple[str, ...]) -> dict:
+    """Validate the x_set or y_set of a coords_set and return it."""
+    axis_set = coords_set.get(f"{axis}_set")
+    if not isinstance(axis_set, dict):
+        msg = f"coords_set must contain a {axis}_set mapping."
         raise ValueError(msg)
-    x_set = coords_set["x_set"]
-    for k in ("min_x", "max_x", "num_x"):
-        if k not in x_set:
-            msg = f"x_set missing required key: {k}"
+    for k in keys:
+        if k not in axis_set:
+            msg = f"{axis}_set missing required key: {k}"
             raise ValueError(msg)
+    return axis_set
 
-    # Validate y_set
-    if "y_set" not in coords_set or not isinstance(coords_set["y_set"], dict):
-        msg = "coords_set must contain a y_set mapping."
+
+def _bounds(coords_set: dict) -> tuple[float, float, float, float]:
+    """The min_x, max_x, min_y and max_y of a coords_set."""
+    x_set = _axis_bounds(coords_set, "x", ("min_x", "max_x"))
+    y_set = _axis_bounds(coords_set, "y", ("min_y", "max_y"))
+    return x_set["min_x"], x_set["max_x"], y_set["min_y"], y_set["max_y"]
+
+
+def _required(coords_set: dict, key: str) -> Any:
+    """A required value of a coords_set."""
+    if key not in coords_set:
+        msg = f"coords_set missing required key: {key}"
         raise ValueError(msg)
-    y_set = coords_set["y_set"]
-    for k in ("min_y", "max_y", "num_y"):
-        if k not in y_set:
-            msg = f"y_set missing required key: {k}"
-            raise ValueError(msg)
+    return coords_set[key]
+
+
+def grid_coords(coords_set: dict) -> np.ndarray:
+    """Generate a grid of coordinates based on the x_set and y_set, as an array."""
+    x_set = _axis_bounds(coords_set, "x", ("min_x", "max_x", "num_x"))
+    y_set = _axis_bounds(coords_set, "y", ("min_y", "max_y", "num_y"))
 
     x_values = np.linspace(x_set["min_x"], x_set["max_x"], x_set["num_x"])
     y_values = np.linspace(y_set["min_y"], y_set["max_y"], y_set["num_y"])
+    x_grid, y_grid = np.meshgrid(x_values, y_values, indexing="ij")
+    return np.column_stack([x_grid.ravel(), y_grid.ravel()])
+
+
+def make_grid_coords(coords_set: dict) -> list[tuple[float, float]]:
+    """Generate a grid of coordinates based on the x_set and y_set."""
+    return [(x, y) for x, y in grid_coords(coords_set).tolist()]
+
+
+def random_coords(
+    coords_set: dict, rng: np.random.Generator | int | None = None
+) -> np.ndarray:
+    """Spread `num_coords` coordinates uniformly at random within the bounds."""
+    min_x, max_x, min_y, max_y = _bounds(coords_set)
+    num_coords = int(_required(coords_set, "num_coords"))
+    rng = np.random.default_rng(rng)
+    return rng.uniform((min_x, min_y), (max_x, max_y), (num_coords, 2))
+
+
+def hex_coords(coords_set: dict) -> np.ndarray:
+    """
+    Fill the bounds with a hexagonal lattice whose neighbours are `spacing` apart.
+
+    Rows are `spacing * sqrt(3) / 2` apart, with every other row shifted by
+    half a spacing, starting from the min_x and min_y corner.
+    """
+    min_x, max_x, min_y, max_y = _bounds(coords_set)
+    spacing = float(_required(coords_set, "spacing"))
+    if spacing <= 0:
+        msg = "spacing must be positive."
+        raise ValueError(msg)
+
+    row_spacing = spacing * np.sqrt(3) / 2
+    rows = np.arange(int(np.floor((max_y - min_y) / row_spacing + 1e-9)) + 1)
+    columns = np.arange(int(np.floor((max_x - min_x) / spacing + 1e-9)) + 1)
+    x_grid = min_x + spacing * (columns[None, :] + 0.5 * (rows[:, None] % 2))
+    y_grid = np.broadcast_to(min_y + row_spacing * rows[:, None], x_grid.shape)
+    coords = np.column_stack([x_grid.ravel(), y_grid.ravel()])
+    return coords[coords[:, 0] <= max_x + 1e-9 * spacing]
+
+
+def clustered_coords(
+    coords_set: dict, rng: np.random.Generator | int | None = None
+) -> np.ndarray:
+    """
+    Scatter `num_coords` coordinates in `num_clusters` clusters within the bounds.
+
+    The cluster centres are uniform within the bounds, and each coordinate is
+    normally distributed with standard deviation `cluster_std` around a
+    centre chosen at random. Coordinates falling outside the bounds are
+    drawn again.
+    """
+    min_x, max_x, min_y, max_y = _bounds(coords_set)
+    num_coords = int(_required(coords_set, "num_coords"))
+    num_clusters = int(_required(coords_set, "num_clusters"))
+    cluster_std = float(_required(coords_set, "cluster_std"))
+    if num_clusters <= 0 or cluster_std <= 0:
+        msg = "num_clusters and cluster_std must be positive."
+        raise ValueError(msg)
+    rng = np.random.default_rng(rng)
+    low, high = np.array([min_x, min_y]), np.array([max_x, max_y])
+
+    centres = rng.uniform(low, high, (num_clusters, 2))
+    coords = np.empty((num_coords, 2))
+    outside = np.arange(num_coords)
+    while len(outside):
+        cluster = rng.integers(0, num_clusters, len(outside))
+        coords[outside] = rng.normal(centres[cluster], cluster_std)
+        inside = ((coords[outside] >= low) & (coords[outside] <= high)).all(axis=1)
+        outside = outside[~inside]
+    return coords
+
+
+def csv_coords(csv_path: str | Path) -> np.ndarray:
+    """
+    Read coordinates from the x and y columns of a comma or tab separated file.
+
+    A GDSiMS coordinates file can be read too, ignoring its release sites.
+    """
+    csv_path = Path(csv_path)
+    if not csv_path.is_file():
+        msg = f"Coordinates file {csv_path} does not exist."
+        raise FileNotFoundError(msg)
+    with csv_path.open() as file:
+        header = file.readline()
+    table = pd.read_csv(
+        csv_path, sep="\t" if "\t" in header else ",", usecols=["x", "y"]
+    )
+    return table[["x", "y"]].to_numpy(dtype=float)
+
+
+def make_coords(
+    coords_set: dict,
+    rng: np.random.Generator | int | None = None,
+    base_dir: str | Path = ".",
+) -> np.ndarray:
+    """
+    Generate the coordinates of a coords_set, see `coords_types`.
+
+    Args:
+        coords_set (dict): The coords_set of a config, with its `coords_type`
+            and the options of that layout.
+        rng (Generator | int, optional): Random number generator, or a seed for
+            one, for the random layouts. Defaults to None.
+        base_dir (str): Directory that the `csv_path` of a "csv" layout is
+            relative to. Defaults to the current directory.
+
+    Returns:
+        np.ndarray: The x and y of each coordinate, with shape (num_coords, 2).
+    """
+    coords_type = coords_set.get("coords_type")
+    if coords_type == "grid":
+        return grid_coords(coords_set)
+    if coords_type == "random":
+        return random_coords(coords_set, rng)
+    if coords_type == "hex":
+        return hex_coords(coords_set)
+    if coords_type == "clustered":
+        return clustered_coords(coords_set, rng)
+    if coords_type == "csv":
+        return csv_coords(Path(base_dir) / _required(coords_set, "csv_path"))
+
+    msg = f"Unknown coords_type {coords_type}, expected one of {coords_types}."
+    raise ValueError(msg)
+
+
+@functools.lru_cache(maxsize=4)
+def _cached_tree(data: bytes, num_coords: int) -> cKDTree:
+    """Build the KD-tree of some coordinates, only once for the same ones."""
+    return cKDTree(np.frombuffer(data).reshape(num_coords, 2))
+
+
+def coords_tree(coords: np.ndarray) -> cKDTree:
+    """
+    The KD-tree of some coordinates, kept for the next call with the same ones.
+
+    Args:
+        coords (np.ndarray): The x and y of each coordinate.
+
+    Returns:
+        cKDTree: A spatial index of the coordinates.
+    """
+    coords = np.ascontiguousarray(coords, dtype=float)
+    return _cached_tree(coords.tobytes(), len(coords))
+
+
+def neighbours_within(
+    coords: np.ndarray, max_disp: float, indices: Iterable[int] | None = None
+) -> list[np.ndarray]:
+    """
+    Find the coordinates within `max_disp` of some of the coordinates.
+
+    This is the neighbourhood that mosquitoes can disperse to from a patch.
+
+    Args:
+        coords (np.ndarray): The x and y of each coordinate.
+        max_disp (float): The largest distance to a neighbour.
+        indices (Iterable[int], optional): The coordinates to find the
+            neighbours of. Defaults to None, which is every coordinate.
+
+    Returns:
+        list[np.ndarray]: The sorted indices of the neighbours of each
+            coordinate, not including itself.
+    """
+    coords = np.asarray(coords, dtype=float)
+    indices = np.arange(len(coords)) if indices is None else np.asarray(indices)
+    found = coords_tree(coords).query_ball_point(
+        coords[indices], max_disp, return_sorted=True
+    )
+    return [
+        np.array([n for n in neighbours if n != idx], dtype=int)
+        for idx, neighbours in zip(indices.tolist(), found, strict=True)
+    ]
+
+
+def neighbour_pairs(coords: np.ndarray, max_disp: float) -> np.ndarray:
+    """
+    Find every pair of coordinates within `max_disp` of each other.
+
+    Args:
+        coords (np.ndarray): The x and y of each coordinate.
+        max_disp (float): The largest distance between a pair.
+
+    Returns:
+        np.ndarray: One row per pair with the lower index first, shape (m, 2).
+    """
+    return coords_tree(coords).query_pairs(max_disp, output_type="ndarray")
+
+
+def draw_release_sites(
+    num_coords: int,
+    num_release_sites: int,
+    num_samples: int,
+    rng: np.random.Generator | int | None = None,
+) -> np.ndarray:
+    """
+    Draw the release sites of every sample at once, without repeats in a sample.
+
+    The last coordinate is never drawn, to avoid an off-by-one error in GDSiMS.
+
+    Args:
+        num_coords (int): Number of coordinates to draw from.
+        num_release_sites (int): Number of release sites in each sample.
+        num_samples (int): Number of samples.
+        rng (Generator | int, optional): Random number generator, or a seed for
+            one. Defaults to None.
+
+    Returns:
+        np.ndarray: The coordinate indices of the release sites, with shape
+            (num_samples, num_release_sites).
+    """
+    num_choices = num_coords - 1  # -1 is to avoid the off-by-one error in GDSiMS
+    if num_release_sites <= 0:
+        msg = "Number of release sites must be a positive integer."
+        raise ValueError(msg)
+    if num_release_sites > num_choices:
+        msg = (
+            f"Number of release sites ({num_release_sites}) exceeds "
+            f"available coordinates ({num_choices})."
+        )
+        raise ValueError(msg)
+    rng = np.random.default_rng(rng)
+
+    if num_release_sites**2 > 4 * num_choices:
+        # Many sites per sample, so shuffle the coordinates a block of rows at a time
+        rows_per_block = max(10_000_000 // num_choices, 1)
+        blocks = [
+            rng.random(
+                (min(rows_per_block, num_samples - start), num_choices)
+            ).argpartition(num_release_sites - 1, axis=1)[:, :num_release_sites]
+            for start in range(0, num_samples, rows_per_block)
+        ]
+        return (
+            np.concatenate(blocks) if blocks else np.empty((0, num_release_sites), int)
+        )
+
+    # Few sites per sample, so draw with repeats and redraw the samples that have any
+    indices = rng.integers(0, num_choices, (num_samples, num_release_sites))
+    repeated = np.arange(num_samples)
+    while True:
+        ordered = np.sort(indices[repeated], axis=1)
+        repeated = repeated[(np.diff(ordered, axis=1) == 0).any(axis=1)]
+        if not len(repeated):
+            return indices
+        indices[repeated] = rng.integers(
+            0, num_choices, (len(repeated), num_release_sites)
+        )
+
+
+def draw_separated_release_sites(
+    coords: np.ndarray,
+    num_release_sites: int,
+    num_samples: int,
+    min_separation: float,
+    rng: np.random.Generator | int | None = None,
+) -> np.ndarray:
+    """
+    Draw release sites that are more than `min_separation` apart in each sample.
+
+    The sites of a sample are added one at a time, each uniformly among the
+    coordinates not within `min_separation` of a site already drawn, which is
+    Poisson-disk sampling of the coordinates. Each site is first tried by
+    rejection, and only once that keeps failing are the blocked coordinates
+    looked up in the KD-tree. As in `draw_release_sites`, the last coordinate
+    is never drawn.
+
+    Args:
+        coords (np.ndarray): The x and y of each coordinate.
+        num_release_sites (int): Number of release sites in each sample.
+        num_samples (int): Number of samples.
+        min_separation (float): Smallest distance between two release sites of
+            a sample.
+        rng (Generator | int, optional): Random number generator, or a seed for
+            one. Defaults to None.
+
+    Returns:
+        np.ndarray: The coordinate indices of the release sites, with shape
+            (num_samples, num_release_sites).
+    """
+    coords = np.asarray(coords, dtype=float)
+    num_choices = len(coords) - 1  # -1 is to avoid the off-by-one error in GDSiMS
+    if num_release_sites <= 0:
+        msg = "Number of release sites must be a positive integer."
+        raise ValueError(msg)
+    if num_release_sites > num_choices:
+        msg = (
+            f"Number of release sites ({num_release_sites}) exceeds "
+            f"available coordinates ({num_choices})."
+        )
+        raise ValueError(msg)
+    rng = np.random.default_rng(rng)
+
+    indices = np.empty((num_samples, num_release_sites), dtype=int)
+    for sample in range(num_samples):
+        for j in range(num_release_sites):
+            picked = coords[indices[sample, :j]]
+            # Try a few uniform draws first, which is fast while most fit
+            candidates = rng.integers(0, num_choices, 32)
+            if j:
+                fits = cdist(coords[candidates], picked).min(axis=1) > min_separation
+                candidates = candidates[fits]
+            if len(candidates):
+                indices[sample, j] = candidates[0]
+                continue
+
+            # Otherwise draw from the coordinates not close to any site so far
+            blocked = np.zeros(len(coords), dtype=bool)
+            for close in coords_tree(coords).query_ball_point(picked, min_separation):
+                blocked[close] = True
+            choices = np.flatnonzero(~blocked[:num_choices])
+            if not len(choices):
+                msg = (
+                    f"Only {j} release sites fit more than {min_separation} "
+                    f"apart, not {num_release_sites}."
+                )
+                raise ValueError(msg)
+            indices[sample, j] = choices[rng.integers(0, len(choices))]
+    return indices
+
+
+def release_sites_table(
+    coords: np.ndarray, release_indices: np.ndarray, start_index: int
+) -> np.ndarray:
+    """
+    Put the positions of the release sites of each sample into a table.
+
+    Args:
+        coords (np.ndarray): The x and y of each coordinate.
+        release_indices (np.ndarray): The release sites of each sample, as
+            from `draw_release_sites`.
+        start_index (int): The index of the first sample.
+
+    Returns:
+        np.ndarray: One row per sample with its index followed by `x_1`, `y_1`,
+            `x_2`, `y_2` and so on for each release site.
+    """
+    coords = np.asarray(coords, dtype=float)
+    num_samples = len(release_indices)
+    positions = coords[release_indices].reshape(num_samples, -1)
+    sample_idx = np.arange(start_index, start_index + num_samples)
+    return np.column_stack([sample_idx, positions])
+
+
+def release_sites_columns(num_release_sites: int) -> list[str]:
+    """The column names of a `release_sites_table`, as in `release_sites.csv`."""
+    return ["sample_idx"] + [
+        f"{axis}_{i + 1}" for i in range(num_release_sites) for axis in ("x", "y")
+    ]
+
+
+def write_coords_files(
+    coords: np.ndarray,
+    release_indices: np.ndarray,
+    coords_dir: str | Path,
+    start_index: int,
+) -> list[Path]:
+    """
+    Write a GDSiMS coordinates file, `coords_N.csv`, for each sample.
+
+    The lines of the coordinates are formatted once and reused for every
+    file, with only the release sites of the sample marked "y".
+
+    Args:
+        coords (np.ndarray): The x and y of each coordinate.
+        release_indices (np.ndarray): The release sites of each sample, as
+            from `draw_release_sites`.
+        coords_dir (str): Directory to write the files to.
+        start_index (int): The index of the first sample.
+
+    Returns:
+        list[Path]: The paths of the files written.
+    """
+    coords_dir = Path(coords_dir)
+    prefixes = _coords_prefixes(np.asarray(coords, dtype=float))
+
+    paths = []
+    for s_i, sample_indices in enumerate(release_indices, start=start_index):
+        path = coords_dir / f"coords_{s_i}.csv"
+        path.write_text(_coords_text(prefixes, sample_indices))
+        paths.append(path)
+    return paths
+
+
+def _coords_prefixes(coords: np.ndarray) -> list[str]:
+    """The x and y columns of each line of a GDSiMS coordinates file."""
+    return [f"{x!r}\t{y!r}\t" for x, y in coords.tolist()]
+
+
+def _coords_text(prefixes: list[str], release_indices: Iterable[int]) -> str:
+    """The contents of a GDSiMS coordinates file with the given release sites."""
+    lines = [f"{prefix}n\n" for prefix in prefixes]
+    for idx in release_indices:
+        lines[idx] = f"{prefixes[idx]}y\n"
+    return "x\ty\tif\n" + "".join(lines)
+
+
+# Name of the release site store, kept next to the coordinates folder.
+release_store_name = "release_sites.npz"
+
+
+def save_release_store(
+    store_path: str | Path,
+    coords: np.ndarray,
+    release_indices: np.ndarray,
+    start_index: int,
+) -> None:
+    """
+    Add the release sites of some samples to a campaign's release site store.
+
+    The store keeps the coordinates shared by every sample once, with only
+    the indices of each sample's release sites, in place of a full
+    coordinates file per sample. Samples already in the store are replaced.
+
+    Args:
+        store_path (str): Path to the store, usually `release_store_name`
+            next to the coordinates folder.
+        coords (np.ndarray): The x and y of each coordinate.
+        release_indices (np.ndarray): The release sites of each sample, as
+            from `draw_release_sites`.
+        start_index (int): The index of the first sample.
+    """
+    store_path = Path(store_path)
+    coords = np.asarray(coords, dtype=float)
+    release_indices = np.asarray(release_indices, dtype=np.int32)
+    labels = np.arange(start_index, start_index + len(release_indices))
+
+    if store_path.exists():
+        old_coords, old_labels, old_indices = load_release_store(store_path)
+        if not np.array_equal(old_coords, coords):
+            msg = f"Coordinates differ from those in {store_path}."
+            raise ValueError(msg)
+        if old_indices.shape[1] != release_indices.shape[1]:
+            msg = f"Number of release sites differs from {store_path}."
+            raise ValueError(msg)
+        kept = ~np.isin(old_labels, labels)
+        labels = np.concatenate([old_labels[kept], labels])
+        release_indices = np.concatenate([old_indices[kept], release_indices])
+
+    order = np.argsort(labels, kind="stable")
+    tmp_path = store_path.with_name(f".{store_path.name}.tmp")
+    with tmp_path.open("wb") as file:
+        np.savez(
+            file,
+            coords=coords,
+            labels=labels[order],
+            release_indices=release_indices[order],
+        )
+    os.replace(tmp_path, store_path)
+
+
+@functools.lru_cache(maxsize=4)
+def _cached_release_store(
+    store_path: str,
+    size: int,  # noqa: ARG001
+    mtime_ns: int,  # noqa: ARG001
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Load a release site store, again only once it changes."""
+    with np.load(store_path) as store:
+        loaded = store["coords"], store["labels"], store["release_indices"]
+    for array in loaded:
+        array.setflags(write=False)
+    return loaded
+
+
+def load_release_store(
+    store_path: str | Path,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Load a release site store, see `save_release_store`.
+
+    Args:
+        store_path (str): Path to the store.
+
+    Returns:
+        coords (np.ndarray): The x and y of each coordinate.
+        labels (np.ndarray): The index of each sample, in order.
+        release_indices (np.ndarray): The release sites of each sample.
+    """
+    store_path = Path(store_path)
+    if not store_path.is_file():
+        msg = f"Release site store {store_path} does not exist."
+        raise FileNotFoundError(msg)
+    stat = store_path.stat()
+    return _cached_release_store(str(store_path), stat.st_size, stat.st_mtime_ns)
+
+
+def extend_release_store(
+    store_path: str | Path,
+    start_index: int,
+    num_samples: int,
+    min_separation: float | None = None,
+    rng: np.random.Generator | int | None = None,
+) -> np.ndarray:
+    """
+    Draw the release sites of more samples and add them to a release site store.
+
+    The new samples use the coordinates and the number of release sites
+    already in the store, e.g. for runs added to a campaign after it was built.
+
+    Args:
+        store_path (str): Path to the store.
+        start_index (int): The index of the first new sample.
+        num_samples (int): Number of samples to add.
+        min_separation (float, optional): Smallest distance between two release
+            sites of a sample, as in `draw_separated_release_sites`. Defaults
+            to None, which draws them with `draw_release_sites`.
+        rng (Generator | int, optional): Random number generator, or a seed for
+            one. Defaults to None.
+
+    Returns:
+        np.ndarray: The release sites of the new samples.
+    """
+    coords, _, old_indices = load_release_store(store_path)
+    num_release_sites = old_indices.shape[1]
+    if min_separation is None:
+        release_indices = draw_release_sites(
+            len(coords), num_release_sites, num_samples, rng
+        )
+    else:
+        release_indices = draw_separated_release_sites(
+            coords, num_release_sites, num_samples, min_separation, rng
+        )
+    save_release_store(store_path, coords, release_indices, start_index)
+    return release_indices
+
+
+def release_store_for(coords_path: str | Path) -> Path:
+    """The release site store that a `coords_N.csv` path would be served from."""
+    return Path(coords_path).parent.parent / release_store_name
+
+
+def _store_release_indices(
+    coords_path: str | Path,
+) -> tuple[np.ndarray, np.ndarray] | None:
+    """Find the coordinates and release sites of a sample in its store."""
+    match = re.fullmatch(r"coords_(\d+)\.csv", Path(coords_path).name)
+    store_path = release_store_for(coords_path)
+    if match is None or not store_path.is_file():
+        return None
+    coords, labels, release_indices = load_release_store(store_path)
+    row = np.searchsorted(labels, int(match.group(1)))
+    if row == len(labels) or labels[row] != int(match.group(1)):
+        return None
+    return coords, release_indices[row]
+
+
+def coords_available(coords_path: str | Path) -> bool:
+    """Whether a coordinates file exists or can be written from its store."""
+    return (
+        Path(coords_path).is_file() or _store_release_indices(coords_path) is not None
+    )
+
+
+def read_coords_text(coords_path: str | Path) -> str:
+    """
+    Read a GDSiMS coordinates file, or write its contents from the store.
+
+    Args:
+        coords_path (str): Path to the coordinates file. If there is no such
+            file, a `coords_N.csv` is made from sample N of the store found by
+            `release_store_for`.
+
+    Returns:
+        str: The contents of the coordinates file.
+    """
+    if Path(coords_path).is_file():
+        return Path(coords_path).read_text()
+    found = _store_release_indices(coords_path)
+    if found is None:
+        msg = f"Coordinates file {coords_path} does not exist."
+        raise FileNotFoundError(msg)
+    coords, release_indices = found
+    return _coords_text(_coords_prefixes(coords), release_indices.tolist())
+
+
+@contextmanager
+def coords_file(
+    coords_path: str | Path | None, directory: str | Path | None = None
+) -> Iterator[Path | None]:
+    """
+    Make sure a GDSiMS coordinates file exists while it is being used.
+
+    If the sample only has release sites in the store, its file is written
+    just before, in `directory` if given, and removed again afterwards. An
+    existing file is left as is.
+
+    Args:
+        coords_path (str, optional): Path to the coordinates file.
+        directory (str, optional): Directory to write the file in, e.g. the
+            scratch directory of the run. Defaults to None, which writes it at
+            `coords_path`.
+
+    Yields:
+        Path | None: The path to the coordinates file, or None if
+            `coords_path` is None.
+    """
+    if coords_path is None or Path(coords_path).is_file():
+        yield None if coords_path is None else Path(coords_path)
+        return
 
-    return [(x, y) for x in x_values for y in y_values]
+    text = read_coords_text(coords_path)
+    if directory is None:
+        file_path = Path(coords_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+    else:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        descriptor, name = tempfile.mkstemp(
+            prefix=f"{Path(coords_path).stem}_", suffix=".csv", dir=directory
+        )
+        os.close(descriptor)
+        file_path = Path(name)
+    file_path.write_text(text)
+    try:
+        yield file_path
+    finally:
+        file_path.unlink(missing_ok=True)
@@ -1,12 +1,36 @@
 from __future__ import annotations
 
+import functools
+import io
+import os
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import TypeVar, overload
 
 import numpy as np
 import pandas as pd
 import yaml
-
-from mozzie.generate import parameter_order
+from tqdm import tqdm
+
+from mozzie.construct import sampling_methods
+from mozzie.coords import (
+    load_release_store,
+    release_sites_columns,
+    release_sites_table,
+    release_store_name,
+)
+from mozzie.generate import (
+    load_params_table,
+    parameter_order,
+    params_table_name,
+    read_params_text,
+    stop_marker_path,
+)
+from mozzie.parsing import local_data_to_array, read_local_data, read_total_data
+
+T = TypeVar("T")
 
 
 def read_config(config_dict: dict):
@@ -56,6 +80,12 @@ def read_config(config_dict: dict):
             msg = "Each parameter option must specify 'min' and 'max' values."
             raise ValueError(msg)
 
+    # Design
+    design = config_dict.get("design", "lhs")
+    if design not in sampling_methods:
+        msg = f"design must be one of {', '.join(sampling_methods)}."
+        raise ValueError(msg)
+
     # Number of Samples
     num_samples = config_dict.get("num_samples", 100)
     if not isinstance(num_samples, int) or num_samples <= 0:
@@ -136,7 +166,9 @@ def read_values_from_params(
     Reads parameter values from a file and maps them to specified sample names.
 
     Args:
-        params_path (str): The path to the file containing parameter values.
+        params_path (str): The path to the file containing parameter values,
+            or to a run of the campaign's parameter table, see
+            `mozzie.generate.read_params_text`.
         to_sample (dict, list): A dictionary where keys are sample names or a list of
             sample names to extract values for.
 
@@ -148,8 +180,7 @@ def read_values_from_params(
         ValueError: If a sample name in `to_sample` is not found in `parameter_order`.
     """
 
-    with open(str(params_path)) as file:
-        lines = file.readlines()
+    lines = read_params_text(params_path).splitlines()
 
     sample_values = {}
 
@@ -164,6 +195,44 @@ def read_values_from_params(
     return sample_values
 
 
+def _samples_from_table(
+    table_path: Path, start_index: int, end_index: int, to_sample: list[str]
+) -> dict[int, dict[str, float]]:
+    """Select the sampled columns of a range of runs from a parameter table."""
+    for sample_name in to_sample:
+        if sample_name not in parameter_order:
+            msg = f"Sample name '{sample_name}' not found in parameter order."
+            raise ValueError(msg)
+
+    table = load_params_table(table_path)
+    labels = table[:, parameter_order.index("set_label")].astype(np.int64)
+    wanted = np.arange(start_index, end_index)
+    rows = np.searchsorted(labels, wanted)
+    found = (rows < len(labels)) & (labels[np.minimum(rows, len(labels) - 1)] == wanted)
+    if not found.all():
+        msg = f"Sample index {wanted[~found][0]} not found in {table_path}."
+        raise FileNotFoundError(msg)
+
+    columns = [parameter_order.index(name) for name in to_sample]
+    values = table[rows][:, columns].tolist()
+    return {
+        int(val): dict(zip(to_sample, row, strict=True))
+        for val, row in zip(wanted, values, strict=True)
+    }
+
+
+def _sites_from_store(store_path: Path) -> pd.DataFrame:
+    """The release sites in a release site store, laid out as in release_sites.csv."""
+    coords, labels, release_indices = load_release_store(store_path)
+    table = release_sites_table(coords, release_indices, 0)
+    table[:, 0] = labels
+    sites_df = pd.DataFrame(
+        table, columns=release_sites_columns(release_indices.shape[1])
+    )
+    sites_df["sample_idx"] = sites_df["sample_idx"].astype(int)
+    return sites_df.set_index("sample_idx")
+
+
 def load_samples_values(
     data_path: str | Path, config_dict: dict, add_sites: bool = False
 ) -> dict[int, dict[str, float]]:
@@ -171,7 +240,9 @@ def load_samples_values(
     This loads the sample values from the parameters files.
     It reads the parameters from the files and returns a dictionary
     where the keys are the sample indices and the values are dictionaries
-    containing the parameter values for each sample.
+    containing the parameter values for each sample. If the campaign has a
+    parameter table, see `mozzie.generate.save_params_table`, the values are
+    read from it in one go instead.
 
     Args:
         data_path (str): The path to the directory containing the parameters files.
@@ -180,6 +251,7 @@ def load_samples_values(
             - "num_samples": The number of samples to load.
             - "to_sample": A dictionary of parameters to sample.
         add_sites (bool): Whether to add release site information from
+            the release site store, see `mozzie.coords.save_release_store`, or
             'release_sites.csv' to the sample values.
 
     Returns:
@@ -197,25 +269,36 @@ def load_samples_values(
         msg = f"Parameters directory {params_dir} does not exist."
         raise FileNotFoundError(msg)
 
-    all_sample_values = {}
-
-    for val in range(start_index, end_index):
-        params_path = params_dir / f"params_{val}.txt"
-        if not params_path.exists():
-            msg = f"Parameters file {params_path} does not exist."
-            raise FileNotFoundError(msg)
+    table_path = params_dir / params_table_name
+    if table_path.is_file():
+        all_sample_values = _samples_from_table(
+            table_path, start_index, end_index, list(to_sample)
+        )
+    else:
+        all_sample_values = {}
+        for val in range(start_index, end_index):
+            params_path = params_dir / f"params_{val}.txt"
+            if not params_path.exists():
+                msg = f"Parameters file {params_path} does not exist."
+                raise FileNotFoundError(msg)
 
-        all_sample_values[val] = read_values_from_params(params_path, to_sample)
+            all_sample_values[val] = read_values_from_params(params_path, to_sample)
 
     if add_sites:
+        store_path = data_path / release_store_name
         sites_file = data_path / "release_sites.csv"
-        if not sites_file.exists():
+        if store_path.exists():
+            sites_df = _sites_from_store(store_path)
+        elif sites_file.exists():
+            sites_df = pd.read_csv(
+                sites_file, sep=",", header=0, index_col="sample_idx"
+            )
+        else:
             msg = (
                 f"Release sites file {sites_file} does not exist, "
                 "but add_sites is set to True."
             )
             raise FileNotFoundError(msg)
-        sites_df = pd.read_csv(sites_file, sep=",", header=0, index_col="sample_idx")
         for val in range(start_index, end_index):
             if val not in sites_df.index:
                 msg = f"Sample index {val} not found in release sites file."
@@ -227,11 +310,438 @@ def load_samples_values(
     return all_sample_values
 
 
+def read_stop_day(data_path: str | Path, sample_idx: int) -> int | None:
+    """
+    Reads the day a run was stopped early on by a stopping rule.
+
+    Args:
+        data_path (str): The path to the directory containing the output files.
+        sample_idx (int): The index of the sample.
+
+    Returns:
+        int | None: The last day in the Totals file of the run before it was
+            stopped, or None if the run went on until `max_t`.
+    """
+    marker_path = stop_marker_path(data_path, sample_idx)
+    if not marker_path.exists():
+        return None
+    return int(pd.read_csv(marker_path, sep="\t", header=1)["Day"].iloc[0])
+
+
+def load_stop_days(data_path: str | Path, config_dict: dict) -> dict[int, int | None]:
+    """
+    This loads the day each run was stopped early on, see `read_stop_day`.
+
+    Args:
+        data_path (str): The path to the directory containing the output files.
+        config_dict (dict): The configuration dictionary which needs to contain:
+            - "start_index": The starting index for the samples.
+            - "num_samples": The number of samples to load.
+
+    Returns:
+        dict[int, int | None]: A dictionary where keys are sample indices and
+            values are the day the run was stopped on, or None.
+    """
+    start_index = config_dict["start_index"]
+    end_index = start_index + config_dict["num_samples"]
+    return {val: read_stop_day(data_path, val) for val in range(start_index, end_index)}
+
+
+def _read_stopped_output(file_path: Path) -> pd.DataFrame:
+    """Read a Totals or LocalData file, dropping a line cut short by a stop."""
+    text = file_path.read_text()
+    return pd.read_csv(io.StringIO(text[: text.rfind("\n") + 1]), sep="\t", header=1)
+
+
+def _drop_incomplete_days(local_df: pd.DataFrame) -> pd.DataFrame:
+    """Drop the last day of a stopped run if it was not written for every site."""
+    sites_per_day = local_df.groupby("Day")["Site"].count()
+    complete_days = sites_per_day.index[sites_per_day == sites_per_day.max()]
+    return local_df[local_df["Day"].isin(complete_days)]
+
+
+def _pad_totals(total_df: pd.DataFrame, params_path: str | Path) -> pd.DataFrame:
+    """Repeat the last row of a stopped run's Totals until `max_t`."""
+    values = read_values_from_params(params_path, ["max_t", "rec_interval_global"])
+    interval = int(values["rec_interval_global"])
+    last_row = total_df.iloc[-1]
+    days = np.arange(last_row["Day"] + interval, values["max_t"] + 1, interval)
+    padding = pd.DataFrame([last_row] * len(days), columns=total_df.columns)
+    padding["Day"] = days
+    return pd.concat([total_df, padding], ignore_index=True)
+
+
+# How the replicates (run1, run2, ...) of a run are returned by the loaders.
+replicate_modes = ("first", "stack", "moments")
+
+
+def _check_replicates(replicates: str) -> None:
+    """Raise a ValueError if `replicates` is not one of `replicate_modes`."""
+    if replicates not in replicate_modes:
+        msg = f"replicates must be one of {', '.join(replicate_modes)}."
+        raise ValueError(msg)
+
+
+def _replicate_paths(
+    output_files_dir: Path, prefix: str, sample_idx: int, replicates: str
+) -> list[Path]:
+    """The `{prefix}{sample_idx}run{k}.txt` files to load for a run."""
+    _check_replicates(replicates)
+    paths = [output_files_dir / f"{prefix}{sample_idx}run1.txt"]
+    if replicates != "first":
+        while (
+            path := output_files_dir / f"{prefix}{sample_idx}run{len(paths) + 1}.txt"
+        ).exists():
+            paths.append(path)
+    return paths
+
+
+def combine_replicates(arrays: Iterable[np.ndarray], replicates: str) -> np.ndarray:
+    """
+    Combines the arrays of the replicates of a run.
+
+    Args:
+        arrays (Iterable[np.ndarray]): The array of each replicate, which all have
+            the same shape. They can be produced lazily, e.g. by a generator.
+        replicates (str): "first" returns the first array only, "stack" stacks the
+            arrays along a new first axis, and "moments" returns the mean and the
+            variance (with ddof=0) over the replicates, stacked along a new first
+            axis. The moments are computed in one pass with Welford's algorithm,
+            so only one replicate is held in memory at a time.
+
+    Returns:
+        np.ndarray: The combined array.
+    """
+    if replicates == "first":
+        return next(iter(arrays))
+    if replicates == "stack":
+        return np.stack(list(arrays))
+
+    count = 0
+    for array in arrays:
+        count += 1
+        if count == 1:
+            mean = array.astype(float)
+            sum_sq = np.zeros_like(mean)
+            continue
+        delta = array - mean
+        mean += delta / count
+        sum_sq += delta * (array - mean)
+    return np.stack([mean, sum_sq / count])
+
+
+def _map_runs(
+    load_run: Callable[[int], T],
+    labels: Iterable[int],
+    workers: int = 1,
+    progress: bool = False,
+) -> list[T]:
+    """
+    Load each run with `load_run`, over a pool of threads if `workers` > 1.
+
+    Every run is tried before any failure is raised, so that all the missing
+    or corrupt output files are reported together, whatever the error. One
+    failure is raised as it is, and several as an ExceptionGroup, each with a
+    note of its run.
+
+    Args:
+        load_run (Callable): Loads the run with a given label.
+        labels (Iterable[int]): The labels of the runs.
+        workers (int): Number of runs to load at once. Defaults to 1.
+        progress (bool): Whether to show a progress bar. Defaults to False.
+
+    Returns:
+        list: What `load_run` returned for each run, in the order of `labels`.
+    """
+    labels = list(labels)
+    results: dict[int, T] = {}
+    errors: dict[int, Exception] = {}
+
+    def load(label: int) -> None:
+        try:
+            results[label] = load_run(label)
+        except Exception as e:
+            e.add_note(f"While loading run {label}.")
+            errors[label] = e
+
+    with tqdm(total=len(labels), disable=not progress) as pbar:
+        if workers > 1:
+            with ThreadPoolExecutor(workers) as pool:
+                for future in as_completed([pool.submit(load, v) for v in labels]):
+                    future.result()
+                    pbar.update()
+        else:
+            for label in labels:
+                load(label)
+                pbar.update()
+
+    failed = [errors[label] for label in labels if label in errors]
+    if len(failed) == 1:
+        raise failed[0]
+    if failed:
+        msg = f"{len(failed)} of {len(labels)} runs could not be loaded"
+        raise ExceptionGroup(msg, failed)
+    return [results[label] for label in labels]
+
+
+def _local_states(
+    file_path: Path,
+    days: np.ndarray,
+    stop_day: int | None,
+    label: str,
+    cache: bool = False,
+) -> np.ndarray:
+    """The local states at `days` from a LocalData file, as [day, site, genotype]."""
+    if stop_day is None:
+        data_3d, timestamps = read_local_data(file_path, cache)
+        found_days = days
+    else:
+        # A run stopped early stays in the last state it recorded
+        local_df = _drop_incomplete_days(_read_stopped_output(file_path))
+        data_3d, timestamps = local_data_to_array(local_df)
+        found_days = np.minimum(days, timestamps.max())
+
+    missing = ~np.isin(found_days, timestamps)
+    if missing.any():
+        msg = f"{label} {days[np.argmax(missing)]} not found in {file_path.name}."
+        raise ValueError(msg)
+    return data_3d[np.searchsorted(timestamps, found_days)]
+
+
+# Directory of a campaign's ensemble store, next to its `output_files`.
+ensemble_dir_name = "ensemble"
+
+
+def _output_keys(output_files_dir: Path, labels: Iterable[int]) -> np.ndarray:
+    """The size and mtime of the LocalData and Totals files of each run."""
+    keys = []
+    for label in labels:
+        row = []
+        for prefix in ("LocalData", "Totals"):
+            file_path = output_files_dir / f"{prefix}{label}run1.txt"
+            stat = file_path.stat() if file_path.exists() else None
+            row += [-1, -1] if stat is None else [stat.st_size, stat.st_mtime_ns]
+        keys.append(row)
+    return np.array(keys, dtype=np.int64).reshape(-1, 4)
+
+
+@functools.lru_cache(maxsize=4)
+def _cached_ensemble(
+    index_path: str,
+    size: int,  # noqa: ARG001
+    mtime_ns: int,  # noqa: ARG001
+) -> dict[str, np.ndarray]:
+    """Open an ensemble store, again only once it changes."""
+    with np.load(index_path) as index:
+        store = {name: index[name] for name in index.files}
+    store_dir = Path(index_path).parent
+    for name in ("local", "totals"):
+        store[name] = np.load(store_dir / str(store.pop(f"{name}_file")), mmap_mode="r")
+    for array in store.values():
+        array.setflags(write=False)
+    return store
+
+
+def load_ensemble_store(data_path: str | Path) -> dict[str, np.ndarray]:
+    """
+    Open the ensemble store of a campaign, see `build_ensemble_store`.
+
+    Args:
+        data_path (str): The path to the directory containing the output files.
+
+    Returns:
+        dict[str, np.ndarray]: The "labels" of the runs in the store, in order,
+            the "local_days" and "total_days" recorded, and the read-only memory
+            mapped "local" array [sample, time, site, genotype] and "totals"
+            array [sample, time, genotype].
+    """
+    index_path = Path(data_path) / ensemble_dir_name / "index.npz"
+    if not index_path.is_file():
+        msg = f"Ensemble store {index_path.parent} does not exist."
+        raise FileNotFoundError(msg)
+    stat = index_path.stat()
+    return _cached_ensemble(str(index_path), stat.st_size, stat.st_mtime_ns)
+
+
+def _ensemble_rows(
+    data_path: Path, labels: np.ndarray
+) -> tuple[dict[str, np.ndarray], np.ndarray] | None:
+    """The ensemble store and the rows of `labels` in it, if it holds all of them
+    as their output files are now."""
+    if not (data_path / ensemble_dir_name / "index.npz").is_file():
+        return None
+    store = load_ensemble_store(data_path)
+    rows = np.searchsorted(store["labels"], labels)
+    if (rows >= len(store["labels"])).any():
+        return None
+    if not np.array_equal(store["labels"][rows], labels):
+        return None
+    keys = _output_keys(data_path / "output_files", labels.tolist())
+    if not np.array_equal(store["keys"][rows], keys):
+        return None
+    return store, rows
+
+
+def build_ensemble_store(
+    data_path: str | Path,
+    config_dict: dict,
+    workers: int = 1,
+    progress: bool = False,
+) -> Path:
+    """
+    Gather the outputs of a campaign's runs into one on-disk ensemble store.
+
+    The LocalData of every run goes into a single `.npy` array of shape
+    [sample, time, site, genotype], and its Totals into one of shape
+    [sample, time, genotype], each run being one contiguous chunk. Runs
+    stopped early are filled in as `load_local_values` and `load_total_values`
+    would return them, and only the first replicate is kept. Once built, those
+    loaders and `load_state_values` copy their runs out of the store instead
+    of parsing text files, for as long as the output files are unchanged.
+
+    Runs already in the store whose output files have not changed are copied
+    over rather than parsed again, and runs outside the config's range are
+    kept, so the store can be grown one range at a time.
+
+    Args:
+        data_path (str): The path to the directory containing the output files.
+        config_dict (dict): The configuration dictionary which needs to contain:
+            - "start_index": The starting index for the samples.
+            - "num_samples": The number of samples to add.
+        workers (int): Number of runs to parse at once, in a pool of threads.
+            Defaults to 1.
+        progress (bool): Whether to show a progress bar. Defaults to False.
+
+    Returns:
+        Path: The directory of the store.
+    """
+    data_path = Path(data_path)
+    output_files_dir = data_path / "output_files"
+    if not output_files_dir.exists():
+        msg = f"Output files directory {output_files_dir} does not exist."
+        raise FileNotFoundError(msg)
+    store_dir = data_path / ensemble_dir_name
+    store_dir.mkdir(exist_ok=True)
+
+    start_index = config_dict["start_index"]
+    new_labels = np.arange(start_index, start_index + config_dict["num_samples"])
+    new_keys = _output_keys(output_files_dir, new_labels.tolist())
+    stop_days = {val: read_stop_day(data_path, val) for val in new_labels.tolist()}
+
+    old = None
+    if (store_dir / "index.npz").is_file():
+        old = load_ensemble_store(data_path)
+    if old is not None:
+        labels = np.union1d(old["labels"], new_labels)
+        local_days, total_days = old["local_days"], old["total_days"]
+        local_shape, dtype = old["local"].shape[1:], old["local"].dtype
+        totals_dtype = old["totals"].dtype
+    else:
+        # Take the days and sites from a run that was not stopped, if any
+        ref = next((val for val, day in stop_days.items() if day is None), start_index)
+        labels = new_labels
+        ref_local, local_days = read_local_data(
+            output_files_dir / f"LocalData{ref}run1.txt"
+        )
+        total_days, ref_totals = _total_days_and_values(
+            output_files_dir / f"Totals{ref}run1.txt",
+            stop_days[ref],
+            data_path / "params" / f"params_{ref}.txt",
+        )
+        local_shape, dtype = ref_local.shape, ref_local.dtype
+        totals_dtype = ref_totals.dtype
+
+    token = time.time_ns()
+    local_file, totals_file = f"local_{token}.npy", f"totals_{token}.npy"
+    local = np.lib.format.open_memmap(
+        store_dir / local_file, "w+", dtype, (len(labels), *local_shape)
+    )
+    totals = np.lib.format.open_memmap(
+        store_dir / totals_file, "w+", totals_dtype, (len(labels), len(total_days), 6)
+    )
+    keys = np.empty((len(labels), 4), dtype=np.int64)
+
+    # Runs kept from the old store, outside the range or with unchanged outputs
+    copy_rows: dict[int, int] = {}
+    if old is not None:
+        for old_row, val in enumerate(old["labels"].tolist()):
+            new_row = val - start_index
+            if not 0 <= new_row < len(new_labels) or np.array_equal(
+                old["keys"][old_row], new_keys[new_row]
+            ):
+                copy_rows[val] = old_row
+
+    rows = {val: row for row, val in enumerate(labels.tolist())}
+    if old is not None:
+        for val, old_row in copy_rows.items():
+            local[rows[val]] = old["local"][old_row]
+            totals[rows[val]] = old["totals"][old_row]
+            keys[rows[val]] = old["keys"][old_row]
+
+    def load_run(val: int) -> None:
+        states = _local_states(
+            output_files_dir / f"LocalData{val}run1.txt",
+            local_days,
+            stop_days[val],
+            "Time point",
+        )
+        days, values = _total_days_and_values(
+            output_files_dir / f"Totals{val}run1.txt",
+            stop_days[val],
+            data_path / "params" / f"params_{val}.txt",
+        )
+        if states.shape != local.shape[1:] or not np.array_equal(days, total_days):
+            msg = f"Run {val} does not have the same days and sites as the store."
+            raise ValueError(msg)
+        local[rows[val]], totals[rows[val]] = states, values
+        keys[rows[val]] = new_keys[val - start_index]
+
+    try:
+        _map_runs(
+            load_run,
+            [val for val in new_labels.tolist() if val not in copy_rows],
+            workers,
+            progress,
+        )
+    except BaseException:
+        (store_dir / local_file).unlink()
+        (store_dir / totals_file).unlink()
+        raise
+
+    local.flush()
+    totals.flush()
+
+    # Point the index at the new arrays, then remove the old ones
+    tmp_path = store_dir / ".index.npz.tmp"
+    with tmp_path.open("wb") as file:
+        np.savez(
+            file,
+            labels=labels,
+            keys=keys,
+            local_days=local_days,
+            total_days=total_days,
+            local_file=np.array(local_file),
+            totals_file=np.array(totals_file),
+        )
+    os.replace(tmp_path, store_dir / "index.npz")
+    for stale in store_dir.glob("*.npy"):
+        if stale.name not in (local_file, totals_file):
+            stale.unlink()
+    return store_dir
+
+
 def load_local_values(
-    data_path: str | Path, config_dict: dict
+    data_path: str | Path,
+    config_dict: dict,
+    replicates: str = "first",
+    workers: int = 1,
+    progress: bool = False,
+    cache: bool = False,
 ) -> dict[int, dict[int, np.ndarray]]:
     """
     This loads the stepwise local data from the output files.
+    The first replicates of runs in an up to date ensemble store, see
+    `build_ensemble_store`, are copied from it instead.
 
     Args:
         data_path (str): The path to the directory containing the output files.
@@ -239,16 +749,28 @@ def load_local_values(
             - "start_index": The starting index for the samples.
             - "num_samples": The number of samples to load.
             - "analysis_range": A dictionary with keys "start", "end", and "step".
+        replicates (str): How to load runs with more than one replicate, see
+            `combine_replicates`. Defaults to "first", which only reads run1.
+        workers (int): Number of runs to load at once, in a pool of threads.
+            Defaults to 1.
+        progress (bool): Whether to show a progress bar. Defaults to False.
+        cache (bool): Whether to keep what is parsed from each output file in
+            `.npy` sidecars next to it, so later loads skip the parsing, see
+            `mozzie.parsing.cached_arrays`. Defaults to False.
 
     Returns:
         dict[int, dict[int, np.ndarray]]: A dictionary where keys are sample indices
             and values are dictionaries mapping time points to local data arrays.
+            Runs stopped early take their last recorded state for later time points.
+            With "stack" or "moments", each array has an extra first axis over the
+            replicates or over the mean and variance.
     """
     data_path = Path(data_path)
     output_files_dir = data_path / "output_files"
     if not output_files_dir.exists():
         msg = f"Output files directory {output_files_dir} does not exist."
         raise FileNotFoundError(msg)
+    _check_replicates(replicates)
 
     start_index = config_dict["start_index"]
     end_index = start_index + config_dict["num_samples"]
@@ -259,26 +781,38 @@ def load_local_values(
         config_dict["analysis_range"]["step"],
     )
 
-    local_data: dict[int, dict[int, np.ndarray]] = {}
-
-    for val in range(start_index, end_index):
-        local_df = pd.read_csv(
-            output_files_dir / f"LocalData{val}run1.txt",
-            sep="\t",
-            header=1,
+    found = None
+    if replicates == "first":
+        found = _ensemble_rows(data_path, np.arange(start_index, end_index))
+    if found is not None and np.isin(local_time_points, found[0]["local_days"]).all():
+        store, rows = found
+        time_idx = np.searchsorted(store["local_days"], local_time_points)
+        # Read into memory at once, rather than handing out read-only slices
+        local = np.array(store["local"][rows[:, None], time_idx])
+        return {
+            val: dict(zip(local_time_points, local[row_idx], strict=True))
+            for row_idx, val in enumerate(range(start_index, end_index))
+        }
+
+    def load_run(val: int) -> dict[int, np.ndarray]:
+        stop_day = read_stop_day(data_path, val)
+        paths = _replicate_paths(output_files_dir, "LocalData", val, replicates)
+        states = combine_replicates(
+            (
+                _local_states(path, local_time_points, stop_day, "Time point", cache)
+                for path in paths
+            ),
+            replicates,
         )
-        local_data[val] = {}
-
-        for time_point in local_time_points:
-            if time_point not in local_df["Day"].values:
-                msg = f"Time point {time_point} not found in LocalData{val}run1.txt."
-                raise ValueError(msg)
-
-            local_data[val][time_point] = local_df[local_df["Day"] == time_point][
-                ["WW", "WD", "DD", "WR", "RR", "DR"]
-            ].values
-
-    return local_data
+        return {
+            time_point: np.take(states, tidx, axis=-3)
+            for tidx, time_point in enumerate(local_time_points)
+        }
+
+    labels = range(start_index, end_index)
+    return dict(
+        zip(labels, _map_runs(load_run, labels, workers, progress), strict=True)
+    )
 
 
 def contruct_local_x_and_y(
@@ -323,42 +857,93 @@ def contruct_local_x_and_y(
     return np.array(X), np.array(y)
 
 
+def _total_days_and_values(
+    file_path: Path, stop_day: int | None, params_path: Path, cache: bool = False
+) -> tuple[np.ndarray, np.ndarray]:
+    """The days and totals of a Totals file, padded until `max_t` if stopped."""
+    if stop_day is None:
+        total_df = read_total_data(file_path, cache)
+        return total_df.index.to_numpy(), total_df.to_numpy()
+    total_df = _pad_totals(_read_stopped_output(file_path), params_path)
+    return (
+        total_df["Day"].to_numpy(),
+        total_df[["WW", "WD", "DD", "WR", "RR", "DR"]].to_numpy(),
+    )
+
+
+def _totals(
+    file_path: Path, stop_day: int | None, params_path: Path, cache: bool = False
+) -> np.ndarray:
+    """The totals from a Totals file, padded until `max_t` if the run was stopped."""
+    return _total_days_and_values(file_path, stop_day, params_path, cache)[1]
+
+
 def load_total_values(
-    data_path: str | Path, config_dict: dict
+    data_path: str | Path,
+    config_dict: dict,
+    replicates: str = "first",
+    workers: int = 1,
+    progress: bool = False,
+    cache: bool = False,
 ) -> dict[int, np.ndarray]:
     """
     This loads the total values from the output files.
+    The first replicates of runs in an up to date ensemble store, see
+    `build_ensemble_store`, are copied from it instead.
 
     Args:
         data_path (str): The path to the directory containing the output files.
         config_dict (dict): The configuration dictionary which needs to contain:
             - "start_index": The starting index for the samples.
             - "num_samples": The number of samples to load.
+        replicates (str): How to load runs with more than one replicate, see
+            `combine_replicates`. Defaults to "first", which only reads run1.
+        workers (int): Number of runs to load at once, in a pool of threads.
+            Defaults to 1.
+        progress (bool): Whether to show a progress bar. Defaults to False.
+        cache (bool): Whether to keep what is parsed from each output file in
+            `.npy` sidecars next to it, so later loads skip the parsing, see
+            `mozzie.parsing.cached_arrays`. Defaults to False.
 
     Returns:
         dict[int, np.ndarray]: A dictionary where keys are sample indices and values
-            are numpy arrays containing the total values for each sample.
+            are numpy arrays containing the total values for each sample. Runs
+            stopped early have their last row repeated up to `max_t`, which is read
+            from their params file. With "stack" or "moments", each array has an
+            extra first axis over the replicates or over the mean and variance.
     """
     data_path = Path(data_path)
     output_files_dir = data_path / "output_files"
     if not output_files_dir.exists():
         msg = f"Output files directory {output_files_dir} does not exist."
         raise FileNotFoundError(msg)
+    _check_replicates(replicates)
 
     start_index = config_dict["start_index"]
     end_index = start_index + config_dict["num_samples"]
 
-    total_data: dict[int, np.ndarray] = {}
-
-    for val in range(start_index, end_index):
-        local_df = pd.read_csv(
-            output_files_dir / f"Totals{val}run1.txt",
-            sep="\t",
-            header=1,
+    found = None
+    if replicates == "first":
+        found = _ensemble_rows(data_path, np.arange(start_index, end_index))
+    if found is not None:
+        store, rows = found
+        # Read into memory at once, rather than handing out read-only slices
+        totals = np.array(store["totals"][rows])
+        return dict(zip(range(start_index, end_index), totals, strict=True))
+
+    def load_run(val: int) -> np.ndarray:
+        stop_day = read_stop_day(data_path, val)
+        params_path = data_path / "params" / f"params_{val}.txt"
+        paths = _replicate_paths(output_files_dir, "Totals", val, replicates)
+        return combine_replicates(
+            (_totals(path, stop_day, params_path, cache) for path in paths),
+            replicates,
         )
-        total_data[val] = local_df[["WW", "WD", "DD", "WR", "RR", "DR"]].values
 
-    return total_data
+    labels = range(start_index, end_index)
+    return dict(
+        zip(labels, _map_runs(load_run, labels, workers, progress), strict=True)
+    )
 
 
 def contruct_total_x_and_y(
@@ -392,52 +977,114 @@ def contruct_total_x_and_y(
     return np.array(X), np.array(y)
 
 
+@overload
 def load_state_values(
-    data_path: str | Path, config_dict: dict, state_timestamp: int
-) -> dict[int, np.ndarray]:
+    data_path: str | Path,
+    config_dict: dict,
+    state_timestamp: int,
+    replicates: str = "first",
+    workers: int = 1,
+    progress: bool = False,
+    cache: bool = False,
+) -> dict[int, np.ndarray]: ...
+
+
+@overload
+def load_state_values(
+    data_path: str | Path,
+    config_dict: dict,
+    state_timestamp: Iterable[int],
+    replicates: str = "first",
+    workers: int = 1,
+    progress: bool = False,
+    cache: bool = False,
+) -> np.ndarray: ...
+
+
+def load_state_values(
+    data_path: str | Path,
+    config_dict: dict,
+    state_timestamp: int | Iterable[int],
+    replicates: str = "first",
+    workers: int = 1,
+    progress: bool = False,
+    cache: bool = False,
+) -> dict[int, np.ndarray] | np.ndarray:
     """
-    This loads the local state values at a specific timestamp from the output files.
+    This loads the local state values at specific timestamps from the output files.
+    Each LocalData file is read once for all of the timestamps. The first
+    replicates of runs in an up to date ensemble store, see
+    `build_ensemble_store`, are copied from it instead.
 
     Args:
         data_path (str): The path to the directory containing the output files.
         config_dict (dict): The configuration dictionary which needs to contain:
             - "start_index": The starting index for the samples.
             - "num_samples": The number of samples to load.
-            - "state_timestamp": The specific timestamp to extract state data for.
-        state_timestamp (int): The specific timestamp to extract state data for.
+        state_timestamp (int | Iterable[int]): The timestamp to extract state data
+            for, or several timestamps such as a list or a range.
+        replicates (str): How to load runs with more than one replicate, see
+            `combine_replicates`. Defaults to "first", which only reads run1.
+        workers (int): Number of runs to load at once, in a pool of threads.
+            Defaults to 1.
+        progress (bool): Whether to show a progress bar. Defaults to False.
+        cache (bool): Whether to keep what is parsed from each output file in
+            `.npy` sidecars next to it, so later loads skip the parsing, see
+            `mozzie.parsing.cached_arrays`. Defaults to False.
 
     Returns:
-        dict[int, np.ndarray]: A dictionary where keys are sample indices and values
-            are numpy arrays containing the local state values at the specified
-            timestamp.
+        dict[int, np.ndarray] | np.ndarray: For a single timestamp, a dictionary
+            where keys are sample indices and values are numpy arrays containing
+            the local state values at the specified timestamp, or at the last
+            recorded day of runs stopped before it. For several timestamps, one
+            array with shape [sample, timestamp, site, genotype], with the samples
+            in order from `start_index`. With "stack" or "moments", there is an
+            extra axis over the replicates or over the mean and variance, first
+            in each dictionary value or after the sample axis.
     """
     data_path = Path(data_path)
     output_files_dir = data_path / "output_files"
     if not output_files_dir.exists():
         msg = f"Output files directory {output_files_dir} does not exist."
         raise FileNotFoundError(msg)
+    _check_replicates(replicates)
 
     start_index = config_dict["start_index"]
     end_index = start_index + config_dict["num_samples"]
+    if isinstance(state_timestamp, (int, np.integer)):
+        single, timestamps = True, np.array([state_timestamp])
+    else:
+        single, timestamps = False, np.array(list(state_timestamp), dtype=int)
+
+    found = None
+    if replicates == "first":
+        found = _ensemble_rows(data_path, np.arange(start_index, end_index))
+    if found is not None and np.isin(timestamps, found[0]["local_days"]).all():
+        store, rows = found
+        time_idx = np.searchsorted(store["local_days"], timestamps)
+        states = np.array(store["local"][rows[:, None], time_idx])
+    else:
+
+        def load_run(val: int) -> np.ndarray:
+            stop_day = read_stop_day(data_path, val)
+            paths = _replicate_paths(output_files_dir, "LocalData", val, replicates)
+            return combine_replicates(
+                (
+                    _local_states(path, timestamps, stop_day, "Timestamp", cache)
+                    for path in paths
+                ),
+                replicates,
+            )
 
-    state_data: dict[int, np.ndarray] = {}
-
-    for val in range(start_index, end_index):
-        local_df = pd.read_csv(
-            output_files_dir / f"LocalData{val}run1.txt",
-            sep="\t",
-            header=1,
-        )
-
-        if state_timestamp not in local_df["Day"].values:
-            msg = f"Timestamp {state_timestamp} not found in LocalData{val}run1.txt."
-            raise ValueError(msg)
-
-        state_data[val] = local_df[local_df["Day"] == state_timestamp][
-            ["WW", "WD", "DD", "WR", "RR", "DR"]
-        ].values
+        labels = range(start_index, end_index)
+        states = np.stack(_map_runs(load_run, labels, workers, progress))
 
-    return state_data
+    if not single:
+        return states
+    return {
+        val: np.take(states[row], 0, axis=-3)
+        for row, val in enumerate(range(start_index, end_index))
+    }
 
 
 def construct_state_x_and_y(
@@ -5,14 +5,78 @@ data for training and testing the surrogate models.
 
 from __future__ import annotations
 
+import asyncio
+import fcntl
+import functools
+import hashlib
+import itertools
+import json
+import os
+import re
+import resource
+import shutil
+import signal
 import subprocess
+import tempfile
+import threading
 import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import ExitStack, contextmanager, suppress
+from dataclasses import dataclass
 from pathlib import Path
+from typing import IO, TypeVar
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import nnls
+
+from mozzie.coords import coords_available, coords_file, read_coords_text
+
+T = TypeVar("T")
 
 __all__ = [
+    "GDSIMS_PROMPT",
+    "OUTPUT_TAIL_BYTES",
+    "CostModel",
+    "RunArgs",
+    "RunUsage",
+    "StoppingRule",
+    "add_to_cache",
+    "append_ledger",
+    "benchmark",
+    "cache_key",
+    "coords_hash",
+    "cost_features",
+    "default_benchmark_grid",
+    "drive_gdsims",
+    "drive_gdsims_async",
+    "evict_cache",
+    "failure_report",
+    "file_hash",
+    "is_cached",
+    "ledger_columns",
+    "load_ledger",
+    "load_params_table",
+    "output_files_for",
     "parameter_order",
+    "params_file",
+    "params_hash",
+    "params_table_name",
+    "params_text",
+    "population_eliminated",
+    "publish_outputs",
+    "read_params_text",
+    "read_set_label",
+    "restore_from_cache",
     "run_custom",
+    "run_custom_async",
     "run_default",
+    "run_features",
+    "run_many",
+    "save_params_table",
+    "scratch_dir",
+    "stop_marker_path",
+    "wild_allele_lost",
 ]
 
 parameter_order = [
@@ -52,93 +116,712 @@ parameter_order = [
     "set_label",
 ]
 
+# The (script_path, working_dir, params_path, coords_path) arguments of one run.
+RunArgs = tuple[str | Path, str | Path, str | Path, str | Path | None]
+
+# Decides from the Totals rows recorded so far, as an array with the columns
+# Day, WW, WD, DD, WR, RR and DR, whether a run can be stopped early.
+StoppingRule = Callable[[np.ndarray], bool]
+
+# The GDSiMS menu prompts end with a colon, a question mark or a "(y/n)" style
+# choice, after which the program blocks on stdin. A prompt is the unfinished
+# last line of the output, so a finished line such as a banner ending in a
+# colon is not taken for one.
+GDSIMS_PROMPT = re.compile(rb"(?:[:?>)]|y/n)[ \t]*\Z")
+
+
+# Only this much of the end of each output stream is kept in memory, the rest
+# is streamed to the log files of the run if there are any.
+OUTPUT_TAIL_BYTES = 64 * 1024
+
 
-def run_default(script_path: str | Path, working_dir: str | Path) -> str:
+class _OutputTail:
     """
-    Run the GDSiMS script with default parameters.
+    Keep the end of a process output stream, optionally logging all of it.
+
+    Offsets are counted from the start of the stream, so a prompt can still be
+    searched for after a given offset once earlier output has been dropped.
+    """
+
+    def __init__(
+        self, log_file: IO[bytes] | None = None, max_bytes: int = OUTPUT_TAIL_BYTES
+    ):
+        self._log_file = log_file
+        self._max_bytes = max_bytes
+        self._buffer = bytearray()
+        self._dropped = 0
+
+    def extend(self, chunk: bytes) -> None:
+        """Add a chunk of output, dropping the oldest bytes beyond the limit."""
+        if self._log_file is not None:
+            self._log_file.write(chunk)
+        self._buffer.extend(chunk)
+        excess = len(self._buffer) - self._max_bytes
+        if excess > 0:
+            del self._buffer[:excess]
+            self._dropped += excess
+
+    def search(self, pattern: re.Pattern[bytes], start: int) -> int | None:
+        """Offset just after the first match of `pattern` after `start`, if any."""
+        match = pattern.search(self._buffer, max(start - self._dropped, 0))
+        return None if match is None else match.end() + self._dropped
+
+    def tail(self) -> bytes:
+        """The output that is still kept."""
+        return bytes(self._buffer)
+
+
+class _Menu:
+    """
+    The answers still to be given to the GDSiMS menu, in order.
+
+    Only the output read so far decides which answer is due, so the threaded
+    and the asyncio drivers share the sequencing and differ only in how they
+    read the output and write the answers.
+    """
+
+    def __init__(self, answers: list[str], prompt: re.Pattern[bytes] = GDSIMS_PROMPT):
+        self._answers = list(answers)
+        self._prompt = prompt
+        self._position = 0
+
+    @property
+    def done(self) -> bool:
+        """Whether every answer has been given."""
+        return not self._answers
+
+    def reply(self, output: _OutputTail) -> bytes | None:
+        """The next answer once its prompt is in `output`, or None before that."""
+        end = output.search(self._prompt, self._position)
+        if end is None or not self._answers:
+            return None
+        self._position = end
+        return f"{self._answers.pop(0)}\n".encode()
+
+
+def _early_exit_error(output: bytes) -> RuntimeError:
+    """The error for a process that stopped before the menu was answered."""
+    msg = (
+        f"GDSiMS exited before all answers were given: "
+        f"{output[-500:].decode(errors='replace')}"
+    )
+    return RuntimeError(msg)
+
+
+@contextmanager
+def _run_logs(
+    log_prefix: str | Path | None,
+) -> Iterator[tuple[IO[bytes] | None, IO[bytes] | None]]:
+    """Open the `.stdout.log` and `.stderr.log` files of a run for appending."""
+    if log_prefix is None:
+        yield None, None
+        return
+    Path(log_prefix).parent.mkdir(parents=True, exist_ok=True)
+    with (
+        open(f"{log_prefix}.stdout.log", "ab") as stdout_log,
+        open(f"{log_prefix}.stderr.log", "ab") as stderr_log,
+    ):
+        yield stdout_log, stderr_log
+
+
+class _StreamReader:
+    """
+    Collect the output of a process stream in a background thread.
+
+    The simulator is interactive, so the output has to be inspected while the
+    process is still running to know when it is waiting for an answer.
+    """
+
+    def __init__(self, stream: IO[bytes], log_file: IO[bytes] | None = None):
+        self._stream = stream
+        self._output = _OutputTail(log_file)
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self) -> None:
+        while chunk := self._stream.read1(65536):  # type: ignore[attr-defined]
+            with self._condition:
+                self._output.extend(chunk)
+                self._condition.notify_all()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def wait_for(self, menu: _Menu, timeout: float) -> bytes:
+        """
+        Block until the next prompt of `menu` appears in the output.
+
+        Args:
+            menu (_Menu): The menu being answered.
+            timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+            bytes: The answer to write to the process.
+
+        Raises:
+            TimeoutError: If the prompt does not appear in time.
+            EOFError: If the stream closes before the prompt appears.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                answer = menu.reply(self._output)
+                if answer is not None:
+                    return answer
+                if self._closed:
+                    msg = "Stream closed before the expected prompt appeared."
+                    raise EOFError(msg)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    msg = f"No prompt from GDSiMS within {timeout} seconds."
+                    raise TimeoutError(msg)
+                self._condition.wait(remaining)
+
+    def result(self) -> bytes:
+        """Wait for the stream to close and return the end of the output."""
+        self._thread.join()
+        return self._output.tail()
+
+
+def _kill_process_group(pid: int) -> None:
+    """Kill a GDSiMS process started in its own session, with any children."""
+    with suppress(ProcessLookupError):
+        os.killpg(pid, signal.SIGKILL)
+
+
+class _Watchdog:
+    """
+    Decide when a running simulation should be given up on.
+
+    A run is given up on once it has taken longer than `timeout` seconds,
+    once the files in its `output_files` directory have not grown for
+    `stall_timeout` seconds, or once `cancel` is set. Other runs writing to
+    the same directory count as progress too, so stalls are only detected
+    reliably in a scratch directory of its own.
+    """
+
+    def __init__(
+        self,
+        run_dir: str | Path,
+        timeout: float | None = None,
+        stall_timeout: float | None = None,
+        cancel: threading.Event | None = None,
+    ):
+        self._output_dir = Path(run_dir) / "output_files"
+        self._timeout = timeout
+        self._stall_timeout = stall_timeout
+        self._cancel = cancel
+        self._start_time = time.monotonic()
+        self._last_check = self._start_time
+        self._last_growth = self._start_time
+        self._last_size = 0
+
+    def _output_size(self) -> int:
+        try:
+            with os.scandir(self._output_dir) as entries:
+                return sum(entry.stat().st_size for entry in entries)
+        except FileNotFoundError:
+            return 0
+
+    def expired(self) -> str | None:
+        """Return why the run should be stopped, or None if it can go on."""
+        if self._cancel is not None and self._cancel.is_set():
+            return "GDSiMS run was cancelled."
+        now = time.monotonic()
+        if self._timeout is not None and now - self._start_time > self._timeout:
+            return f"GDSiMS did not finish within {self._timeout} seconds."
+        if self._stall_timeout is None:
+            return None
+
+        # Look at the output files at most once a second
+        if now - self._last_check >= min(1.0, self._stall_timeout / 4):
+            self._last_check = now
+            size = self._output_size()
+            if size != self._last_size:
+                self._last_size = size
+                self._last_growth = now
+        if now - self._last_growth > self._stall_timeout:
+            return f"GDSiMS output did not grow for {self._stall_timeout} seconds."
+        return None
+
+
+def wild_allele_lost(days: int = 1) -> StoppingRule:
+    """
+    Stopping rule that holds once no wild type allele has been left for `days`
+    recorded days in a row.
 
     Args:
-        script_path (str): Path to the GDSiMS script.
-        working_dir (str): Directory where the script should be run.
+        days (int): Number of consecutive Totals rows without a wild type
+            allele. Defaults to 1.
 
     Returns:
-        str: Output from the GDSiMS script.
+        StoppingRule: The rule, to pass to `run_custom`.
     """
-    print(f"Running script: {script_path}")
 
-    process = subprocess.Popen(
+    def rule(totals: np.ndarray) -> bool:
+        if len(totals) < days:
+            return False
+        wild_alleles = 2 * totals[-days:, 1] + totals[-days:, 2] + totals[-days:, 4]
+        return bool((wild_alleles == 0).all())
+
+    return rule
+
+
+def population_eliminated(days: int = 1) -> StoppingRule:
+    """
+    Stopping rule that holds once there have been no males left for `days`
+    recorded days in a row.
+
+    Args:
+        days (int): Number of consecutive Totals rows without any males.
+            Defaults to 1.
+
+    Returns:
+        StoppingRule: The rule, to pass to `run_custom`.
+    """
+
+    def rule(totals: np.ndarray) -> bool:
+        if len(totals) < days:
+            return False
+        return bool((totals[-days:, 1:] == 0).all())
+
+    return rule
+
+
+def stop_marker_path(working_dir: str | Path, set_label: int) -> Path:
+    """
+    Path of the file marking a run that was stopped early by a stopping rule.
+
+    The file sits next to the other outputs as `Stopped{label}run1.txt` and,
+    like the Totals file, has a title line and a `Day` header, followed by
+    the last day recorded in the Totals file before the run was stopped.
+
+    Args:
+        working_dir (str): Directory of the campaign, containing `output_files`.
+        set_label (int): The label of the run.
+
+    Returns:
+        Path: The path of the marker file, which may not exist.
+    """
+    return Path(working_dir) / "output_files" / f"Stopped{set_label}run1.txt"
+
+
+class _TotalsMonitor:
+    """
+    Follow the Totals file of a running simulation and apply a stopping rule.
+
+    Only the bytes added since the last check are read, and files older than
+    the run, e.g. left behind by an earlier run, are ignored.
+    """
+
+    def __init__(self, run_dir: str | Path, set_label: int, rule: StoppingRule):
+        self._run_dir = run_dir
+        self._set_label = set_label
+        self._path = Path(run_dir) / "output_files" / f"Totals{set_label}run1.txt"
+        self._rule = rule
+        self._start_time = time.time()
+        self._last_check = time.monotonic()
+        self._offset = 0
+        self._partial_line = b""
+        self._header_lines = 2
+        self._rows: list[list[int]] = []
+        self.stop_day: int | None = None
+
+    def check(self) -> bool:
+        """Read any new Totals rows and return whether the run can be stopped."""
+        now = time.monotonic()
+        if now - self._last_check < 0.5:
+            return False
+        self._last_check = now
+
+        try:
+            with open(self._path, "rb") as file:
+                if os.fstat(file.fileno()).st_mtime < self._start_time:
+                    return False
+                file.seek(self._offset)
+                data = file.read()
+        except FileNotFoundError:
+            return False
+        if not data:
+            return False
+        self._offset += len(data)
+
+        lines = (self._partial_line + data).split(b"\n")
+        self._partial_line = lines.pop()
+        num_rows = len(self._rows)
+        for line in lines:
+            if self._header_lines > 0:
+                self._header_lines -= 1
+            elif line.strip():
+                self._rows.append([int(float(value)) for value in line.split()])
+        if len(self._rows) == num_rows or not self._rule(np.array(self._rows)):
+            return False
+
+        self.stop_day = self._rows[-1][0]
+        return True
+
+    def write_marker(self) -> None:
+        """Write the file marking the run as stopped early."""
+        stop_marker_path(self._run_dir, self._set_label).write_text(
+            f"Stopped early by a stopping rule\nDay\n{self.stop_day}\n"
+        )
+
+
+def _poll_child(
+    process: subprocess.Popen,
+    watchdog: _Watchdog | None = None,
+    monitor: _TotalsMonitor | None = None,
+) -> resource.struct_rusage | None:
+    """
+    Reap a child process with `os.wait4` if it has exited and set its return code.
+
+    If the stopping rule of `monitor` holds, the process group is killed so
+    that it is reaped as normal on a later poll.
+
+    Returns:
+        resource.struct_rusage | None: The resource use of the reaped process,
+            or None while it is still running.
+
+    Raises:
+        TimeoutError: If the watchdog gives up on the process, after its whole
+            process group has been killed and reaped.
+    """
+    waited_pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+    if waited_pid != 0:
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return rusage
+    if monitor is not None and monitor.check():
+        _kill_process_group(process.pid)
+        return None
+    reason = None if watchdog is None else watchdog.expired()
+    if reason is not None:
+        _kill_process_group(process.pid)
+        _, status, _ = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        raise TimeoutError(reason)
+    return None
+
+
+def _poll_delays() -> Iterator[float]:
+    """Seconds to sleep between polls of a child, backing off to 0.1."""
+    delay = 0.001
+    while True:
+        yield delay
+        delay = min(delay * 2, 0.1)
+
+
+def _wait4(
+    process: subprocess.Popen,
+    watchdog: _Watchdog | None = None,
+    monitor: _TotalsMonitor | None = None,
+) -> resource.struct_rusage:
+    """Reap a child process, polling it with `_poll_child` until it exits."""
+    delays = _poll_delays()
+    while (rusage := _poll_child(process, watchdog, monitor)) is None:
+        time.sleep(next(delays))
+    return rusage
+
+
+def _start_gdsims(script_path: str | Path, working_dir: str | Path) -> subprocess.Popen:
+    """Start GDSiMS with pipes for all three standard streams."""
+    # A session of its own lets a hung run be killed along with any children
+    return subprocess.Popen(
         [str(script_path)],
         cwd=str(working_dir),
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
+        start_new_session=True,
     )
 
-    if process.stdin is None:
-        msg = "Failed to open stdin for the process."
-        raise RuntimeError(msg)
 
-    time.sleep(0.5)
-    process.stdin.write(b"1\n")
-    process.stdin.flush()
-    print("Selecting default parameters")
+def _supervisors(
+    working_dir: str | Path,
+    timeout: float | None,
+    stall_timeout: float | None,
+    set_label: int | None,
+    stopping_rule: StoppingRule | None,
+    cancel: threading.Event | None,
+) -> tuple[_Watchdog, _TotalsMonitor | None]:
+    """The watchdog of a run and the monitor of its stopping rule, if any."""
+    watchdog = _Watchdog(working_dir, timeout, stall_timeout, cancel)
+    monitor = None
+    if stopping_rule is not None and set_label is not None:
+        monitor = _TotalsMonitor(working_dir, set_label, stopping_rule)
+    return watchdog, monitor
+
 
-    time.sleep(0.5)
-    process.stdin.write(b"y\n")
-    process.stdin.flush()
-    print("Starting Process")
+def _completed_run(
+    script_path: str | Path,
+    process: subprocess.Popen,
+    start_time: float,
+    rusage: resource.struct_rusage,
+    monitor: _TotalsMonitor | None,
+    stdout: bytes,
+    stderr: bytes,
+) -> tuple[subprocess.CompletedProcess, RunUsage]:
+    """Report a reaped run, marking it as a success if it was stopped early."""
+    if monitor is not None and monitor.stop_day is not None:
+        monitor.write_marker()
+        process.returncode = 0
 
-    stdout, _ = process.communicate()
-    return stdout.decode()
+    usage = RunUsage.from_rusage(time.monotonic() - start_time, rusage)
+    completed = subprocess.CompletedProcess(
+        str(script_path), process.returncode, stdout, stderr
+    )
+    return completed, usage
 
 
-def run_custom_no_coords(
-    script_path: str | Path, working_dir: str | Path, params_path: str | Path
+def _drive_gdsims(
+    script_path: str | Path,
+    working_dir: str | Path,
+    answers: list[str],
+    prompt_timeout: float = 30.0,
+    prompt: re.Pattern[bytes] = GDSIMS_PROMPT,
+    timeout: float | None = None,
+    stall_timeout: float | None = None,
+    log_prefix: str | Path | None = None,
+    set_label: int | None = None,
+    stopping_rule: StoppingRule | None = None,
+    cancel: threading.Event | None = None,
+) -> tuple[subprocess.CompletedProcess, RunUsage]:
+    """
+    Run the GDSiMS menu and return the finished process and its resource use.
+
+    This does the work of `drive_gdsims` but does not raise on a non-zero exit
+    status. The process is reaped with `os.wait4` to get its resource use.
+    If `stopping_rule` holds for the Totals file of run `set_label`, the run
+    is killed, marked as stopped and reported as a success. Once `cancel` is
+    set, the run is killed as if it had timed out.
+    """
+    start_time = time.monotonic()
+    menu = _Menu(answers, prompt)
+    with _run_logs(log_prefix) as (stdout_log, stderr_log):
+        process = _start_gdsims(script_path, working_dir)
+        # Leaving the block closes all three pipes of the reaped process
+        with process:
+            readers: list[_StreamReader] = []
+            try:
+                if process.stdin is None:
+                    msg = "Failed to open stdin for the process."
+                    raise RuntimeError(msg)
+
+                readers = [
+                    _StreamReader(process.stdout, stdout_log),  # type: ignore[arg-type]
+                    _StreamReader(process.stderr, stderr_log),  # type: ignore[arg-type]
+                ]
+                watchdog, monitor = _supervisors(
+                    working_dir,
+                    timeout,
+                    stall_timeout,
+                    set_label,
+                    stopping_rule,
+                    cancel,
+                )
+                try:
+                    while not menu.done:
+                        process.stdin.write(readers[0].wait_for(menu, prompt_timeout))
+                        process.stdin.flush()
+                except (EOFError, BrokenPipeError) as e:
+                    _kill_process_group(process.pid)
+                    process.wait()
+                    raise _early_exit_error(readers[0].result()) from e
+
+                process.stdin.close()
+                rusage = _wait4(process, watchdog, monitor)
+            finally:
+                # Never leave a simulator running behind, whatever went wrong
+                if process.returncode is None:
+                    _kill_process_group(process.pid)
+                    process.wait()
+                # An answer the process never read can no longer be flushed
+                if process.stdin is not None:
+                    with suppress(BrokenPipeError):
+                        process.stdin.close()
+                outputs = [reader.result() for reader in readers]
+
+    stdout, stderr = outputs
+    return _completed_run(
+        script_path, process, start_time, rusage, monitor, stdout, stderr
+    )
+
+
+def drive_gdsims(
+    script_path: str | Path,
+    working_dir: str | Path,
+    answers: list[str],
+    prompt_timeout: float = 30.0,
+    prompt: re.Pattern[bytes] = GDSIMS_PROMPT,
+    timeout: float | None = None,
+    stall_timeout: float | None = None,
+    log_prefix: str | Path | None = None,
 ) -> str:
     """
-    Run the GDSiMS script with custom parameters.
+    Run the interactive GDSiMS menu, answering each prompt as it appears.
+
+    The output of the process is read as it is produced and each answer is
+    written as soon as the next prompt shows up. Once all the answers have been
+    given, stdin is closed and the function waits for the simulation to finish.
+    Only the last `OUTPUT_TAIL_BYTES` of stdout and stderr are kept in memory,
+    so a full record of a verbose run needs `log_prefix`.
 
     Args:
         script_path (str): Path to the GDSiMS script.
         working_dir (str): Directory where the script should be run.
-        params_path (str): Path to the file containing custom parameters.
+        answers (list[str]): Answers to give to the menu prompts, in order.
+        prompt_timeout (float): Seconds to wait for each prompt before the
+            process is killed. Defaults to 30.
+        prompt (re.Pattern): Pattern that marks the end of a prompt in the
+            output. Defaults to `GDSIMS_PROMPT`.
+        timeout (float, optional): Seconds the whole run may take before it is
+            killed. Defaults to None, which waits as long as it takes.
+        stall_timeout (float, optional): Seconds the files in `output_files`
+            may go without growing before the run is killed. Defaults to None.
+        log_prefix (str, optional): Path prefix of the `.stdout.log` and
+            `.stderr.log` files to stream the output of the run to. Defaults to
+            None, which keeps only the end of the output.
+
+    Returns:
+        str: The end of the output from the GDSiMS script.
+
+    Raises:
+        TimeoutError: If a prompt does not appear within `prompt_timeout`, or
+            the run exceeds `timeout` or `stall_timeout`. The process and any
+            children it started are killed first.
+        RuntimeError: If stdin cannot be opened or the process exits before
+            all the answers have been given.
+        subprocess.CalledProcessError: If GDSiMS exits with a non-zero status.
+    """
+    completed, _ = _drive_gdsims(
+        script_path,
+        working_dir,
+        answers,
+        prompt_timeout,
+        prompt,
+        timeout,
+        stall_timeout,
+        log_prefix,
+    )
+    completed.check_returncode()
+    return completed.stdout.decode()
+
+
+def run_default(
+    script_path: str | Path,
+    working_dir: str | Path,
+    prompt_timeout: float = 30.0,
+    timeout: float | None = None,
+) -> str:
+    """
+    Run the GDSiMS script with default parameters.
+
+    Args:
+        script_path (str): Path to the GDSiMS script.
+        working_dir (str): Directory where the script should be run.
+        prompt_timeout (float): Seconds to wait for each menu prompt.
+        timeout (float, optional): Seconds the whole run may take before it is
+            killed. Defaults to None.
 
     Returns:
         str: Output from the GDSiMS script.
     """
+    print(f"Running script: {script_path}")
+
+    return drive_gdsims(
+        script_path,
+        working_dir,
+        [
+            "1",  # Default parameter set
+            "y",  # Start the run
+        ],
+        prompt_timeout=prompt_timeout,
+        timeout=timeout,
+    )
+
+
+def _check_custom_paths(
+    working_dir: str | Path,
+    params_path: str | Path,
+    coords_path: str | Path | None = None,
+) -> None:
+    """Raise a FileNotFoundError if any of the inputs for a custom run are missing."""
     if not Path(working_dir).is_dir():
         msg = f"Working directory {working_dir} does not exist."
         raise FileNotFoundError(msg)
     if not Path(params_path).is_file():
         msg = f"Parameters file {params_path} does not exist."
         raise FileNotFoundError(msg)
+    if coords_path is not None and not coords_available(coords_path):
+        msg = f"Coordinates file {coords_path} does not exist."
+        raise FileNotFoundError(msg)
 
-    process = subprocess.Popen(
-        [str(script_path)],
-        cwd=str(working_dir),
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
 
-    if process.stdin is None:
-        msg = "Failed to open stdin for the process."
-        raise RuntimeError(msg)
+def _check_stopping_rule(
+    params_path: str | Path, stopping_rule: StoppingRule | None
+) -> None:
+    """Raise a ValueError if a run with several replicates has a stopping rule."""
+    if stopping_rule is None:
+        return
+    num_runs = int(float(read_params_text(params_path).split()[0]))
+    if num_runs > 1:
+        msg = (
+            f"Parameters file {params_path} has {num_runs} replicates, but only "
+            "runs with one replicate can be stopped early."
+        )
+        raise ValueError(msg)
 
-    time.sleep(0.1)
-    process.stdin.write(b"100\n")
-    process.stdin.flush()
 
-    time.sleep(0.1)
-    process.stdin.write(f"{params_path}\n".encode())
-    process.stdin.flush()
+def _custom_answers(
+    params_path: str | Path, coords_path: str | Path | None = None
+) -> list[str]:
+    """Answers to the GDSiMS menu for a run with custom parameters."""
+    answers = [
+        "100",  # Custom parameter set
+        str(params_path),
+        "y",  # Confirm to use custom parameters
+    ]
+    if coords_path is not None:
+        answers += [
+            "y",  # Want advanced options
+            "4",  # Select coordinates file
+            str(coords_path),
+            "0",  # No additional options
+        ]
+    return answers
+
+
+def run_custom_no_coords(
+    script_path: str | Path,
+    working_dir: str | Path,
+    params_path: str | Path,
+    prompt_timeout: float = 30.0,
+    timeout: float | None = None,
+) -> str:
+    """
+    Run the GDSiMS script with custom parameters.
+
+    Args:
+        script_path (str): Path to the GDSiMS script.
+        working_dir (str): Directory where the script should be run.
+        params_path (str): Path to the file containing custom parameters.
+        prompt_timeout (float): Seconds to wait for each menu prompt.
+        timeout (float, optional): Seconds the whole run may take before it is
+            killed. Defaults to None.
 
-    time.sleep(0.1)
-    process.stdin.write(b"y\n")
-    process.stdin.flush()
+    Returns:
+        str: Output from the GDSiMS script.
+    """
+    _check_custom_paths(working_dir, params_path)
 
-    stdout, _ = process.communicate()
-    return stdout.decode()
+    return drive_gdsims(
+        script_path,
+        working_dir,
+        _custom_answers(params_path),
+        prompt_timeout=prompt_timeout,
+        timeout=timeout,
+    )
 
 
 def run_custom_with_coords(
@@ -146,6 +829,8 @@ def run_custom_with_coords(
     working_dir: str | Path,
     params_path: str | Path,
     coords_path: str | Path,
+    prompt_timeout: float = 30.0,
+    timeout: float | None = None,
 ) -> str:
     """
     Run the GDSiMS script with custom parameters.
@@ -155,88 +840,1724 @@ def run_custom_with_coords(
         working_dir (str): Directory where the script should be run.
         params_path (str): Path to the file containing custom parameters.
         coords_path (str): Path to the file containing coordinates.
+        prompt_timeout (float): Seconds to wait for each menu prompt.
+        timeout (float, optional): Seconds the whole run may take before it is
+            killed. Defaults to None.
 
     Returns:
         str: Output from the GDSiMS script.
     """
+    _check_custom_paths(working_dir, params_path, coords_path)
 
-    if not Path(working_dir).is_dir():
-        msg = f"Working directory {working_dir} does not exist."
-        raise FileNotFoundError(msg)
-    if not Path(params_path).is_file():
-        msg = f"Parameters file {params_path} does not exist."
-        raise FileNotFoundError(msg)
-    if not Path(coords_path).is_file():
-        msg = f"Coordinates file {coords_path} does not exist."
-        raise FileNotFoundError(msg)
+    return drive_gdsims(
+        script_path,
+        working_dir,
+        _custom_answers(params_path, coords_path),
+        prompt_timeout=prompt_timeout,
+        timeout=timeout,
+    )
 
-    process = subprocess.Popen(
-        [str(script_path)],
-        cwd=str(working_dir),
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+
+@contextmanager
+def scratch_dir(scratch_root: str | Path) -> Iterator[Path]:
+    """
+    Create an isolated directory for a single run under `scratch_root`.
+
+    The directory and anything left in it are removed on exit. Point
+    `scratch_root` at a RAM backed location such as `/dev/shm` to keep the
+    heavy LocalData writes off shared storage.
+
+    Args:
+        scratch_root (str): Directory in which to create the run directory.
+
+    Yields:
+        Path: The run directory.
+    """
+    Path(scratch_root).mkdir(parents=True, exist_ok=True)
+    run_dir = Path(tempfile.mkdtemp(prefix="gdsims_", dir=str(scratch_root)))
+    try:
+        yield run_dir
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def _publish_marker_path(output_dir: Path, set_label: int) -> Path:
+    """Hidden file marking the outputs of a run as being published."""
+    return output_dir / f".Publishing{set_label}"
+
+
+def publish_outputs(run_dir: str | Path, working_dir: str | Path) -> list[Path]:
+    """
+    Move the output files of a finished run into `working_dir/output_files`.
+
+    The files are first moved into a hidden staging directory next to their
+    destination, which is where they are copied if `run_dir` is on another
+    filesystem. A hidden marker is then written for each run, the staged files
+    are renamed into place and the markers are removed last. `output_files_for`
+    lists nothing for a run while its marker exists, so the outputs of a run
+    are seen all at once or, if publishing was cut short, not at all.
+
+    Args:
+        run_dir (str): Directory the run was carried out in.
+        working_dir (str): Directory of the campaign to publish into.
+
+    Returns:
+        list[Path]: The published output files.
+    """
+    run_output_dir = Path(run_dir) / "output_files"
+    output_dir = Path(working_dir) / "output_files"
+    output_dir.mkdir(exist_ok=True)
+
+    if not run_output_dir.is_dir():
+        return []
+
+    staging_dir = output_dir / f".{Path(run_dir).name}.partial"
+    staging_dir.mkdir(exist_ok=True)
+    try:
+        staged = []
+        for file_path in sorted(run_output_dir.iterdir()):
+            shutil.move(file_path, staging_dir / file_path.name)
+            staged.append(staging_dir / file_path.name)
+
+        markers = {
+            _publish_marker_path(output_dir, int(match[1]))
+            for file_path in staged
+            if (match := re.match(r"[A-Za-z]+(\d+)run\d+\.txt$", file_path.name))
+        }
+        for marker in markers:
+            marker.touch()
+        published = []
+        for file_path in staged:
+            os.replace(file_path, output_dir / file_path.name)
+            published.append(output_dir / file_path.name)
+        for marker in markers:
+            marker.unlink()
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return published
+
+
+def _resolve_inputs(
+    params_path: str | Path, coords_path: str | Path | None
+) -> tuple[Path, Path | None]:
+    """Make the input paths absolute so they can be used from a scratch directory."""
+    return (
+        Path(params_path).resolve(),
+        None if coords_path is None else Path(coords_path).resolve(),
     )
 
-    if process.stdin is None:
-        msg = "Failed to open stdin for the process."
-        raise RuntimeError(msg)
 
-    time.sleep(0.01)
-    process.stdin.write(b"100\n")
-    process.stdin.flush()
+def file_hash(file_path: str | Path) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(str(file_path), "rb") as file:
+        while chunk := file.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-    time.sleep(0.01)
-    process.stdin.write(f"{params_path}\n".encode())
-    process.stdin.flush()
 
-    time.sleep(0.1)
-    process.stdin.write(b"y\n")  # Confirm to use custom parameters
-    process.stdin.flush()
+@functools.lru_cache(maxsize=16)
+def _script_hash(script_path: str, size: int, mtime_ns: int) -> str:  # noqa: ARG001
+    """
+    Hash of the GDSiMS script, only recomputed when the file changes.
 
-    time.sleep(0.01)
-    process.stdin.write(b"y\n")  # Want advanced options
-    process.stdin.flush()
+    The size and modification time are not used directly, but being part of
+    the `lru_cache` key means a rebuilt script is hashed again.
+    """
+    return file_hash(script_path)
 
-    time.sleep(0.01)
-    process.stdin.write(b"4\n")  # Select coordinates file
-    process.stdin.flush()
 
-    time.sleep(0.01)
-    process.stdin.write(f"{coords_path}\n".encode())
-    process.stdin.flush()
+# Name of the table of parameter values kept in the params folder of a campaign.
+params_table_name = "params.npz"
 
-    time.sleep(0.01)
-    process.stdin.write(b"0\n")  # No additional options
-    process.stdin.flush()
 
-    stdout, _ = process.communicate()
-    return stdout.decode()
+def _format_value(value: float) -> str:
+    """Write whole numbers without a decimal point, as GDSiMS reads some as ints."""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
 
 
-def run_custom(
-    script_path: str | Path,
-    working_dir: str | Path,
-    params_path: str | Path,
-    coords_path: str | Path | None = None,
-) -> str:
+def params_text(values: Iterable[float]) -> str:
     """
-    Run the GDSiMS script with custom parameters.
+    Write the values of one run as the contents of a GDSiMS parameters file.
+
+    Args:
+        values (Iterable[float]): The value of each parameter, in
+            `parameter_order`.
+
+    Returns:
+        str: One value per line, with whole numbers written as integers.
+    """
+    return "".join(f"{_format_value(value)}\n" for value in values)
+
+
+@functools.lru_cache(maxsize=4)
+def _cached_params_table(
+    table_path: str,
+    size: int,  # noqa: ARG001
+    mtime_ns: int,  # noqa: ARG001
+) -> tuple[np.ndarray, dict[int, int]]:
+    """
+    Load a parameter table and index its rows by `set_label`.
 
-    This function just hands off to either `run_custom_no_coords` or
-    `run_custom_with_coords` depending on whether `coords_path` is provided.
+    As with `_script_hash`, the size and modification time are only part of
+    the `lru_cache` key, so the table is read again once it changes.
+    """
+    with np.load(table_path) as table:
+        columns = [str(name) for name in table["columns"]]
+        values = table["values"]
+    if columns != parameter_order:
+        msg = f"Parameter table {table_path} does not match parameter_order."
+        raise ValueError(msg)
+    values.setflags(write=False)
+    label_idx = parameter_order.index("set_label")
+    rows = {int(label): i for i, label in enumerate(values[:, label_idx])}
+    return values, rows
+
+
+def load_params_table(table_path: str | Path) -> np.ndarray:
+    """
+    Load the parameter values of a campaign, see `save_params_table`.
 
     Args:
-        script_path (str): Path to the GDSiMS script.
-        working_dir (str): Directory where the script should be run.
-        params_path (str): Path to the file containing custom parameters.
-        coords_path (str, optional): Path to the file containing coordinates.
-            Defaults to None.
+        table_path (str): Path to the parameter table.
 
     Returns:
-        str: Output from the GDSiMS script.
+        np.ndarray: A read-only array with one row per run, sorted by
+            `set_label`, and one column for each parameter in `parameter_order`.
     """
-    if coords_path is None:
-        return run_custom_no_coords(script_path, working_dir, params_path)
+    table_path = Path(table_path)
+    if not table_path.is_file():
+        msg = f"Parameter table {table_path} does not exist."
+        raise FileNotFoundError(msg)
+    stat = table_path.stat()
+    return _cached_params_table(str(table_path), stat.st_size, stat.st_mtime_ns)[0]
+
+
+def save_params_table(table_path: str | Path, values: np.ndarray) -> np.ndarray:
+    """
+    Add the parameter values of some runs to the table of a campaign.
+
+    The table is a single .npz file with a row for each run, identified by its
+    `set_label`, in place of a GDSiMS parameters file per run. Rows whose
+    `set_label` is already in the table replace the old ones. The table is
+    written to a temporary file first, so it is never left half written.
+
+    Args:
+        table_path (str): Path to the parameter table, usually
+            `params/params.npz` in the campaign directory.
+        values (np.ndarray): One row per run and one column for each parameter
+            in `parameter_order`.
+
+    Returns:
+        np.ndarray: The whole table after the new rows were added.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    if values.shape[1] != len(parameter_order):
+        msg = (
+            f"Parameter values have {values.shape[1]} columns, "
+            f"expected {len(parameter_order)}."
+        )
+        raise ValueError(msg)
+
+    label_idx = parameter_order.index("set_label")
+    table_path = Path(table_path)
+    if table_path.exists():
+        old_values = load_params_table(table_path)
+        kept = ~np.isin(old_values[:, label_idx], values[:, label_idx])
+        values = np.concatenate([old_values[kept], values])
+    values = values[np.argsort(values[:, label_idx], kind="stable")]
+
+    tmp_path = table_path.with_name(f".{table_path.name}.tmp")
+    with tmp_path.open("wb") as file:
+        np.savez(file, columns=np.array(parameter_order), values=values)
+    os.replace(tmp_path, table_path)
+    return values
+
+
+def _table_row(params_path: str | Path) -> np.ndarray | None:
+    """
+    Find the row of a run in the parameter table next to its params file.
+
+    Runs in a table are named `params_{set_label}.txt`, as if they had their
+    own file in the params folder.
+    """
+    params_path = Path(params_path)
+    table_path = params_path.parent / params_table_name
+    match = re.fullmatch(r"params_(\d+)\.txt", params_path.name)
+    if match is None or not table_path.is_file():
+        return None
+    stat = table_path.stat()
+    values, rows = _cached_params_table(str(table_path), stat.st_size, stat.st_mtime_ns)
+    row = rows.get(int(match.group(1)))
+    return None if row is None else values[row]
+
+
+def read_params_text(params_path: str | Path) -> str:
+    """
+    Read a GDSiMS parameters file, or its row of the campaign's parameter table.
+
+    Args:
+        params_path (str): Path to the parameters file. If there is no such
+            file, the row for its `set_label` is taken from the
+            `params_table_name` table in the same folder.
+
+    Returns:
+        str: The contents of the parameters file.
+    """
+    if Path(params_path).is_file():
+        return Path(params_path).read_text()
+    row = _table_row(params_path)
+    if row is None:
+        msg = f"Parameters file {params_path} does not exist."
+        raise FileNotFoundError(msg)
+    return params_text(row)
+
+
+def params_hash(params_path: str | Path) -> str:
+    """Return the SHA-256 hex digest of a parameters file, see `read_params_text`."""
+    if Path(params_path).is_file():
+        return file_hash(params_path)
+    return hashlib.sha256(read_params_text(params_path).encode()).hexdigest()
+
+
+def coords_hash(coords_path: str | Path) -> str:
+    """Return the SHA-256 hex digest of a coordinates file, see `read_coords_text`."""
+    if Path(coords_path).is_file():
+        return file_hash(coords_path)
+    return hashlib.sha256(read_coords_text(coords_path).encode()).hexdigest()
+
+
+@contextmanager
+def params_file(params_path: str | Path) -> Iterator[Path]:
+    """
+    Make sure a GDSiMS parameters file exists while it is being used.
+
+    If the run only has a row in the parameter table, its file is written
+    just before and removed again afterwards. An existing file is left as is.
+
+    Args:
+        params_path (str): Path to the parameters file.
+
+    Yields:
+        Path: The path to the parameters file.
+    """
+    params_path = Path(params_path)
+    if params_path.is_file():
+        yield params_path
+        return
+
+    text = read_params_text(params_path)
+    tmp_path = params_path.with_name(f".{params_path.name}.tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, params_path)
+    try:
+        yield params_path
+    finally:
+        params_path.unlink(missing_ok=True)
+
+
+def read_set_label(params_path: str | Path) -> int:
+    """
+    Read the `set_label` from a GDSiMS parameters file.
+
+    The label is the last value in the file and is used by GDSiMS to name the
+    output files, e.g. `Totals{set_label}run1.txt`.
+    """
+    lines = read_params_text(params_path).split()
+    if not lines:
+        msg = f"Parameters file {params_path} is empty."
+        raise ValueError(msg)
+    return int(float(lines[-1]))
+
+
+def output_files_for(working_dir: str | Path, set_label: int) -> list[Path]:
+    """
+    List the output files written by the run with the given `set_label`.
+
+    Args:
+        working_dir (str): Directory of the campaign, containing `output_files`.
+        set_label (int): The label of the run.
+
+    Returns:
+        list[Path]: The matching files in `output_files`, sorted by name, or
+            none while `publish_outputs` is still publishing the run.
+    """
+    output_dir = Path(working_dir) / "output_files"
+    if not output_dir.is_dir() or _publish_marker_path(output_dir, set_label).exists():
+        return []
+    pattern = re.compile(rf"^[A-Za-z]+{set_label}run\d+\.txt$")
+    return sorted(p for p in output_dir.iterdir() if pattern.match(p.name))
+
+
+@dataclass
+class RunUsage:
+    """
+    Resources used by a single GDSiMS process.
+
+    Attributes:
+        wall_time (float): Seconds from starting to reaping the process.
+        user_time (float): CPU seconds spent in user mode.
+        system_time (float): CPU seconds spent in the kernel.
+        max_rss_kb (int): Peak resident set size in kilobytes.
+    """
+
+    wall_time: float
+    user_time: float
+    system_time: float
+    max_rss_kb: int
+
+    @classmethod
+    def from_rusage(cls, wall_time: float, rusage: resource.struct_rusage) -> RunUsage:
+        """Build from the resource use reported by `os.wait4`."""
+        return cls(
+            wall_time=wall_time,
+            user_time=rusage.ru_utime,
+            system_time=rusage.ru_stime,
+            max_rss_kb=rusage.ru_maxrss,
+        )
+
+
+# Type of each column of the resource ledger. The resource use of a run that
+# was restored from the cache is missing, and stored as NaN, and the names of
+# parameters files are cut to 64 characters.
+_LEDGER_DTYPES = {
+    "params": np.dtype("<U64"),
+    "set_label": np.dtype("<i8"),
+    "finished_at": np.dtype("<f8"),
+    "exit_status": np.dtype("<i8"),
+    "cached": np.dtype("?"),
+    "wall_time": np.dtype("<f8"),
+    "user_time": np.dtype("<f8"),
+    "system_time": np.dtype("<f8"),
+    "max_rss_kb": np.dtype("<f8"),
+    "totals_bytes": np.dtype("<i8"),
+    "local_data_bytes": np.dtype("<i8"),
+    "output_bytes": np.dtype("<i8"),
+}
+
+ledger_columns = list(_LEDGER_DTYPES)
+
+
+def _ledger_rows(ledger_dir: Path, dtypes: dict[str, np.dtype]) -> int:
+    """The number of rows written to every column of a ledger."""
+    sizes = []
+    for name, dtype in dtypes.items():
+        column_path = ledger_dir / f"{name}.bin"
+        size = column_path.stat().st_size if column_path.exists() else 0
+        sizes.append(size // dtype.itemsize)
+    return min(sizes)
+
+
+def append_ledger(
+    ledger_path: str | Path,
+    params_path: str | Path,
+    working_dir: str | Path,
+    exit_status: int,
+    usage: RunUsage | None = None,
+    cached: bool = False,
+) -> dict:
+    """
+    Append a row for a finished run to a campaign's resource ledger.
+
+    The ledger is a directory with a raw binary file of fixed width values for
+    each column in `ledger_columns`, and a `columns.json` file with their
+    types. A row is added by appending one value to each column file while
+    holding a lock on the ledger, so runs in other processes can append to the
+    same ledger, and any part of a row cut short by a crash is dropped first.
+    A column can then be read on its own, see `load_ledger`.
+
+    Args:
+        ledger_path (str): Path to the ledger directory.
+        params_path (str): Path to the parameters file of the run.
+        working_dir (str): Directory holding the run's `output_files`.
+        exit_status (int): The exit status of GDSiMS.
+        usage (RunUsage, optional): The resources used by the process. Defaults
+            to None, e.g. for a run restored from the cache.
+        cached (bool): Whether the outputs came from the cache.
+
+    Returns:
+        dict: The row written to the ledger.
+    """
+    set_label = read_set_label(params_path)
+    sizes = {p.name: p.stat().st_size for p in output_files_for(working_dir, set_label)}
+
+    row = {
+        "params": Path(params_path).name,
+        "set_label": set_label,
+        "finished_at": time.time(),
+        "exit_status": exit_status,
+        "cached": cached,
+        "wall_time": None if usage is None else usage.wall_time,
+        "user_time": None if usage is None else usage.user_time,
+        "system_time": None if usage is None else usage.system_time,
+        "max_rss_kb": None if usage is None else usage.max_rss_kb,
+        "totals_bytes": sum(v for k, v in sizes.items() if k.startswith("Totals")),
+        "local_data_bytes": sum(
+            v for k, v in sizes.items() if k.startswith("LocalData")
+        ),
+        "output_bytes": sum(sizes.values()),
+    }
+
+    ledger_dir = Path(ledger_path)
+    ledger_dir.mkdir(parents=True, exist_ok=True)
+    with open(ledger_dir / ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        schema_path = ledger_dir / "columns.json"
+        if not schema_path.exists():
+            schema = {name: dtype.str for name, dtype in _LEDGER_DTYPES.items()}
+            schema_path.write_text(json.dumps(schema))
+
+        num_rows = _ledger_rows(ledger_dir, _LEDGER_DTYPES)
+        for name, dtype in _LEDGER_DTYPES.items():
+            value = np.nan if row[name] is None else row[name]
+            with open(ledger_dir / f"{name}.bin", "ab") as file:
+                file.truncate(num_rows * dtype.itemsize)
+                file.write(np.array([value], dtype=dtype).tobytes())
+    return row
+
+
+def load_ledger(
+    ledger_path: str | Path, columns: Iterable[str] | None = None
+) -> pd.DataFrame:
+    """
+    Load a campaign's resource ledger, see `append_ledger`.
+
+    Args:
+        ledger_path (str): Path to the ledger directory. A CSV file written by
+            earlier versions of `append_ledger` is read as well.
+        columns (Iterable[str], optional): The columns to read. Defaults to
+            None, which reads all of them.
+
+    Returns:
+        pd.DataFrame: One row per finished run with the columns in
+            `ledger_columns`, or those in `columns`.
+    """
+    ledger_dir = Path(ledger_path)
+    if ledger_dir.is_file():
+        return pd.read_csv(ledger_dir, usecols=columns)
+    schema_path = ledger_dir / "columns.json"
+    if not schema_path.is_file():
+        msg = f"Ledger {ledger_path} does not exist."
+        raise FileNotFoundError(msg)
+
+    dtypes = {
+        name: np.dtype(dtype)
+        for name, dtype in json.loads(schema_path.read_text()).items()
+    }
+    names = list(dtypes) if columns is None else list(columns)
+    unknown = [name for name in names if name not in dtypes]
+    if unknown:
+        msg = f"Unknown ledger columns: {', '.join(unknown)}."
+        raise ValueError(msg)
+
+    num_rows = _ledger_rows(ledger_dir, dtypes)
+    return pd.DataFrame(
+        {
+            name: (
+                np.fromfile(ledger_dir / f"{name}.bin", dtypes[name], num_rows)
+                if num_rows
+                else np.empty(0, dtypes[name])
+            )
+            for name in names
+        }
+    )
+
+
+def cache_key(
+    script_path: str | Path,
+    params_path: str | Path,
+    coords_path: str | Path | None = None,
+) -> str:
+    """
+    Build the key of a run in the output cache.
+
+    The key is a hash of the parameter values in `parameter_order` (leaving out
+    `set_label`, which only names the files), the contents of the coordinates
+    file and the GDSiMS script itself.
+
+    Args:
+        script_path (str): Path to the GDSiMS script.
+        params_path (str): Path to the file containing custom parameters.
+        coords_path (str, optional): Path to the file containing coordinates.
+
+    Returns:
+        str: The cache key.
+    """
+    values = read_params_text(params_path).split()
+    if len(values) != len(parameter_order):
+        msg = (
+            f"Parameters file {params_path} has {len(values)} values, "
+            f"expected {len(parameter_order)}."
+        )
+        raise ValueError(msg)
+    label_idx = parameter_order.index("set_label")
+    canonical = [repr(float(v)) for i, v in enumerate(values) if i != label_idx]
+
+    script_stat = Path(script_path).stat()
+    key_data = {
+        "params": canonical,
+        "coords": None if coords_path is None else coords_hash(coords_path),
+        "script": _script_hash(
+            str(Path(script_path).resolve()),
+            script_stat.st_size,
+            script_stat.st_mtime_ns,
+        ),
+    }
+    return hashlib.sha256(json.dumps(key_data).encode()).hexdigest()
+
+
+def is_cached(
+    cache_dir: str | Path,
+    script_path: str | Path,
+    params_path: str | Path,
+    coords_path: str | Path | None = None,
+) -> bool:
+    """
+    Whether the output cache holds a run, so `run_custom` would restore it.
+
+    Args:
+        cache_dir (str): Directory of the output cache.
+        script_path (str): Path to the GDSiMS script.
+        params_path (str): Path to the file containing custom parameters.
+        coords_path (str, optional): Path to the file containing coordinates.
+
+    Returns:
+        bool: True if the run has an entry in the cache.
+    """
+    key = cache_key(script_path, params_path, coords_path)
+    return (Path(cache_dir) / key).is_dir()
+
+
+def _link_or_copy(src: Path, dest: Path) -> None:
+    """Hard link `src` to `dest`, copying if they are on different filesystems."""
+    tmp_path = dest.with_name(f".{dest.name}.{os.getpid()}.partial")
+    tmp_path.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dest)
+
+
+def restore_from_cache(
+    cache_dir: str | Path, key: str, working_dir: str | Path, set_label: int
+) -> str | None:
+    """
+    Link the cached outputs of a run into `working_dir/output_files`.
+
+    Args:
+        cache_dir (str): Directory of the output cache.
+        key (str): The cache key from `cache_key`.
+        working_dir (str): Directory to place `output_files` in.
+        set_label (int): The label to name the output files with.
+
+    Returns:
+        str | None: The stored output of GDSiMS, or None on a cache miss.
+    """
+    entry_dir = Path(cache_dir) / key
+    if not entry_dir.is_dir():
+        return None
+
+    output_dir = Path(working_dir) / "output_files"
+    output_dir.mkdir(exist_ok=True)
+    pattern = re.compile(r"^([A-Za-z]+)(run\d+\.txt)$")
+    for cached_path in entry_dir.iterdir():
+        match = pattern.match(cached_path.name)
+        if match is None:
+            continue
+        dest_path = output_dir / f"{match[1]}{set_label}{match[2]}"
+        _link_or_copy(cached_path, dest_path)
+
+    # Mark the entry as recently used for the eviction order
+    os.utime(entry_dir)
+    return (entry_dir / "stdout.txt").read_text()
+
+
+def add_to_cache(
+    cache_dir: str | Path,
+    key: str,
+    working_dir: str | Path,
+    set_label: int,
+    output: str,
+    max_bytes: int | None = None,
+) -> None:
+    """
+    Store the outputs of a finished run in the output cache.
+
+    The output files are hard linked into the cache where possible, so a cached
+    run takes no extra space while the campaign still holds its files.
+
+    Args:
+        cache_dir (str): Directory of the output cache.
+        key (str): The cache key from `cache_key`.
+        working_dir (str): Directory holding the run's `output_files`.
+        set_label (int): The label the output files are named with.
+        output (str): The output of GDSiMS, returned again on a cache hit.
+        max_bytes (int, optional): Size limit of the cache, enforced with
+            `evict_cache` after storing. Defaults to None for no limit.
+    """
+    cache_dir = Path(cache_dir)
+    entry_dir = cache_dir / key
+    if entry_dir.exists():
+        return
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=".partial_", dir=str(cache_dir)))
+    label = str(set_label)
+    for file_path in output_files_for(working_dir, set_label):
+        prefix, suffix = file_path.name.split(f"{label}run", 1)
+        _link_or_copy(file_path, tmp_dir / f"{prefix}run{suffix}")
+    (tmp_dir / "stdout.txt").write_text(output)
+
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        # Another run stored the same entry first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if max_bytes is not None:
+        evict_cache(cache_dir, max_bytes)
+
+
+def evict_cache(cache_dir: str | Path, max_bytes: int) -> list[Path]:
+    """
+    Remove the least recently used entries until the cache fits in `max_bytes`.
+
+    Files that are still hard linked from a campaign's `output_files` are not
+    counted, as removing their entry would not free their space.
+
+    Args:
+        cache_dir (str): Directory of the output cache.
+        max_bytes (int): The size limit of the cache in bytes.
+
+    Returns:
+        list[Path]: The removed entries.
+    """
+    entries = []
+    for entry_dir in Path(cache_dir).iterdir():
+        if entry_dir.name.startswith(".") or not entry_dir.is_dir():
+            continue
+        stats = [p.stat() for p in entry_dir.iterdir()]
+        size = sum(stat.st_size for stat in stats if stat.st_nlink == 1)
+        entries.append((entry_dir.stat().st_mtime, size, entry_dir))
+
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, entry_dir in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+        removed.append(entry_dir)
+    return removed
+
+
+# Failures worth another attempt: the simulator crashing, exiting with an
+# error, or being killed for hanging.
+_RETRYABLE = (subprocess.CalledProcessError, RuntimeError, TimeoutError)
+
+
+def _retry_delays(retries: int, retry_backoff: float) -> list[float | None]:
+    """
+    Seconds to wait after each failed attempt before the next one.
+
+    The delay doubles from `retry_backoff` with every retry, and is None for
+    the last attempt, whose failure is raised instead.
+    """
+    return [retry_backoff * 2**attempt for attempt in range(retries)] + [None]
+
+
+@dataclass
+class _CustomRun:
+    """
+    A custom run with its input files in place, see `_custom_run`.
+
+    Attributes:
+        working_dir (str): Directory of the campaign.
+        set_label (int): The label the output files are named with.
+        answers (list[str]): The answers to the GDSiMS menu.
+        cache_dir (str, optional): Directory of the output cache, if any.
+        key (str, optional): The cache key of the run, if there is a cache.
+        cached (str, optional): The output restored from the cache on a hit.
+        scratch_dir (Path, optional): The directory of the run under
+            `scratch_root`, if any, with its input files and the directory of
+            each attempt.
+    """
+
+    working_dir: str | Path
+    set_label: int
+    answers: list[str]
+    cache_dir: str | Path | None = None
+    key: str | None = None
+    cached: str | None = None
+    scratch_dir: Path | None = None
+
+    def store(self, output: str, max_bytes: int | None) -> None:
+        """Add the outputs of the finished run to the cache, if there is one."""
+        if self.cache_dir is not None and self.key is not None:
+            add_to_cache(
+                self.cache_dir,
+                self.key,
+                self.working_dir,
+                self.set_label,
+                output,
+                max_bytes,
+            )
+
+
+@contextmanager
+def _custom_run(
+    script_path: str | Path,
+    working_dir: str | Path,
+    params_path: str | Path,
+    coords_path: str | Path | None,
+    scratch_root: str | Path | None,
+    cache_dir: str | Path | None,
+    ledger_path: str | Path | None,
+    stopping_rule: StoppingRule | None,
+) -> Iterator[_CustomRun]:
+    """
+    Put the inputs of a custom run in place and look it up in the cache.
+
+    This is everything `run_custom` and `run_custom_async` do before the first
+    attempt, and the input files written for the run are removed on exit.
+    """
+    with ExitStack() as stack:
+        stack.enter_context(params_file(params_path))
+        run_dir = None
+        if scratch_root is not None:
+            # Concurrent runs share scratch_root, so each writes in its own
+            run_dir = stack.enter_context(scratch_dir(scratch_root))
+        coords_path = stack.enter_context(coords_file(coords_path, run_dir))
+        _check_custom_paths(working_dir, params_path, coords_path)
+        _check_stopping_rule(params_path, stopping_rule)
+        run = _CustomRun(
+            working_dir,
+            read_set_label(params_path),
+            _custom_answers(*_resolve_inputs(params_path, coords_path)),
+            cache_dir,
+            scratch_dir=run_dir,
+        )
+        # A marker left by an earlier run of this label no longer applies
+        stop_marker_path(working_dir, run.set_label).unlink(missing_ok=True)
+
+        if cache_dir is not None:
+            run.key = cache_key(script_path, params_path, coords_path)
+            run.cached = restore_from_cache(
+                cache_dir, run.key, working_dir, run.set_label
+            )
+            if run.cached is not None and ledger_path is not None:
+                append_ledger(ledger_path, params_path, working_dir, 0, cached=True)
+        yield run
+
+
+@dataclass
+class _Attempt:
+    """
+    One attempt at a custom run, apart from how GDSiMS is driven.
+
+    `_simulate` and `_simulate_async` share the choice of run directory and
+    the bookkeeping afterwards, and only call a different driver.
+    """
+
+    script_path: str | Path
+    working_dir: str | Path
+    params_path: str | Path
+    answers: list[str]
+    prompt_timeout: float
+    timeout: float | None
+    stall_timeout: float | None
+    scratch_root: str | Path | None
+    ledger_path: str | Path | None
+    log_dir: str | Path | None
+    stopping_rule: StoppingRule | None
+    cancel: threading.Event | None
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the run has been cancelled, so it should not be retried."""
+        return self.cancel is not None and self.cancel.is_set()
+
+    @contextmanager
+    def run_dir(self) -> Iterator[Path]:
+        """The directory to run in, of its own if there is a `scratch_root`."""
+        if self.scratch_root is None:
+            self.discard_outputs()
+            yield Path(self.working_dir)
+            return
+        with scratch_dir(self.scratch_root) as run_dir:
+            yield run_dir
+
+    def drive(self, driver: Callable[..., T], run_dir: Path) -> T:
+        """Call `_drive_gdsims` or `_drive_gdsims_async` for this attempt."""
+        return driver(
+            self.script_path,
+            run_dir,
+            self.answers,
+            self.prompt_timeout,
+            timeout=self.timeout,
+            stall_timeout=self.stall_timeout,
+            log_prefix=(
+                None
+                if self.log_dir is None
+                else Path(self.log_dir) / Path(self.params_path).stem
+            ),
+            set_label=read_set_label(self.params_path),
+            stopping_rule=self.stopping_rule,
+            cancel=self.cancel,
+        )
+
+    def discard_outputs(self) -> None:
+        """
+        Remove the outputs of the run from `working_dir` before an attempt there.
+
+        These may be left by a failed attempt, or be hard links to the output
+        cache, which GDSiMS would write through when it opens them again. An
+        attempt in a scratch directory only publishes its outputs once it has
+        succeeded, replacing rather than writing to the old files, so there is
+        nothing to remove.
+        """
+        if self.scratch_root is not None:
+            return
+        set_label = read_set_label(self.params_path)
+        for file_path in output_files_for(self.working_dir, set_label):
+            file_path.unlink(missing_ok=True)
+
+    def finish(
+        self, run_dir: Path, completed: subprocess.CompletedProcess, usage: RunUsage
+    ) -> subprocess.CompletedProcess:
+        """Publish the outputs of the attempt, record it and raise if it failed."""
+        if completed.returncode == 0 and self.scratch_root is not None:
+            publish_outputs(run_dir, self.working_dir)
+        if self.ledger_path is not None:
+            append_ledger(
+                self.ledger_path,
+                self.params_path,
+                self.working_dir,
+                completed.returncode,
+                usage,
+            )
+        completed.check_returncode()
+        return completed
+
+
+def _simulate(attempt: _Attempt) -> subprocess.CompletedProcess:
+    """Carry out one attempt at a custom run and raise if it failed."""
+    with attempt.run_dir() as run_dir:
+        completed, usage = attempt.drive(_drive_gdsims, run_dir)
+        return attempt.finish(run_dir, completed, usage)
+
+
+def run_custom(
+    script_path: str | Path,
+    working_dir: str | Path,
+    params_path: str | Path,
+    coords_path: str | Path | None = None,
+    prompt_timeout: float = 30.0,
+    scratch_root: str | Path | None = None,
+    cache_dir: str | Path | None = None,
+    cache_max_bytes: int | None = None,
+    ledger_path: str | Path | None = None,
+    timeout: float | None = None,
+    stall_timeout: float | None = None,
+    retries: int = 0,
+    retry_backoff: float = 10.0,
+    log_dir: str | Path | None = None,
+    stopping_rule: StoppingRule | None = None,
+    cancel: threading.Event | None = None,
+) -> str:
+    """
+    Run the GDSiMS script with custom parameters.
+
+    This answers the menu in the same way as `run_custom_no_coords` or
+    `run_custom_with_coords`, depending on whether `coords_path` is provided.
+    If `scratch_root` is given, the run happens in its own directory under it
+    and the output files are published to `working_dir` once it has finished.
+    If `cache_dir` is given and the same parameters, coordinates and GDSiMS
+    script have been run before, the cached outputs are linked in instead.
+    If `params_path` is a run of the campaign's parameter table rather than a
+    file, the file is written just before the run and removed afterwards, and
+    likewise a `coords_path` kept in a `mozzie.coords` release site store is
+    written in the directory of the run under `scratch_root`, if given.
+
+    Args:
+        script_path (str): Path to the GDSiMS script.
+        working_dir (str): Directory where the script should be run.
+        params_path (str): Path to the file containing custom parameters.
+        coords_path (str, optional): Path to the file containing coordinates.
+            Defaults to None.
+        prompt_timeout (float): Seconds to wait for each menu prompt.
+        scratch_root (str, optional): Directory for isolated per-run scratch
+            directories, e.g. "/dev/shm". Defaults to None, which runs directly
+            in `working_dir`.
+        cache_dir (str, optional): Directory of the output cache. Defaults to
+            None, which always runs the simulation.
+        cache_max_bytes (int, optional): Size limit of the output cache, with
+            the least recently used entries removed first. Defaults to None.
+        ledger_path (str, optional): Resource ledger to append a row for this
+            run to, see `append_ledger`. Defaults to None.
+        timeout (float, optional): Seconds each attempt may take before it is
+            killed. Defaults to None.
+        stall_timeout (float, optional): Seconds the output files may go
+            without growing before the attempt is killed. Defaults to None.
+        retries (int): How many more attempts to make after a failed one.
+            Any outputs a failed attempt left in `working_dir` are removed
+            before the next one. Defaults to 0.
+        retry_backoff (float): Seconds to wait before the first retry, doubled
+            for every retry after that. Defaults to 10.
+        log_dir (str, optional): Directory to stream the stdout and stderr of
+            the run to, as `<params name>.stdout.log` and `.stderr.log`.
+            Defaults to None.
+        stopping_rule (StoppingRule, optional): Rule to stop the run early
+            with, e.g. `wild_allele_lost(30)`. The Totals file is checked as it
+            is written and, once the rule holds, the run is killed and marked
+            with `stop_marker_path`. Such runs are not added to the cache.
+            A run with more than one replicate cannot be stopped early, as
+            its later replicates would be cut short, and raises a ValueError.
+            Defaults to None.
+        cancel (threading.Event, optional): Once set, the running attempt is
+            killed, raising a TimeoutError, and no more attempts are made,
+            e.g. when another worker has taken over the run. Defaults to None.
+
+    Returns:
+        str: The end of the output from the GDSiMS script.
+    """
+    with _custom_run(
+        script_path,
+        working_dir,
+        params_path,
+        coords_path,
+        scratch_root,
+        cache_dir,
+        ledger_path,
+        stopping_rule,
+    ) as run:
+        if run.cached is not None:
+            return run.cached
+
+        attempt = _Attempt(
+            script_path,
+            working_dir,
+            params_path,
+            run.answers,
+            prompt_timeout,
+            timeout,
+            stall_timeout,
+            run.scratch_dir,
+            ledger_path,
+            log_dir,
+            stopping_rule,
+            cancel,
+        )
+        for delay in _retry_delays(retries, retry_backoff):
+            try:
+                completed = _simulate(attempt)
+                break
+            except _RETRYABLE:
+                if delay is None or attempt.cancelled:
+                    raise
+                time.sleep(delay)
+
+        output = completed.stdout.decode()
+        if stopping_rule is None:
+            run.store(output, cache_max_bytes)
+        return output
+
+
+async def _wait_for_prompt_async(
+    stream: asyncio.StreamReader,
+    output: _OutputTail,
+    menu: _Menu,
+    timeout: float,
+) -> bytes:
+    """
+    Read from `stream` into `output` until the next prompt of `menu` appears.
+
+    This is the asyncio counterpart of `_StreamReader.wait_for`.
+    """
+    deadline = time.monotonic() + timeout
+    while (answer := menu.reply(output)) is None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            msg = f"No prompt from GDSiMS within {timeout} seconds."
+            raise TimeoutError(msg)
+        try:
+            chunk = await asyncio.wait_for(stream.read(4096), remaining)
+        except TimeoutError:
+            msg = f"No prompt from GDSiMS within {timeout} seconds."
+            raise TimeoutError(msg) from None
+        if not chunk:
+            msg = "Stream closed before the expected prompt appeared."
+            raise EOFError(msg)
+        output.extend(chunk)
+    return answer
+
+
+async def _read_into(stream: asyncio.StreamReader, output: _OutputTail) -> None:
+    """Read `stream` to the end into `output`."""
+    while chunk := await stream.read(65536):
+        output.extend(chunk)
+
+
+async def _poll_child_async(
+    process: subprocess.Popen,
+    watchdog: _Watchdog | None = None,
+    monitor: _TotalsMonitor | None = None,
+) -> resource.struct_rusage | None:
+    """Poll a child process with `_poll_child`, in a thread if it reads files."""
+    if watchdog is None and monitor is None:
+        return _poll_child(process)
+    poll = asyncio.ensure_future(
+        asyncio.to_thread(_poll_child, process, watchdog, monitor)
+    )
+    try:
+        return await asyncio.shield(poll)
+    except asyncio.CancelledError:
+        # Let the poll finish, so the process is never reaped twice
+        with suppress(Exception):
+            await poll
+        raise
+
+
+async def _wait4_async(
+    process: subprocess.Popen,
+    watchdog: _Watchdog | None = None,
+    monitor: _TotalsMonitor | None = None,
+) -> resource.struct_rusage:
+    """
+    Reap a child process like `_wait4` without blocking the event loop.
+
+    The watchdog and the stopping rule read the run's output files, so while
+    either is set each poll is made in a worker thread.
+    """
+    delays = _poll_delays()
+    while (rusage := await _poll_child_async(process, watchdog, monitor)) is None:
+        await asyncio.sleep(next(delays))
+    return rusage
+
+
+async def _drive_gdsims_async(
+    script_path: str | Path,
+    working_dir: str | Path,
+    answers: list[str],
+    prompt_timeout: float = 30.0,
+    prompt: re.Pattern[bytes] = GDSIMS_PROMPT,
+    timeout: float | None = None,
+    stall_timeout: float | None = None,
+    log_prefix: str | Path | None = None,
+    set_label: int | None = None,
+    stopping_rule: StoppingRule | None = None,
+    cancel: threading.Event | None = None,
+) -> tuple[subprocess.CompletedProcess, RunUsage]:
+    """
+    Run the GDSiMS menu from an asyncio event loop without raising on failure.
+
+    The asyncio child watcher would reap the process itself and throw away its
+    resource use, so the process is started with `subprocess.Popen`, its pipes
+    are attached to the event loop and it is reaped here with `os.wait4`.
+    """
+    loop = asyncio.get_running_loop()
+    start_time = time.monotonic()
+    menu = _Menu(answers, prompt)
+    with _run_logs(log_prefix) as (stdout_log, stderr_log):
+        process = _start_gdsims(script_path, working_dir)
+        # Leaving the block closes any pipe not already closed by its transport
+        with process:
+            transports: list[asyncio.BaseTransport] = []
+            readers: list[asyncio.Task] = []
+            try:
+                if (
+                    process.stdin is None
+                    or process.stdout is None
+                    or process.stderr is None
+                ):
+                    msg = "Failed to open stdin for the process."
+                    raise RuntimeError(msg)
+
+                stdout = asyncio.StreamReader()
+                stderr = asyncio.StreamReader()
+                for stream, pipe in (
+                    (stdout, process.stdout),
+                    (stderr, process.stderr),
+                ):
+                    read_transport, _ = await loop.connect_read_pipe(
+                        functools.partial(asyncio.StreamReaderProtocol, stream), pipe
+                    )
+                    transports.append(read_transport)
+                stdin_transport, _ = await loop.connect_write_pipe(
+                    asyncio.Protocol, process.stdin
+                )
+                transports.append(stdin_transport)
+                stdout_output = _OutputTail(stdout_log)
+                stderr_output = _OutputTail(stderr_log)
+                readers.append(asyncio.create_task(_read_into(stderr, stderr_output)))
+                watchdog, monitor = _supervisors(
+                    working_dir,
+                    timeout,
+                    stall_timeout,
+                    set_label,
+                    stopping_rule,
+                    cancel,
+                )
+                try:
+                    while not menu.done:
+                        stdin_transport.write(
+                            await _wait_for_prompt_async(
+                                stdout, stdout_output, menu, prompt_timeout
+                            )
+                        )
+                except EOFError as e:
+                    _kill_process_group(process.pid)
+                    await _wait4_async(process)
+                    await _read_into(stdout, stdout_output)
+                    raise _early_exit_error(stdout_output.tail()) from e
+
+                stdin_transport.close()
+                readers.append(asyncio.create_task(_read_into(stdout, stdout_output)))
+                rusage = await _wait4_async(process, watchdog, monitor)
+            finally:
+                # Never leave a simulator running behind, whatever went wrong
+                if process.returncode is None:
+                    _kill_process_group(process.pid)
+                    await _wait4_async(process)
+                # Drain the output of the dead process before closing its pipes
+                await asyncio.gather(*readers, return_exceptions=True)
+                for transport in transports:
+                    transport.close()
+                # Let the transports release their pipes
+                await asyncio.sleep(0)
+
+    return _completed_run(
+        script_path,
+        process,
+        start_time,
+        rusage,
+        monitor,
+        stdout_output.tail(),
+        stderr_output.tail(),
+    )
+
+
+async def drive_gdsims_async(
+    script_path: str | Path,
+    working_dir: str | Path,
+    answers: list[str],
+    prompt_timeout: float = 30.0,
+    prompt: re.Pattern[bytes] = GDSIMS_PROMPT,
+    timeout: float | None = None,
+    stall_timeout: float | None = None,
+    log_prefix: str | Path | None = None,
+) -> str:
+    """
+    Run the interactive GDSiMS menu from an asyncio event loop.
+
+    This behaves like `drive_gdsims`, but waiting on the process does not
+    block the event loop, so many runs can be supervised from a single Python
+    process.
+
+    Args:
+        script_path (str): Path to the GDSiMS script.
+        working_dir (str): Directory where the script should be run.
+        answers (list[str]): Answers to give to the menu prompts, in order.
+        prompt_timeout (float): Seconds to wait for each prompt before the
+            process is killed. Defaults to 30.
+        prompt (re.Pattern): Pattern that marks the end of a prompt in the
+            output. Defaults to `GDSIMS_PROMPT`.
+        timeout (float, optional): Seconds the whole run may take before it is
+            killed. Defaults to None.
+        stall_timeout (float, optional): Seconds the files in `output_files`
+            may go without growing before the run is killed. Defaults to None.
+        log_prefix (str, optional): Path prefix of the `.stdout.log` and
+            `.stderr.log` files to stream the output of the run to. Defaults to
+            None, which keeps only the end of the output.
+
+    Returns:
+        str: Output from the GDSiMS script.
+    """
+    completed, _ = await _drive_gdsims_async(
+        script_path,
+        working_dir,
+        answers,
+        prompt_timeout,
+        prompt,
+        timeout,
+        stall_timeout,
+        log_prefix,
+    )
+    completed.check_returncode()
+    return completed.stdout.decode()
+
+
+async def _simulate_async(attempt: _Attempt) -> subprocess.CompletedProcess:
+    """Carry out one attempt at a custom run like `_simulate`."""
+    with attempt.run_dir() as run_dir:
+        completed, usage = await attempt.drive(_drive_gdsims_async, run_dir)
+        return await asyncio.to_thread(attempt.finish, run_dir, completed, usage)
+
+
+async def run_custom_async(
+    script_path: str | Path,
+    working_dir: str | Path,
+    params_path: str | Path,
+    coords_path: str | Path | None = None,
+    prompt_timeout: float = 30.0,
+    scratch_root: str | Path | None = None,
+    cache_dir: str | Path | None = None,
+    cache_max_bytes: int | None = None,
+    ledger_path: str | Path | None = None,
+    timeout: float | None = None,
+    stall_timeout: float | None = None,
+    retries: int = 0,
+    retry_backoff: float = 10.0,
+    log_dir: str | Path | None = None,
+    stopping_rule: StoppingRule | None = None,
+    cancel: threading.Event | None = None,
+) -> str:
+    """
+    Run the GDSiMS script with custom parameters from an asyncio event loop.
+
+    Args:
+        script_path (str): Path to the GDSiMS script.
+        working_dir (str): Directory where the script should be run.
+        params_path (str): Path to the file containing custom parameters.
+        coords_path (str, optional): Path to the file containing coordinates.
+            Defaults to None.
+        prompt_timeout (float): Seconds to wait for each menu prompt.
+        scratch_root (str, optional): Directory for isolated per-run scratch
+            directories, as in `run_custom`. Defaults to None.
+        cache_dir (str, optional): Directory of the output cache, as in
+            `run_custom`. Defaults to None.
+        cache_max_bytes (int, optional): Size limit of the output cache.
+        ledger_path (str, optional): Resource ledger to append a row for each
+            run to, see `append_ledger`. Defaults to None.
+        timeout (float, optional): Seconds each attempt may take, as in
+            `run_custom`. Defaults to None.
+        stall_timeout (float, optional): Seconds the output files may go
+            without growing, as in `run_custom`. Defaults to None.
+        retries (int): How many more attempts to make after a failed one.
+            Defaults to 0.
+        retry_backoff (float): Seconds to wait before the first retry, doubled
+            for every retry after that. Defaults to 10.
+        log_dir (str, optional): Directory to stream the stdout and stderr of
+            the run to, as `<params name>.stdout.log` and `.stderr.log`.
+            Defaults to None.
+        stopping_rule (StoppingRule, optional): Rule to stop the run early
+            with, e.g. `wild_allele_lost(30)`. The Totals file is checked as it
+            is written and, once the rule holds, the run is killed and marked
+            with `stop_marker_path`. Such runs are not added to the cache.
+            A run with more than one replicate cannot be stopped early, as
+            its later replicates would be cut short, and raises a ValueError.
+            Defaults to None.
+        cancel (threading.Event, optional): Once set, the running attempt is
+            killed, raising a TimeoutError, and no more attempts are made,
+            e.g. when another worker has taken over the run. Defaults to None.
+
+    Returns:
+        str: The end of the output from the GDSiMS script.
+    """
+    with _custom_run(
+        script_path,
+        working_dir,
+        params_path,
+        coords_path,
+        scratch_root,
+        cache_dir,
+        ledger_path,
+        stopping_rule,
+    ) as run:
+        if run.cached is not None:
+            return run.cached
+
+        attempt = _Attempt(
+            script_path,
+            working_dir,
+            params_path,
+            run.answers,
+            prompt_timeout,
+            timeout,
+            stall_timeout,
+            run.scratch_dir,
+            ledger_path,
+            log_dir,
+            stopping_rule,
+            cancel,
+        )
+        for delay in _retry_delays(retries, retry_backoff):
+            try:
+                completed = await _simulate_async(attempt)
+                break
+            except _RETRYABLE:
+                if delay is None or attempt.cancelled:
+                    raise
+                await asyncio.sleep(delay)
+
+        output = completed.stdout.decode()
+        if stopping_rule is None:
+            await asyncio.to_thread(run.store, output, cache_max_bytes)
+        return output
+
+
+async def run_many(
+    jobs: Iterable[RunArgs],
+    max_concurrency: int = 4,
+    prompt_timeout: float = 30.0,
+    callback: Callable[[int, str, float], None] | None = None,
+    scratch_root: str | Path | None = None,
+    cache_dir: str | Path | None = None,
+    cache_max_bytes: int | None = None,
+    ledger_path: str | Path | None = None,
+    timeout: float | None = None,
+    stall_timeout: float | None = None,
+    retries: int = 0,
+    retry_backoff: float = 10.0,
+    log_dir: str | Path | None = None,
+    stopping_rule: StoppingRule | None = None,
+    return_exceptions: bool = False,
+) -> list[str | BaseException]:
+    """
+    Run many GDSiMS simulations concurrently from one Python process.
+
+    At most `max_concurrency` simulator processes are alive at any time and
+    the runs are started in the order of `jobs`.
+
+    Args:
+        jobs (Iterable[tuple]): The `(script_path, working_dir, params_path,
+            coords_path)` arguments for each run, as taken by `run_custom`.
+        max_concurrency (int): Maximum number of simultaneous runs.
+            Defaults to 4.
+        prompt_timeout (float): Seconds to wait for each menu prompt.
+        callback (Callable, optional): Called with the job index, output and
+            wall time in seconds as each run finishes successfully, e.g. to
+            update a progress bar.
+        scratch_root (str, optional): Directory for isolated per-run scratch
+            directories, as in `run_custom`. Defaults to None.
+        cache_dir (str, optional): Directory of the output cache, as in
+            `run_custom`. Defaults to None.
+        cache_max_bytes (int, optional): Size limit of the output cache.
+        ledger_path (str, optional): Resource ledger to append a row for each
+            run to, see `append_ledger`. Defaults to None.
+        timeout (float, optional): Seconds each attempt may take, as in
+            `run_custom`. Defaults to None.
+        stall_timeout (float, optional): Seconds the output files may go
+            without growing, as in `run_custom`. Defaults to None.
+        retries (int): How many more attempts to make after a failed one.
+            Defaults to 0.
+        retry_backoff (float): Seconds to wait before the first retry, doubled
+            for every retry after that. Defaults to 10.
+        log_dir (str, optional): Directory to stream the stdout and stderr of
+            each run to, as in `run_custom`. Defaults to None.
+        stopping_rule (StoppingRule, optional): Rule to stop each run early
+            with, as in `run_custom`. Defaults to None.
+        return_exceptions (bool): If True, a failed run puts its exception in
+            the results and the other runs carry on, see `failure_report`.
+            Defaults to False, which raises the first failure.
+
+    Returns:
+        list[str | BaseException]: Output from each run, in the same order as
+            `jobs`, or the exception of each failed run.
+    """
+    if max_concurrency < 1:
+        msg = "max_concurrency must be a positive integer."
+        raise ValueError(msg)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(index: int, job: RunArgs) -> str:
+        async with semaphore:
+            start_time = time.monotonic()
+            output = await run_custom_async(
+                *job,
+                prompt_timeout=prompt_timeout,
+                scratch_root=scratch_root,
+                cache_dir=cache_dir,
+                cache_max_bytes=cache_max_bytes,
+                ledger_path=ledger_path,
+                timeout=timeout,
+                stall_timeout=stall_timeout,
+                retries=retries,
+                retry_backoff=retry_backoff,
+                log_dir=log_dir,
+                stopping_rule=stopping_rule,
+            )
+            wall_time = time.monotonic() - start_time
+        if callback is not None:
+            callback(index, output, wall_time)
+        return output
+
+    return list(
+        await asyncio.gather(
+            *(run_one(i, job) for i, job in enumerate(jobs)),
+            return_exceptions=return_exceptions,
+        )
+    )
+
+
+def failure_report(
+    jobs: Iterable[RunArgs], results: Iterable[str | BaseException]
+) -> pd.DataFrame:
+    """
+    Summarise the failed runs of a batch, e.g. from `run_many`.
+
+    Args:
+        jobs (Iterable[tuple]): The arguments of each run.
+        results (Iterable): The output or exception of each run, in the same
+            order as `jobs`.
+
+    Returns:
+        pd.DataFrame: One row per failed run with its params file, the type of
+            error and the error message, including the end of the simulator's
+            stderr if it exited with an error.
+    """
+    rows = []
+    for (_, _, params_path, _), result in zip(jobs, results, strict=True):
+        if not isinstance(result, BaseException):
+            continue
+        message = str(result)
+        if isinstance(result, subprocess.CalledProcessError) and result.stderr:
+            stderr = result.stderr.decode(errors="replace").strip()
+            message += f" {stderr[-500:]}"
+        rows.append(
+            {
+                "params": Path(params_path).name,
+                "error": type(result).__name__,
+                "message": message,
+            }
+        )
+    return pd.DataFrame(rows, columns=["params", "error", "message"])
+
+
+# Terms of the cost model, see `run_features`.
+cost_features = ("startup", "simulation", "dispersal", "recording", "coords")
+
+# A small sweep that takes a few minutes with a typical GDSiMS build.
+default_benchmark_grid: dict[str, list[float]] = {
+    "num_pat": [10, 50, 100],
+    "max_t": [100, 400],
+    "rec_interval_local": [1, 10],
+}
+
+
+def _read_params(params_path: str | Path) -> dict[str, float]:
+    """Read all the values of a GDSiMS parameters file by name."""
+    values = read_params_text(params_path).split()
+    if len(values) != len(parameter_order):
+        msg = (
+            f"Parameters file {params_path} has {len(values)} values, "
+            f"expected {len(parameter_order)}."
+        )
+        raise ValueError(msg)
+    return {
+        name: float(value) for name, value in zip(parameter_order, values, strict=True)
+    }
+
+
+def _count_coords(coords_path: str | Path | None) -> int:
+    """Number of coordinates in a coordinates file, below its header line."""
+    if coords_path is None:
+        return 0
+    lines = read_coords_text(coords_path).splitlines()
+    return max(sum(1 for line in lines if line.strip()) - 1, 0)
+
+
+def run_features(
+    params_path: str | Path, coords_path: str | Path | None = None
+) -> dict[str, float]:
+    """
+    Work out the terms of the cost model for a run.
+
+    Startup is paid once per process, the simulation and dispersal terms once
+    per patch or pair of patches on each simulated day, the recording term
+    once per LocalData row and the coords term once per coordinate read.
+
+    Args:
+        params_path (str): Path to the GDSiMS parameters file.
+        coords_path (str, optional): Path to the coordinates file. Defaults to
+            None.
+
+    Returns:
+        dict[str, float]: The value of each term of `cost_features`.
+    """
+    values = _read_params(params_path)
+    days = values["num_runs"] * values["max_t"]
+    num_pat = values["num_pat"]
+    return {
+        "startup": 1.0,
+        "simulation": days * num_pat,
+        "dispersal": days * num_pat**2,
+        "recording": days * num_pat / values["rec_interval_local"],
+        "coords": float(_count_coords(coords_path)),
+    }
+
+
+@dataclass
+class CostModel:
+    """
+    A linear model of the wall time of a GDSiMS run, fitted by `benchmark`.
+
+    The predicted wall time in seconds is the sum of each term of
+    `cost_features` times its coefficient.
+    """
+
+    coefficients: dict[str, float]
+    script_hash: str | None = None
+
+    @classmethod
+    def fit(cls, timings: pd.DataFrame, script_hash: str | None = None) -> CostModel:
+        """
+        Fit the coefficients to timed runs with non-negative least squares.
+
+        Args:
+            timings (pd.DataFrame): A column for each term of `cost_features`
+                and a `wall_time` column, e.g. from `benchmark`.
+            script_hash (str, optional): Hash of the GDSiMS build that was
+                timed. Defaults to None.
+
+        Returns:
+            CostModel: The fitted model.
+        """
+        features = timings[list(cost_features)].to_numpy(dtype=float)
+        # Scale the terms so they are weighted evenly in the fit
+        scale = np.abs(features).max(axis=0)
+        scale[scale == 0] = 1.0
+        coefficients, _ = nnls(features / scale, timings["wall_time"].to_numpy(float))
+        return cls(
+            {
+                name: float(value)
+                for name, value in zip(cost_features, coefficients / scale, strict=True)
+            },
+            script_hash,
+        )
+
+    def predict(
+        self, params_path: str | Path, coords_path: str | Path | None = None
+    ) -> float:
+        """
+        Predict the wall time of a run in seconds.
+
+        Args:
+            params_path (str): Path to the GDSiMS parameters file.
+            coords_path (str, optional): Path to the coordinates file.
+                Defaults to None.
+
+        Returns:
+            float: The predicted wall time in seconds.
+        """
+        features = run_features(params_path, coords_path)
+        return sum(
+            self.coefficients.get(name, 0.0) * value for name, value in features.items()
+        )
+
+    def save(self, model_path: str | Path) -> None:
+        """Save the model as JSON."""
+        Path(model_path).write_text(
+            json.dumps(
+                {"coefficients": self.coefficients, "script_hash": self.script_hash},
+                indent=2,
+            )
+        )
+
+    @classmethod
+    def load(cls, model_path: str | Path) -> CostModel:
+        """Load a model saved by `save`."""
+        data = json.loads(Path(model_path).read_text())
+        return cls(data["coefficients"], data.get("script_hash"))
+
+
+def _write_benchmark_coords(coords_path: Path, num_coords: int, seed: int) -> None:
+    """Write `num_coords` random coordinates, the first of them a release site."""
+    rng = np.random.default_rng(seed)
+    coords = pd.DataFrame(rng.random((num_coords, 2)), columns=["x", "y"])
+    coords["if"] = "n"
+    coords.loc[0, "if"] = "y"
+    coords.to_csv(coords_path, sep="\t", index=False)
+
+
+def benchmark(
+    script_path: str | Path,
+    params_path: str | Path,
+    work_dir: str | Path,
+    grid: dict[str, list[float]] | None = None,
+    repeats: int = 1,
+    prompt_timeout: float = 30.0,
+    timeout: float | None = None,
+    model_path: str | Path | None = None,
+) -> tuple[pd.DataFrame, CostModel]:
+    """
+    Time GDSiMS over a grid of run sizes and fit a cost model to the timings.
+
+    Every combination of the values in `grid` is run `repeats` times, with
+    the other parameters taken from `params_path`. The grid can vary any
+    parameter, as well as `num_coords`, the number of random coordinates to
+    run with, which also sets `num_pat`. Each run happens in its own
+    temporary directory under `work_dir`, which is removed afterwards.
+
+    Args:
+        script_path (str): Path to the GDSiMS script.
+        params_path (str): Parameters file to base the runs on.
+        work_dir (str): Directory for the runs.
+        grid (dict[str, list[float]], optional): Values to sweep for each
+            parameter. Defaults to `default_benchmark_grid`.
+        repeats (int): Number of runs of each combination. Defaults to 1.
+        prompt_timeout (float): Seconds to wait for each menu prompt.
+        timeout (float, optional): Seconds each run may take. Defaults to None.
+        model_path (str, optional): Where to save the fitted model as JSON.
+            Defaults to None.
+
+    Returns:
+        timings (pd.DataFrame): One row per run with the swept values, the
+            terms of the cost model and the measured resource use.
+        model (CostModel): The cost model fitted to the timings.
+    """
+    if grid is None:
+        grid = default_benchmark_grid
+    base_values = _read_params(params_path)
+    unknown = sorted(set(grid) - set(parameter_order) - {"num_coords"})
+    if unknown:
+        msg = f"Unknown parameters in benchmark grid: {', '.join(unknown)}"
+        raise ValueError(msg)
+
+    rows = []
+    combinations = list(itertools.product(*grid.values()))
+    for index, combination in enumerate(combinations * repeats):
+        swept = dict(zip(grid, combination, strict=True))
+        values = base_values | swept
+        with scratch_dir(work_dir) as run_dir:
+            coords_path = None
+            if "num_coords" in swept:
+                num_coords = int(swept["num_coords"])
+                values["num_pat"] = num_coords
+                coords_path = run_dir / "coords.csv"
+                _write_benchmark_coords(coords_path, num_coords, index)
+            values["set_label"] = index
+            run_params_path = run_dir / "params.txt"
+            run_params_path.write_text(
+                params_text(values[name] for name in parameter_order)
+            )
+
+            completed, usage = _drive_gdsims(
+                script_path,
+                run_dir,
+                _custom_answers(run_params_path, coords_path),
+                prompt_timeout,
+                timeout=timeout,
+            )
+            completed.check_returncode()
+            features = run_features(run_params_path, coords_path)
+
+        rows.append(
+            swept
+            | features
+            | {
+                "wall_time": usage.wall_time,
+                "user_time": usage.user_time,
+                "system_time": usage.system_time,
+                "max_rss_kb": usage.max_rss_kb,
+            }
+        )
 
-    return run_custom_with_coords(script_path, working_dir, params_path, coords_path)
+    timings = pd.DataFrame(rows)
+    model = CostModel.fit(timings, file_hash(script_path))
+    if model_path is not None:
+        model.save(model_path)
+    return timings, model
@@ -1,3 +1,8 @@
+from __future__ import annotations
+
+import glob
+import os
+from collections.abc import Callable
 from pathlib import Path
 
 import numpy as np
@@ -18,50 +23,148 @@ def cast_back_data(flattened_data: np.ndarray) -> pd.DataFrame:
     return pd.DataFrame(flattened_data.reshape(-1, len(columns)), columns=columns)
 
 
-def read_total_data(file_path: str | Path) -> pd.DataFrame:
+def _sidecar_paths(file_path: Path, kind: str, num_parts: int) -> list[Path]:
+    """The sidecar files of an output file as it is now, one per parsed array."""
+    stat = file_path.stat()
+    key = f"{stat.st_size}-{stat.st_mtime_ns}"
+    return [
+        file_path.with_name(f".{file_path.name}.{key}.{kind}{part}.npy")
+        for part in range(num_parts)
+    ]
+
+
+def cached_arrays(
+    file_path: str | Path,
+    kind: str,
+    parse: Callable[[Path], tuple[np.ndarray, ...]],
+    num_parts: int,
+    cache: bool = False,
+) -> tuple[np.ndarray, ...]:
     """
-    Reads total mosquito population data from a text file into a DataFrame.
+    Parse an output file once and load the result from `.npy` sidecars after.
+
+    The sidecars are hidden files next to the output file whose names hold its
+    size and modification time, so they are passed over as soon as it changes
+    and replaced the next time it is parsed. They are opened as read-only
+    memory maps, so loading them again is almost free and processes reading
+    the same file share its pages. If the sidecars cannot be written, e.g. on
+    read-only storage, the file is parsed every time.
 
     Args:
-        file_path (str | Path): Path to the text file containing the total data.
+        file_path (str | Path): Path to the output file.
+        kind (str): Name of what `parse` produces, to keep the sidecars of
+            different parsers of the same file apart.
+        parse (Callable): Parses the output file into `num_parts` arrays.
+        num_parts (int): Number of arrays that `parse` returns.
+        cache (bool): Whether to use the sidecars. Defaults to False, which
+            parses the file every time and writes nothing next to it.
 
     Returns:
-        pd.DataFrame: DataFrame containing the total mosquito population data.
-            The columns are expected to be ["WW", "WD", "DD", "WR", "RR", "DR"]
-            The index represents the time points (days).
+        tuple[np.ndarray, ...]: The arrays from `parse`, read-only if they
+            came from the sidecars.
     """
     file_path = Path(file_path)
-    if not file_path.exists():
-        msg = f"File {file_path} does not exist."
-        raise FileNotFoundError(msg)
+    if not cache:
+        return parse(file_path)
+
+    sidecars = _sidecar_paths(file_path, kind, num_parts)
+    if all(sidecar.is_file() for sidecar in sidecars):
+        try:
+            return tuple(np.load(sidecar, mmap_mode="r") for sidecar in sidecars)
+        except (OSError, ValueError):
+            pass  # Being replaced by another process, so parse it instead
 
+    arrays = parse(file_path)
+    try:
+        pattern = f".{glob.escape(file_path.name)}.*.{kind}*.npy"
+        for stale in file_path.parent.glob(pattern):
+            if stale not in sidecars:
+                stale.unlink(missing_ok=True)
+        for sidecar, array in zip(sidecars, arrays, strict=True):
+            tmp_path = sidecar.with_name(f"{sidecar.name}.{os.getpid()}.tmp")
+            with tmp_path.open("wb") as file:
+                np.save(file, np.ascontiguousarray(array))
+            os.replace(tmp_path, sidecar)
+    except OSError:
+        return arrays
+    return tuple(np.load(sidecar, mmap_mode="r") for sidecar in sidecars)
+
+
+def _read_output_text(file_path: Path) -> pd.DataFrame:
+    """Read the rows of a Totals or LocalData file."""
     try:
-        df = pd.read_csv(file_path, sep="\t", header=1)
+        return pd.read_csv(file_path, sep="\t", header=1)
     except Exception as e:
         msg = f"Error reading file {file_path}: {e}"
         raise ValueError(msg) from e
 
-    expected_columns = ["Day", "WW", "WD", "DD", "WR", "RR", "DR"]
+
+def _check_columns(df: pd.DataFrame, expected_columns: list[str]) -> None:
+    """Raise a ValueError if any of the expected columns are missing."""
     if not all(col in df.columns for col in expected_columns):
         missing_cols = [col for col in expected_columns if col not in df.columns]
         msg = f"Missing expected columns: {missing_cols}"
         raise ValueError(msg)
 
-    df.set_index("Day", inplace=True)
-    return df[expected_columns[1:]]  # Return only mozzie type columns
+
+def _parse_total_data(file_path: Path) -> tuple[np.ndarray, np.ndarray]:
+    """The days and mozzie type counts of a Totals file."""
+    df = _read_output_text(file_path)
+    expected_columns = ["Day", "WW", "WD", "DD", "WR", "RR", "DR"]
+    _check_columns(df, expected_columns)
+    return df["Day"].to_numpy(), df[expected_columns[1:]].to_numpy()
+
+
+def read_total_data(file_path: str | Path, cache: bool = False) -> pd.DataFrame:
+    """
+    Reads total mosquito population data from a text file into a DataFrame.
+
+    Args:
+        file_path (str | Path): Path to the text file containing the total data.
+        cache (bool): Whether to keep the parsed data in `.npy` sidecars, see
+            `cached_arrays`, which makes the data read-only. Defaults to False.
+
+    Returns:
+        pd.DataFrame: DataFrame containing the total mosquito population data.
+            The columns are expected to be ["WW", "WD", "DD", "WR", "RR", "DR"]
+            The index represents the time points (days).
+    """
+    file_path = Path(file_path)
+    if not file_path.exists():
+        msg = f"File {file_path} does not exist."
+        raise FileNotFoundError(msg)
+
+    days, values = cached_arrays(file_path, "totals", _parse_total_data, 2, cache)
+    return pd.DataFrame(
+        values,
+        index=pd.Index(days, name="Day"),
+        columns=["WW", "WD", "DD", "WR", "RR", "DR"],
+    )
 
 
-def read_local_data(file_path: str | Path) -> tuple[np.ndarray, np.ndarray]:
+def _parse_local_data(file_path: Path) -> tuple[np.ndarray, np.ndarray]:
+    """The 3D array and time points of a LocalData file."""
+    df = _read_output_text(file_path)
+    _check_columns(df, ["Day", "Site", "WW", "WD", "DD", "WR", "RR", "DR"])
+    return local_data_to_array(df)
+
+
+def read_local_data(
+    file_path: str | Path, cache: bool = False
+) -> tuple[np.ndarray, np.ndarray]:
     """
     Reads local mosquito population data from a text file and organizes it into
     a 3D numpy array.
 
     Args:
         file_path (str | Path): Path to the text file containing the local data.
+        cache (bool): Whether to keep the parsed data in `.npy` sidecars, see
+            `cached_arrays`, which returns read-only arrays. Defaults to False.
 
     Returns:
         data_3d (np.ndarray): 3D array with shape [time, location, mozzie_type]
-            where mozzie_type corresponds to ["WW", "WD", "DD", "WR", "RR", "DR"]
+            where mozzie_type corresponds to ["WW", "WD", "DD", "WR", "RR", "DR"].
+            Whole number counts are stored as int32.
         timestamps (np.ndarray): 1D array of unique time points
     """
     file_path = Path(file_path)
@@ -69,46 +172,60 @@ def read_local_data(file_path: str | Path) -> tuple[np.ndarray, np.ndarray]:
         msg = f"File {file_path} does not exist."
         raise FileNotFoundError(msg)
 
-    # Read the data, skipping the first header line
-    try:
-        df = pd.read_csv(file_path, sep="\t", header=1)
-    except Exception as e:
-        msg = f"Error reading file {file_path}: {e}"
-        raise ValueError(msg) from e
+    data_3d, timestamps = cached_arrays(file_path, "local", _parse_local_data, 2, cache)
+    return data_3d, timestamps
 
-    # Validate expected columns
-    expected_columns = ["Day", "Site", "WW", "WD", "DD", "WR", "RR", "DR"]
-    if not all(col in df.columns for col in expected_columns):
-        missing_cols = [col for col in expected_columns if col not in df.columns]
-        msg = f"Missing expected columns: {missing_cols}"
-        raise ValueError(msg)
 
-    # Get unique timestamps and sites
-    timestamps = np.sort(df["Day"].unique())
-    sites = np.sort(df["Site"].unique())
+def _count_dtype(values: np.ndarray) -> np.ndarray:
+    """Store whole number counts as int32 if they fit, otherwise leave them be."""
+    if not np.issubdtype(values.dtype, np.integer) or not len(values):
+        return values
+    limits = np.iinfo(np.int32)
+    if values.min() < limits.min or values.max() > limits.max:
+        return values
+    return values.astype(np.int32)
+
+
+def local_data_to_array(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reshapes the rows of a LocalData file into a 3D numpy array.
+
+    Each row is placed by the index of its day and site in one pass, and the
+    number of rows for every (day, site) pair is counted at once to find any
+    that are missing or repeated.
 
-    # Initialize 3D array: [time, location, mozzie_type]
-    data_3d = np.zeros((len(timestamps), len(sites), 6))
+    Args:
+        df (pd.DataFrame): The rows of a LocalData file, with "Day", "Site" and
+            the mozzie type columns.
 
-    # Fill the 3D array
+    Returns:
+        data_3d (np.ndarray): 3D array with shape [time, location, mozzie_type].
+            Whole number counts are stored as int32.
+        timestamps (np.ndarray): 1D array of unique time points
+    """
     mozzie_columns = ["WW", "WD", "DD", "WR", "RR", "DR"]
-    for time_idx, timestamp in enumerate(timestamps):
-        for site_idx, site in enumerate(sites):
-            # Get data for this time and site
-            mask = (df["Day"] == timestamp) & (df["Site"] == site)
-            site_data = df[mask]
-
-            if len(site_data) == 0:
-                msg = f"No data found for Day {timestamp}, Site {site}"
-                raise ValueError(msg)
-            if len(site_data) > 1:
-                msg = f"Multiple entries found for Day {timestamp}, Site {site}"
-                raise ValueError(msg)
-
-            # Extract mozzie type data
-            data_3d[time_idx, site_idx, :] = site_data[mozzie_columns].values[0]
+    timestamps, time_idx = np.unique(df["Day"].to_numpy(), return_inverse=True)
+    sites, site_idx = np.unique(df["Site"].to_numpy(), return_inverse=True)
+    cell_idx = time_idx * len(sites) + site_idx
+
+    counts = np.bincount(cell_idx, minlength=len(timestamps) * len(sites))
+    if (counts != 1).any():
+        cell = int(np.flatnonzero(counts != 1)[0])
+        timestamp, site = timestamps[cell // len(sites)], sites[cell % len(sites)]
+        if counts[cell] == 0:
+            msg = f"No data found for Day {timestamp}, Site {site}"
+            raise ValueError(msg)
+        msg = f"Multiple entries found for Day {timestamp}, Site {site}"
+        raise ValueError(msg)
 
-    return data_3d, timestamps
+    values = _count_dtype(df[mozzie_columns].to_numpy())
+    if (np.diff(cell_idx) == 1).all():
+        # Already in order, as GDSiMS writes it
+        data = values
+    else:
+        data = np.empty_like(values)
+        data[cell_idx] = values
+    return data.reshape(len(timestamps), len(sites), len(mozzie_columns)), timestamps
 
 
 def aggregate_mosquito_data(
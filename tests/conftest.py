@@ -1,5 +1,97 @@
+import os
+import sys
+from pathlib import Path
+
 import pytest
 
+FAKE_GDSIMS = r"""
+# MODE is defined above this script, see make_fake_gdsims
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+answers = []
+
+
+def ask(prompt):
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    line = sys.stdin.readline()
+    if not line:
+        sys.exit(1)
+    answers.append(line.strip())
+    return answers[-1]
+
+
+print("GDSiMS: Gene Drive Simulator of Mosquito Spread")
+choice = ask("Enter the parameter set:")
+if choice == "hang":
+    time.sleep(60)
+label = 1
+num_runs = 1
+if choice == "100":
+    params_path = ask("Enter the parameters filename:")
+    params = Path(params_path).read_text().split()
+    num_runs, label = int(float(params[0])), int(float(params[-1]))
+ask("Continue? (y/n)")
+Path("answers.txt").write_text("\n".join(answers))
+if MODE == "fail":
+    print("Error: num_runs must be positive", file=sys.stderr)
+    sys.exit(3)
+if MODE == "flaky":
+    attempted = Path(f"{params_path}.attempted")
+    if not attempted.exists():
+        attempted.touch()
+        # Leave a partial output behind
+        Path("output_files").mkdir(exist_ok=True)
+        Path(f"output_files/LocalData{label}run2.txt").write_text("Male")
+        sys.exit(4)
+
+for run in range(2, num_runs + 1):
+    # Verbose output, about 200 kB on each stream per extra run
+    for step in range(2000):
+        print(f"run {run} step {step} " + "." * 80)
+        print(f"warning {run} {step} " + "." * 80, file=sys.stderr)
+
+out_dir = Path("output_files")
+out_dir.mkdir(exist_ok=True)
+if MODE == "stop_early":
+    # Lose the wild type allele on day 5, then carry on slowly
+    with (out_dir / f"LocalData{label}run1.txt").open("w") as f:
+        f.write("Male populations of each genotype at each site\n")
+        f.write("Day\tSite\tWW\tWD\tDD\tWR\tRR\tDR\n")
+        for day in range(0, 6, 5):
+            for site in (1, 2):
+                f.write(f"{day}\t{site}\t{5 - day}\t0\t50\t0\t0\t0\n")
+        f.write("10\t1\t0\t0\t50\t0\t0\t0\n10\t2\t0\t0\t5")
+    with (out_dir / f"Totals{label}run1.txt").open("w") as f:
+        f.write("Total males of each genotype\nDay\tWW\tWD\tDD\tWR\tRR\tDR\n")
+        for day in range(200):
+            f.write(f"{day}\t{max(5 - day, 0)}\t0\t100\t0\t0\t0\n")
+            f.flush()
+            time.sleep(0.05)
+if MODE == "hang":
+    # Hang part way through the run, with a child process of our own
+    (out_dir / f"Totals{label}run1.txt").write_text("Total males\n")
+    child = subprocess.Popen(["sleep", "60"])
+    Path(f"{params_path}.child").write_text(str(child.pid))
+    time.sleep(60)
+for run in range(1, num_runs + 1):
+    # Each replicate has (run - 1) more wild type males than the first
+    with (out_dir / f"Totals{label}run{run}.txt").open("w") as f:
+        f.write("Total males of each genotype\nDay\tWW\tWD\tDD\tWR\tRR\tDR\n")
+        for day in range(11):
+            f.write(f"{day}\t{100 - day + run - 1}\t{day}\t0\t0\t0\t0\n")
+    with (out_dir / f"LocalData{label}run{run}.txt").open("w") as f:
+        f.write("Male populations of each genotype at each site\n")
+        f.write("Day\tSite\tWW\tWD\tDD\tWR\tRR\tDR\n")
+        for day in range(0, 11, 5):
+            for site in (1, 2):
+                f.write(f"{day}\t{site}\t{50 - day + run - 1}\t{day}\t0\t0\t0\t0\n")
+print("Program run time: 0.0 s")
+"""
+
 
 @pytest.fixture()
 def working_dir(tmp_path_factory) -> pytest.TempPathFactory:
@@ -10,3 +102,66 @@ def working_dir(tmp_path_factory) -> pytest.TempPathFactory:
         pytest.TempPathFactory: A temporary path factory for creating directories.
     """
     return tmp_path_factory.mktemp("output")
+
+
+def make_fake_gdsims(directory: Path, mode: str = "ok") -> Path:
+    """
+    Write a small executable that mimics the GDSiMS menu.
+
+    It asks for the parameter set, the parameters file if the custom set is
+    chosen and a confirmation, then writes small Totals and LocalData files
+    for each of the `num_runs` replicates in the parameters file. More than
+    one replicate also makes it print a lot to stdout and stderr.
+
+    Args:
+        directory (Path): Directory to write the executable in.
+        mode (str): How the run goes once the menu has been answered:
+            - "ok": it writes its outputs and exits normally.
+            - "fail": it exits with status 3 without writing any outputs.
+            - "hang": it hangs part way through, with a child process whose
+              pid is written to `<params file>.child`.
+            - "flaky": it exits with status 4 and a partial output file the
+              first time a parameters file is used, and works after that.
+            - "stop_early": it loses the wild type allele on day 5, then
+              writes one Totals row every 0.05 s.
+
+    Returns:
+        Path: Path to the executable script.
+    """
+    if mode not in ("ok", "fail", "hang", "flaky", "stop_early"):
+        msg = f"Unknown fake GDSiMS mode {mode!r}."
+        raise ValueError(msg)
+    script_path = directory / "gdsimsapp"
+    script_path.write_text(f"#!{sys.executable}\nMODE = {mode!r}\n{FAKE_GDSIMS}")
+    os.chmod(script_path, 0o755)
+    return script_path
+
+
+@pytest.fixture()
+def fake_gdsims(tmp_path_factory) -> Path:
+    """Fixture for a fake GDSiMS that runs normally, see `make_fake_gdsims`."""
+    return make_fake_gdsims(tmp_path_factory.mktemp("fake_gdsims"))
+
+
+@pytest.fixture()
+def failing_gdsims(tmp_path_factory) -> Path:
+    """Fixture for a fake GDSiMS that exits with status 3."""
+    return make_fake_gdsims(tmp_path_factory.mktemp("fake_gdsims"), "fail")
+
+
+@pytest.fixture()
+def hanging_gdsims(tmp_path_factory) -> Path:
+    """Fixture for a fake GDSiMS that hangs part way through the run."""
+    return make_fake_gdsims(tmp_path_factory.mktemp("fake_gdsims"), "hang")
+
+
+@pytest.fixture()
+def flaky_gdsims(tmp_path_factory) -> Path:
+    """Fixture for a fake GDSiMS that fails the first time for each params file."""
+    return make_fake_gdsims(tmp_path_factory.mktemp("fake_gdsims"), "flaky")
+
+
+@pytest.fixture()
+def stopping_gdsims(tmp_path_factory) -> Path:
+    """Fixture for a fake GDSiMS that loses the wild type allele on day 5."""
+    return make_fake_gdsims(tmp_path_factory.mktemp("fake_gdsims"), "stop_early")
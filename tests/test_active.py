@@ -0,0 +1,146 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from mozzie import active
+from mozzie.construct import build_params_rows
+from mozzie.data_prep import load_samples_values
+from mozzie.generate import (
+    load_params_table,
+    parameter_order,
+    params_table_name,
+    save_params_table,
+)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+TEST_DATA_DIR = REPO_ROOT / "tests" / "test_data"
+
+TO_SAMPLE = {
+    "mu_j": {"type": "float", "min": 0.0, "max": 1.0},
+    "mu_a": {"type": "float", "min": 0.0, "max": 1.0},
+}
+
+
+def train_gp(x: np.ndarray, y: np.ndarray) -> tuple:
+    """A small Gaussian process with a fixed RBF kernel."""
+    kernel = np.exp(-((x[:, None] - x[None]) ** 2).sum(-1) / 0.1)
+    inverse = np.linalg.inv(kernel + 1e-6 * np.eye(len(x)))
+    return x, inverse, inverse @ y
+
+
+def predict_gp(model: tuple, x_new: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    x, inverse, weights = model
+    cross = np.exp(-((x_new[:, None] - x[None]) ** 2).sum(-1) / 0.1)
+    variance = 1 - np.einsum("ij,jk,ik->i", cross, inverse, cross)
+    return cross @ weights, variance[:, None]
+
+
+def ingest(working_dir: Path, config_dict: dict) -> tuple[np.ndarray, np.ndarray]:
+    """Outputs made up from the parameters, as the fake GDSiMS ignores them."""
+    values = load_samples_values(working_dir, config_dict)
+    x = np.array([list(v.values()) for v in values.values()])
+    return x, np.sin(6 * x[:, :1]) + x[:, 1:]
+
+
+@pytest.fixture()
+def campaign_config(tmp_path: Path) -> dict:
+    """A campaign with 4 training runs labelled 0-3 and 20 test runs after them."""
+    base = (TEST_DATA_DIR / "test_params.txt").read_text().split()
+    set_values = {
+        name: float(value) for name, value in zip(parameter_order, base, strict=True)
+    }
+    set_values["num_runs"] = 1
+    (tmp_path / "params").mkdir()
+    rng = np.random.default_rng(0)
+    rows = build_params_rows(set_values, TO_SAMPLE, rng.random((24, 2)), 0)
+    save_params_table(tmp_path / "params" / params_table_name, rows)
+    return {"set_values": set_values, "to_sample": TO_SAMPLE}
+
+
+def test_select_diverse():
+    unit = np.array([[0.0, 0.0], [0.01, 0.0], [0.02, 0.0], [1.0, 1.0]])
+    scores = np.array([4.0, 3.0, 2.0, 1.0])
+    np.testing.assert_array_equal(active.select_diverse(unit, scores, 2), [0, 3])
+    # Too few far apart candidates are filled in by score
+    np.testing.assert_array_equal(active.select_diverse(unit, scores, 3), [0, 3, 1])
+
+
+def test_score_candidates_in_batches():
+    model = train_gp(np.array([[0.5, 0.5]]), np.array([[1.0]]))
+    candidates = np.random.default_rng(1).random((10, 2))
+    scores = active.score_candidates(model, predict_gp, candidates, batch_size=3)
+    np.testing.assert_allclose(scores, predict_gp(model, candidates)[1][:, 0])
+
+
+def test_active_learning(fake_gdsims: Path, tmp_path: Path, campaign_config: dict):
+    history = active.active_learning(
+        campaign_config,
+        tmp_path,
+        fake_gdsims,
+        tmp_path,
+        train_gp,
+        predict_gp,
+        train_labels=[0, 1, 2, 3],
+        num_points=4,
+        num_rounds=3,
+        test_labels=list(range(4, 24)),
+        num_candidates=256,
+        ingest=ingest,
+        seed=0,
+    )
+    assert list(history["num_train"]) == [4, 8, 12, 16]
+    assert history["r2"].iloc[-1] > history["r2"].iloc[0]
+    assert history["labels_added"].iloc[0] == [24, 25, 26, 27]
+    assert history["labels_failed"].iloc[0] == []
+
+    table = load_params_table(tmp_path / "params" / params_table_name)
+    np.testing.assert_array_equal(table[:, -1], np.arange(36))
+    assert (tmp_path / "output_files" / "Totals35run1.txt").exists()
+    assert not list((tmp_path / "params").glob("*.txt"))
+
+
+def test_active_learning_stops_at_target(
+    fake_gdsims: Path, tmp_path: Path, campaign_config: dict
+):
+    history = active.active_learning(
+        campaign_config,
+        tmp_path,
+        fake_gdsims,
+        tmp_path,
+        train_gp,
+        predict_gp,
+        train_labels=[0, 1, 2, 3],
+        num_points=4,
+        num_rounds=3,
+        test_labels=list(range(4, 24)),
+        target_r2=-np.inf,
+        ingest=ingest,
+    )
+    assert len(history) == 1
+    assert len(load_params_table(tmp_path / "params" / params_table_name)) == 24
+
+
+def test_active_learning_failed_runs(
+    failing_gdsims: Path, tmp_path: Path, campaign_config: dict
+):
+    history = active.active_learning(
+        campaign_config,
+        tmp_path,
+        failing_gdsims,
+        tmp_path,
+        train_gp,
+        predict_gp,
+        train_labels=[0, 1, 2, 3],
+        num_points=4,
+        num_rounds=2,
+        num_candidates=256,
+        ingest=ingest,
+        seed=0,
+    )
+    # Failed runs are not trained on, but stay in the table to be run again
+    assert list(history["num_train"]) == [4, 4, 4]
+    assert history["labels_added"].iloc[0] == []
+    assert history["labels_failed"].iloc[0] == [24, 25, 26, 27]
+    assert history["labels_failed"].iloc[1] == [28, 29, 30, 31]
+    assert len(load_params_table(tmp_path / "params" / params_table_name)) == 32
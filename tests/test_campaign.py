@@ -0,0 +1,377 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from mozzie import campaign
+from mozzie.generate import (
+    CostModel,
+    RunArgs,
+    is_cached,
+    parameter_order,
+    params_table_name,
+    run_custom,
+    save_params_table,
+    stop_marker_path,
+)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+TEST_DATA_DIR = REPO_ROOT / "tests" / "test_data"
+
+
+def write_params(
+    params_path: Path,
+    num_runs: int = 1,
+    max_t: int = 100,
+    num_pat: int = 50,
+    label: int = 1001,
+):
+    """Write a full params file based on the test one with a new run size."""
+    values = (TEST_DATA_DIR / "test_params.txt").read_text().split()
+    values[parameter_order.index("num_runs")] = str(num_runs)
+    values[parameter_order.index("max_t")] = str(max_t)
+    values[parameter_order.index("num_pat")] = str(num_pat)
+    values[parameter_order.index("set_label")] = str(label)
+    params_path.write_text("\n".join(values) + "\n")
+
+
+def make_campaign(root: Path, num_runs: int) -> Path:
+    """Create a campaign directory with `num_runs` small params files."""
+    working_dir = root / "campaign"
+    (working_dir / "params").mkdir(parents=True)
+    for label in range(num_runs):
+        write_params(working_dir / "params" / f"params_{label}.txt", label=label)
+    return working_dir
+
+
+def claim(queue: campaign.JobQueue, worker: str) -> tuple[int, RunArgs]:
+    """Claim the next run from the queue, which must not be empty."""
+    claimed = queue.claim(worker)
+    assert claimed is not None
+    return claimed
+
+
+class TestFindJobs:
+    def test_no_coords(self, tmp_path: Path):
+        working_dir = make_campaign(tmp_path, 3)
+        jobs = campaign.find_jobs({}, tmp_path, "gdsimsapp", working_dir)
+        assert [Path(job[2]).name for job in jobs] == [
+            "params_0.txt",
+            "params_1.txt",
+            "params_2.txt",
+        ]
+        assert all(job[3] is None for job in jobs)
+
+    def test_coords_directory(self, tmp_path: Path):
+        working_dir = make_campaign(tmp_path, 2)
+        (working_dir / "coords").mkdir()
+        (working_dir / "coords" / "coords_0.csv").write_text("x\ty\tif\n")
+        config = {"coords_set": {"coords_path": "campaign/coords"}}
+
+        with pytest.raises(FileNotFoundError, match=r"coords_1\.csv"):
+            campaign.find_jobs(config, tmp_path, "gdsimsapp", working_dir)
+
+        (working_dir / "coords" / "coords_1.csv").write_text("x\ty\tif\n")
+        jobs = campaign.find_jobs(config, tmp_path, "gdsimsapp", working_dir)
+        names = []
+        for job in jobs:
+            assert job[3] is not None
+            names.append(Path(job[3]).name)
+        assert names == ["coords_0.csv", "coords_1.csv"]
+
+    def test_params_table(self, fake_gdsims: Path, tmp_path: Path):
+        working_dir = make_campaign(tmp_path, 0)
+        base = np.array((TEST_DATA_DIR / "test_params.txt").read_text().split(), float)
+        values = np.tile(base, (3, 1))
+        values[:, parameter_order.index("set_label")] = [7, 5, 6]
+        values[:, 0] = 1
+        save_params_table(working_dir / "params" / params_table_name, values)
+
+        jobs = campaign.find_jobs({}, tmp_path, fake_gdsims, working_dir)
+        assert [Path(job[2]).name for job in jobs] == [
+            "params_5.txt",
+            "params_6.txt",
+            "params_7.txt",
+        ]
+
+        # The params file is only there while the run is going
+        manifest_path = working_dir / "manifest.jsonl"
+        run_custom(*jobs[0])
+        campaign.record_run(manifest_path, jobs[0], 0)
+        assert not Path(jobs[0][2]).exists()
+        assert (working_dir / "output_files" / "Totals5run1.txt").exists()
+        assert campaign.pending_jobs(jobs, manifest_path) == jobs[1:]
+
+
+class TestManifest:
+    def test_resume_skips_complete_runs(self, fake_gdsims: Path, tmp_path: Path):
+        working_dir = make_campaign(tmp_path, 3)
+        manifest_path = working_dir / "manifest.jsonl"
+        jobs = campaign.find_jobs({}, tmp_path, fake_gdsims, working_dir)
+
+        assert campaign.pending_jobs(jobs, manifest_path) == jobs
+
+        for job in jobs[:2]:
+            run_custom(*job)
+            campaign.record_run(manifest_path, job, 0)
+
+        entry = campaign.load_manifest(manifest_path)["params_0.txt"]
+        assert entry["set_label"] == 0
+        assert entry["output_rows"] == {"LocalData0run1.txt": 6, "Totals0run1.txt": 11}
+        assert campaign.pending_jobs(jobs, manifest_path) == jobs[2:]
+
+    def test_partial_and_changed_runs_are_requeued(
+        self, fake_gdsims: Path, tmp_path: Path
+    ):
+        working_dir = make_campaign(tmp_path, 3)
+        manifest_path = working_dir / "manifest.jsonl"
+        jobs = campaign.find_jobs({}, tmp_path, fake_gdsims, working_dir)
+        for job in jobs:
+            run_custom(*job)
+            campaign.record_run(manifest_path, job, 0)
+        assert campaign.pending_jobs(jobs, manifest_path) == []
+
+        # Truncate an output file, change a params file and record a failure
+        totals_path = working_dir / "output_files" / "Totals0run1.txt"
+        totals_path.write_text("".join(totals_path.read_text().splitlines(True)[:5]))
+        write_params(Path(jobs[1][2]), num_runs=2, label=1)
+        campaign.record_run(manifest_path, jobs[2], 1)
+
+        assert campaign.pending_jobs(jobs, manifest_path) == jobs
+
+    def test_cached_and_stopped_runs_are_not_timed(
+        self, fake_gdsims: Path, tmp_path: Path
+    ):
+        working_dir = make_campaign(tmp_path, 3)
+        manifest_path = working_dir / "manifest.jsonl"
+        cache_dir = tmp_path / "cache"
+        jobs = campaign.find_jobs({}, tmp_path, fake_gdsims, working_dir)
+
+        script_path, _, params_path, coords_path = jobs[0]
+        assert not is_cached(cache_dir, script_path, params_path, coords_path)
+        run_custom(*jobs[0], cache_dir=cache_dir)
+        assert is_cached(cache_dir, script_path, params_path, coords_path)
+        campaign.record_run(manifest_path, jobs[0], 0, wall_time=0.01, cached=True)
+        # Pretend the second run was stopped early by its stopping rule
+        run_custom(*jobs[1])
+        stop_marker_path(working_dir, 1).write_text("Stopped\nDay\n3\n")
+        campaign.record_run(manifest_path, jobs[1], 0, wall_time=0.5)
+        run_custom(*jobs[2])
+        campaign.record_run(manifest_path, jobs[2], 0, wall_time=2.0)
+
+        manifest = campaign.load_manifest(manifest_path)
+        assert manifest["params_0.txt"]["wall_time"] is None
+        assert manifest["params_0.txt"]["cached"]
+        assert manifest["params_1.txt"]["wall_time"] is None
+        assert manifest["params_1.txt"]["stopped"]
+        assert manifest["params_2.txt"]["wall_time"] == 2.0
+        cost_units = manifest["params_2.txt"]["cost_units"]
+        assert campaign.seconds_per_unit(manifest_path) == 2.0 / cost_units
+
+    def test_ignores_cut_short_lines(self, tmp_path: Path):
+        manifest_path = tmp_path / "manifest.jsonl"
+        manifest_path.write_text('{"params": "params_0.txt"}\n{"params": "par')
+        assert list(campaign.load_manifest(manifest_path)) == ["params_0.txt"]
+
+
+class TestScheduling:
+    def test_longest_first(self, tmp_path: Path):
+        jobs = []
+        for i, max_t in enumerate([100, 1000, 10, 1000]):
+            params_path = tmp_path / f"params_{i}.txt"
+            write_params(params_path, 1, max_t, 50)
+            jobs.append(("gdsimsapp", str(tmp_path), str(params_path), None))
+
+        costs, calibrated = campaign.estimate_costs(jobs)
+        assert not calibrated
+        np.testing.assert_allclose(costs, [5000, 50000, 500, 50000])
+
+        ordered = campaign.longest_first(jobs, costs)
+        assert ordered == [jobs[1], jobs[3], jobs[0], jobs[2]]
+
+    def test_calibrated_from_manifest(self, tmp_path: Path):
+        params_path = tmp_path / "params_0.txt"
+        write_params(params_path, 2, 100, 50)
+        jobs = [("gdsimsapp", str(tmp_path), str(params_path), None)]
+        manifest_path = tmp_path / "manifest.jsonl"
+        manifest_path.write_text(
+            json.dumps(
+                {
+                    "params": "old.txt",
+                    "exit_status": 0,
+                    "cost_units": 1000.0,
+                    "wall_time": 2.0,
+                }
+            )
+            + "\n"
+        )
+
+        costs, calibrated = campaign.estimate_costs(jobs, manifest_path)
+        assert calibrated
+        np.testing.assert_allclose(costs, [20.0])
+
+    def test_calibrated_from_cost_model(self, tmp_path: Path):
+        params_path = tmp_path / "params_0.txt"
+        write_params(params_path, 2, 100, 50)
+        jobs = [("gdsimsapp", str(tmp_path), str(params_path), None)]
+        model = CostModel({"startup": 1.0, "simulation": 0.001})
+
+        costs, calibrated = campaign.estimate_costs(jobs, cost_model=model)
+        assert calibrated
+        np.testing.assert_allclose(costs, [11.0])
+
+    def test_predict_makespan(self):
+        assert campaign.predict_makespan(np.array([4, 3, 2, 1]), 2) == 5
+        assert campaign.predict_makespan(np.array([1, 1, 1]), 5) == 1
+        with pytest.raises(ValueError, match="positive integer"):
+            campaign.predict_makespan(np.array([1]), 0)
+
+
+class TestJobQueue:
+    def test_claim_and_complete(self, fake_gdsims: Path, tmp_path: Path):
+        working_dir = make_campaign(tmp_path, 3)
+        jobs = campaign.find_jobs({}, tmp_path, fake_gdsims, working_dir)
+        queue = campaign.JobQueue(tmp_path / "queue.sqlite")
+        assert queue.add_jobs(jobs, np.array([1.0, 3.0, 2.0])) == 3
+        # Queuing the same runs again adds nothing
+        assert queue.add_jobs(jobs) == 0
+
+        job_id, run_args = claim(queue, "a")
+        assert run_args[2] == str(jobs[1][2])
+        assert queue.heartbeat(job_id, "a")
+        assert not queue.heartbeat(job_id, "b")
+        assert not queue.complete(job_id, "b")
+        assert queue.complete(job_id, "a")
+        # A run already done cannot be completed or failed again
+        assert not queue.complete(job_id, "a")
+        assert not queue.fail(job_id, "a", "boom")
+        assert queue.counts() == {"pending": 2, "running": 0, "done": 1, "failed": 0}
+
+    def test_expired_lease_is_reclaimed(self, fake_gdsims: Path, tmp_path: Path):
+        working_dir = make_campaign(tmp_path, 1)
+        jobs = campaign.find_jobs({}, tmp_path, fake_gdsims, working_dir)
+        queue = campaign.JobQueue(
+            tmp_path / "queue.sqlite", lease_seconds=0, max_attempts=2
+        )
+        queue.add_jobs(jobs)
+
+        job_id, _ = claim(queue, "a")
+        # Worker "a" died, so "b" takes over and "a" can no longer renew
+        assert claim(queue, "b")[0] == job_id
+        assert not queue.heartbeat(job_id, "a")
+        # Both attempts are used up once the second lease runs out too
+        assert queue.claim("c") is None
+        assert queue.counts()["failed"] == 1
+
+    def test_failed_run_is_retried(self, fake_gdsims: Path, tmp_path: Path):
+        working_dir = make_campaign(tmp_path, 1)
+        jobs = campaign.find_jobs({}, tmp_path, fake_gdsims, working_dir)
+        queue = campaign.JobQueue(tmp_path / "queue.sqlite", max_attempts=2)
+        queue.add_jobs(jobs)
+
+        job_id, _ = claim(queue, "a")
+        queue.fail(job_id, "a", "boom")
+        assert queue.counts()["pending"] == 1
+        job_id, _ = claim(queue, "a")
+        queue.fail(job_id, "a", "boom")
+        assert queue.counts()["failed"] == 1
+        assert queue.claim("a") is None
+
+    def test_run_worker(self, fake_gdsims: Path, failing_gdsims: Path, tmp_path: Path):
+        working_dir = make_campaign(tmp_path, 3)
+        jobs = campaign.find_jobs({}, tmp_path, fake_gdsims, working_dir)
+        # The first run fails
+        jobs[0] = (failing_gdsims, *jobs[0][1:])
+        queue = campaign.JobQueue(tmp_path / "queue.sqlite", max_attempts=1)
+        queue.add_jobs(jobs)
+        manifest_path = working_dir / "manifest.jsonl"
+
+        assert campaign.run_worker(queue, "a", manifest_path) == 2
+        assert queue.counts() == {"pending": 0, "running": 0, "done": 2, "failed": 1}
+        assert len(campaign.pending_jobs(jobs, manifest_path)) == 1
+
+    def test_run_worker_lease_lost_after_run(self, fake_gdsims: Path, tmp_path: Path):
+        working_dir = make_campaign(tmp_path, 1)
+        jobs = campaign.find_jobs({}, tmp_path, fake_gdsims, working_dir)
+        manifest_path = working_dir / "manifest.jsonl"
+
+        class StolenQueue(campaign.JobQueue):
+            def complete(self, job_id: int, worker: str) -> bool:
+                # Worker "b" takes the run over before worker "a" renews it
+                expiring = campaign.JobQueue(self.db_path, lease_seconds=0)
+                assert expiring.heartbeat(job_id, worker)
+                stolen = campaign.JobQueue(self.db_path).claim("b")
+                assert stolen is not None
+                return super().complete(job_id, worker)
+
+        queue = StolenQueue(tmp_path / "queue.sqlite")
+        queue.add_jobs(jobs)
+
+        assert campaign.run_worker(queue, "a", manifest_path) == 0
+        assert queue.counts()["running"] == 1
+        assert not manifest_path.exists()
+
+    def test_run_worker_lease_taken_over(self, hanging_gdsims: Path, tmp_path: Path):
+        working_dir = make_campaign(tmp_path, 1)
+        # A run that hangs, so it only ends when it is killed
+        jobs = campaign.find_jobs({}, tmp_path, hanging_gdsims, working_dir)
+        manifest_path = working_dir / "manifest.jsonl"
+        taken_over = threading.Event()
+
+        class StalledQueue(campaign.JobQueue):
+            def heartbeat(self, job_id: int, worker: str) -> bool:
+                # Worker "a" stalls until its lease has been taken over
+                taken_over.wait(30)
+                return super().heartbeat(job_id, worker)
+
+        queue = StalledQueue(tmp_path / "queue.sqlite", lease_seconds=0.3)
+        queue.add_jobs(jobs)
+        results: list[int] = []
+        worker = threading.Thread(
+            target=lambda: results.append(
+                campaign.run_worker(queue, "a", manifest_path)
+            )
+        )
+        worker.start()
+
+        # Wait until the run of worker "a" hangs, then let its lease run out
+        child_path = working_dir / "params" / "params_0.txt.child"
+        deadline = time.monotonic() + 30
+        while not child_path.exists():
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        other_queue = campaign.JobQueue(tmp_path / "queue.sqlite")
+        while (claimed := other_queue.claim("b")) is None:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        taken_over.set()
+        worker.join(30)
+
+        assert not worker.is_alive()
+        assert results == [0]
+        # The run is left to worker "b" and not recorded by worker "a"
+        assert other_queue.counts()["running"] == 1
+        assert other_queue.heartbeat(claimed[0], "b")
+        assert not manifest_path.exists()
+
+
+def test_run_limits():
+    config = {"run_limits": {"timeout": 3600, "retries": 2}}
+    assert campaign.run_limits(config) == {"timeout": 3600, "retries": 2}
+    assert campaign.run_limits({}) == {}
+    with pytest.raises(ValueError, match="Unknown run limits in config: tries"):
+        campaign.run_limits({"run_limits": {"tries": 2}})
+
+
+def test_stopping_rule():
+    assert campaign.stopping_rule({}) is None
+    rule = campaign.stopping_rule(
+        {"stop_early": {"rule": "wild_allele_lost", "days": 2}}
+    )
+    assert rule is not None
+    assert rule(np.array([[0, 0, 0, 4, 0, 0, 0], [1, 0, 0, 4, 0, 0, 0]]))
+    with pytest.raises(ValueError, match="Unknown stopping rule 'fixation'"):
+        campaign.stopping_rule({"stop_early": {"rule": "fixation"}})
@@ -1,7 +1,26 @@
+from pathlib import Path
+
 import numpy as np
 import pytest
+from scipy.spatial.distance import pdist
 
-from mozzie.construct import generate_parameter_samples
+from mozzie.construct import (
+    build_params_rows,
+    extend_parameter_samples,
+    extend_params_table,
+    generate_parameter_samples,
+    sample_discrepancy,
+    sampling_methods,
+    scale_samples,
+    unit_samples,
+    unscale_samples,
+)
+from mozzie.generate import (
+    load_params_table,
+    parameter_order,
+    params_table_name,
+    save_params_table,
+)
 
 
 class TestGenerateParameterSamples:
@@ -19,14 +38,59 @@ class TestGenerateParameterSamples:
         assert np.all(samples[:, 1] >= 10.0)
         assert np.all(samples[:, 1] <= 20.0)
 
-    def test_raises_run_with_integer_parameter(self):
+    def test_integer_parameter(self):
         to_sample = {
             "param1": {"type": "int", "min": 1, "max": 5},
         }
+        samples = generate_parameter_samples(to_sample, 10, seed=42)
+        np.testing.assert_array_equal(
+            np.sort(samples[:, 0]), np.repeat([1, 2, 3, 4, 5], 2)
+        )
+
+    def test_log_float_parameter(self):
+        to_sample = {
+            "param1": {"type": "log_float", "min": 0.001, "max": 10.0},
+        }
+        samples = generate_parameter_samples(to_sample, 400, seed=42)
+        assert np.all((samples >= 0.001) & (samples <= 10.0))
+        # A quarter of the points in each factor of ten
+        counts, _ = np.histogram(samples[:, 0], bins=[0.001, 0.01, 0.1, 1, 10])
+        np.testing.assert_array_equal(counts, [100, 100, 100, 100])
+
+        to_sample["param1"]["min"] = 0.0
+        with pytest.raises(ValueError, match="positive min"):
+            generate_parameter_samples(to_sample, 10)
+
+    def test_raises_with_unsupported_type(self):
+        to_sample = {
+            "param1": {"type": "str", "min": 1, "max": 5},
+        }
         num_samples = 10
-        with pytest.raises(ValueError, match="Unsupported type int"):
+        with pytest.raises(ValueError, match="Unsupported type str"):
             generate_parameter_samples(to_sample, num_samples)
 
+    @pytest.mark.parametrize("method", sampling_methods)
+    def test_methods(self, method: str):
+        to_sample = {
+            "param1": {"type": "float", "min": 0.0, "max": 1.0},
+            "param2": {"type": "float", "min": 10.0, "max": 20.0},
+        }
+        samples = generate_parameter_samples(to_sample, 20, seed=1, method=method)
+        assert samples.shape == (20, 2)
+        assert np.all((samples[:, 1] >= 10.0) & (samples[:, 1] <= 20.0))
+        again = generate_parameter_samples(to_sample, 20, seed=1, method=method)
+        np.testing.assert_array_equal(samples, again)
+
+    def test_unknown_method(self):
+        to_sample = {"param1": {"type": "float", "min": 0.0, "max": 1.0}}
+        with pytest.raises(ValueError, match="Unknown sampling method"):
+            generate_parameter_samples(to_sample, 10, method="grid")
+
+    def test_maximin_spreads_points(self):
+        plain = unit_samples(2, 16, "lhs", seed=3)
+        maximin = unit_samples(2, 16, "maximin_lhs", seed=3)
+        assert pdist(maximin).min() > pdist(plain).min()
+
     def test_raises_with_invalid_range(self):
         to_sample = {
             "param1": {"type": "float", "min": 5.0, "max": 2.0},
@@ -34,3 +98,73 @@ class TestGenerateParameterSamples:
         num_samples = 10
         with pytest.raises(ValueError, match="Invalid range for"):
             generate_parameter_samples(to_sample, num_samples)
+
+
+class TestDiscrepancy:
+    def test_round_trip(self):
+        to_sample = {
+            "param1": {"type": "float", "min": 2.0, "max": 4.0},
+            "param2": {"type": "log_float", "min": 0.01, "max": 1.0},
+        }
+        unit = unit_samples(2, 8, "halton", seed=0)
+        samples = scale_samples(unit, to_sample)
+        np.testing.assert_allclose(unscale_samples(samples, to_sample), unit)
+
+    def test_sobol_beats_random(self):
+        to_sample = {
+            "param1": {"type": "float", "min": 0.0, "max": 1.0},
+            "param2": {"type": "float", "min": 0.0, "max": 1.0},
+        }
+        sobol = generate_parameter_samples(to_sample, 64, seed=0, method="sobol")
+        random = np.random.default_rng(0).random((64, 2))
+        assert sample_discrepancy(sobol, to_sample) < sample_discrepancy(
+            random, to_sample
+        )
+
+
+EXTEND_TO_SAMPLE = {
+    "mu_j": {"type": "float", "min": 0.0, "max": 1.0},
+    "mu_a": {"type": "float", "min": 10.0, "max": 20.0},
+}
+
+
+class TestExtendParameterSamples:
+    def test_sobol_continues_sequence(self):
+        full = generate_parameter_samples(EXTEND_TO_SAMPLE, 24, seed=5, method="sobol")
+        first = generate_parameter_samples(EXTEND_TO_SAMPLE, 10, seed=5, method="sobol")
+        more = extend_parameter_samples(
+            first, EXTEND_TO_SAMPLE, 14, seed=5, method="sobol"
+        )
+        np.testing.assert_allclose(np.concatenate([first, more]), full)
+
+        with pytest.raises(ValueError, match="seed"):
+            extend_parameter_samples(first, EXTEND_TO_SAMPLE, 4, method="sobol")
+
+    def test_maximin_fills_gaps(self):
+        # An existing design that only covers the lower half of mu_j
+        existing = generate_parameter_samples(EXTEND_TO_SAMPLE, 16, seed=0)
+        existing[:, 0] /= 2
+        more = extend_parameter_samples(existing, EXTEND_TO_SAMPLE, 16, seed=0)
+        assert more.shape == (16, 2)
+        assert np.mean(more[:, 0] > 0.5) > 0.75
+
+        independent = generate_parameter_samples(EXTEND_TO_SAMPLE, 16, seed=1)
+        assert sample_discrepancy(
+            np.concatenate([existing, more]), EXTEND_TO_SAMPLE
+        ) < sample_discrepancy(
+            np.concatenate([existing, independent]), EXTEND_TO_SAMPLE
+        )
+
+    def test_extend_params_table(self, tmp_path: Path):
+        set_values = dict.fromkeys(parameter_order, 1.0)
+        table_path = tmp_path / params_table_name
+        samples = generate_parameter_samples(EXTEND_TO_SAMPLE, 5, seed=0)
+        rows = build_params_rows(set_values, EXTEND_TO_SAMPLE, samples, 10)
+        save_params_table(table_path, rows)
+
+        added = extend_params_table(table_path, set_values, EXTEND_TO_SAMPLE, 3, seed=0)
+        label_idx = parameter_order.index("set_label")
+        np.testing.assert_array_equal(added[:, label_idx], [15, 16, 17])
+        table = load_params_table(table_path)
+        np.testing.assert_array_equal(table[:, label_idx], np.arange(10, 18))
+        np.testing.assert_array_equal(table[:, 0], 1.0)
@@ -1,9 +1,16 @@
 from itertools import product
+from pathlib import Path
 
+import numpy as np
+import pandas as pd
 import pytest
 
 from mozzie import coords
 
+REPO_ROOT = Path(__file__).resolve().parent.parent
+TEST_DATA_DIR = REPO_ROOT / "tests" / "test_data"
+GRID = np.array([[0.0, 0.0], [0.0, 1.0], [1.0, 0.0], [1.0, 1.0]])
+
 
 class TestMakeGridCoords:
     def test_valid_input(self):
@@ -37,3 +44,209 @@ class TestMakeGridCoords:
         }
         with pytest.raises(ValueError, match=r"^coords_set must contain"):
             coords.make_grid_coords(coords_set)
+
+
+BOUNDS = {"x_set": {"min_x": 0, "max_x": 1}, "y_set": {"min_y": 0, "max_y": 2}}
+
+
+class TestMakeCoords:
+    def test_grid_matches_list(self):
+        coords_set = {
+            "coords_type": "grid",
+            "x_set": {"min_x": 1, "max_x": 3, "num_x": 3},
+            "y_set": {"min_y": 3, "max_y": 6, "num_y": 4},
+        }
+        result = coords.make_coords(coords_set)
+        assert result.shape == (12, 2)
+        assert [tuple(row) for row in result.tolist()] == (
+            coords.make_grid_coords(coords_set)
+        )
+
+    def test_random(self):
+        coords_set = BOUNDS | {"coords_type": "random", "num_coords": 500}
+        result = coords.make_coords(coords_set, rng=0)
+        assert result.shape == (500, 2)
+        assert (result >= 0).all()
+        assert (result[:, 0] <= 1).all()
+        assert (result[:, 1] <= 2).all()
+        np.testing.assert_array_equal(result, coords.make_coords(coords_set, rng=0))
+
+    def test_hex(self):
+        coords_set = BOUNDS | {"coords_type": "hex", "spacing": 0.25}
+        result = coords.make_coords(coords_set)
+        assert (result[:, 0] <= 1).all()
+        assert (result[:, 1] <= 2).all()
+        distances = coords.coords_tree(result).query(result, k=7)[0][:, 1:]
+        np.testing.assert_allclose(distances.min(axis=1), 0.25)
+        # A point away from the edges has six neighbours at the spacing
+        assert np.isclose(distances, 0.25).sum(axis=1).max() == 6
+
+    def test_clustered(self):
+        coords_set = BOUNDS | {
+            "coords_type": "clustered",
+            "num_coords": 1000,
+            "num_clusters": 3,
+            "cluster_std": 0.02,
+        }
+        result = coords.make_coords(coords_set, rng=1)
+        assert result.shape == (1000, 2)
+        assert (result >= 0).all()
+        assert (result[:, 1] <= 2).all()
+        # Most points are close to many others
+        counts = [len(n) for n in coords.neighbours_within(result, 0.1)]
+        assert np.median(counts) > 100
+
+    def test_csv(self):
+        result = coords.make_coords(
+            {"coords_type": "csv", "csv_path": "tests/test_data/test_coords.csv"},
+            base_dir=REPO_ROOT,
+        )
+        expected = pd.read_csv(TEST_DATA_DIR / "test_coords.csv", sep="\t")
+        np.testing.assert_array_equal(result, expected[["x", "y"]].to_numpy())
+
+    def test_unknown_type(self):
+        with pytest.raises(ValueError, match=r"^Unknown coords_type"):
+            coords.make_coords({"coords_type": "spiral"})
+
+    def test_missing_key(self):
+        with pytest.raises(ValueError, match=r"missing required key: num_coords$"):
+            coords.make_coords(BOUNDS | {"coords_type": "random"})
+
+
+class TestSpatialIndex:
+    def test_tree_is_cached(self):
+        points = np.random.default_rng(0).random((100, 2))
+        assert coords.coords_tree(points) is coords.coords_tree(points.copy())
+
+    def test_neighbours_within(self):
+        points = np.random.default_rng(2).random((300, 2))
+        found = coords.neighbours_within(points, 0.1, [0, 5])
+        for idx, neighbours in zip([0, 5], found, strict=True):
+            distance = np.linalg.norm(points - points[idx], axis=1)
+            expected = np.flatnonzero(distance <= 0.1)
+            np.testing.assert_array_equal(neighbours, expected[expected != idx])
+
+    def test_neighbour_pairs(self):
+        pairs = coords.neighbour_pairs(GRID, 1.0)
+        assert sorted(map(tuple, pairs.tolist())) == [(0, 1), (0, 2), (1, 3), (2, 3)]
+
+    def test_separated_release_sites(self):
+        points = np.random.default_rng(3).random((2000, 2))
+        indices = coords.draw_separated_release_sites(points, 5, 200, 0.2, rng=4)
+        assert indices.shape == (200, 5)
+        assert indices.max() < len(points) - 1
+        sites = points[indices]
+        distances = np.linalg.norm(sites[:, :, None] - sites[:, None, :], axis=-1)
+        distances[:, np.arange(5), np.arange(5)] = np.inf
+        assert distances.min() > 0.2
+
+    def test_separation_too_large(self):
+        with pytest.raises(ValueError, match=r"^Only 1 release sites fit"):
+            coords.draw_separated_release_sites(GRID, 2, 1, 2.0, rng=0)
+
+
+class TestReleaseSites:
+    def test_draw_release_sites(self):
+        indices = coords.draw_release_sites(50, 3, 1000, rng=0)
+        assert indices.shape == (1000, 3)
+        assert indices.min() >= 0
+        assert indices.max() < 49
+        assert not (np.diff(np.sort(indices, axis=1), axis=1) == 0).any()
+        np.testing.assert_array_equal(
+            indices, coords.draw_release_sites(50, 3, 1000, rng=0)
+        )
+
+    def test_draw_most_of_the_sites(self):
+        indices = coords.draw_release_sites(10, 8, 100, rng=1)
+        assert not (np.diff(np.sort(indices, axis=1), axis=1) == 0).any()
+        assert indices.max() < 9
+
+    def test_too_many_release_sites(self):
+        with pytest.raises(ValueError, match="exceeds available"):
+            coords.draw_release_sites(10, 10, 1)
+        with pytest.raises(ValueError, match="positive integer"):
+            coords.draw_release_sites(10, 0, 1)
+
+    def test_table_and_files(self, tmp_path):
+        grid = np.array(
+            coords.make_grid_coords(
+                {
+                    "x_set": {"min_x": 0, "max_x": 1, "num_x": 3},
+                    "y_set": {"min_y": 0, "max_y": 1, "num_y": 3},
+                }
+            )
+        )
+        indices = np.array([[0, 4], [8, 1]])
+        table = coords.release_sites_table(grid, indices, 10)
+        np.testing.assert_array_equal(
+            table, [[10, 0.0, 0.0, 0.5, 0.5], [11, 1.0, 1.0, 0.0, 0.5]]
+        )
+        assert coords.release_sites_columns(2) == [
+            "sample_idx",
+            "x_1",
+            "y_1",
+            "x_2",
+            "y_2",
+        ]
+
+        paths = coords.write_coords_files(grid, indices, tmp_path, 10)
+        assert [p.name for p in paths] == ["coords_10.csv", "coords_11.csv"]
+        written = pd.read_csv(paths[1], sep="\t")
+        np.testing.assert_array_equal(written[["x", "y"]].to_numpy(), grid)
+        assert list(np.flatnonzero(written["if"] == "y")) == [1, 8]
+
+
+class TestReleaseStore:
+    def test_matches_coords_files(self, tmp_path):
+        indices = np.array([[0, 2], [1, 2], [0, 1]])
+        files_dir = tmp_path / "files"
+        files_dir.mkdir()
+        paths = coords.write_coords_files(GRID, indices, files_dir, 5)
+
+        store_path = tmp_path / coords.release_store_name
+        coords.save_release_store(store_path, GRID, indices, 5)
+        for path in paths:
+            stored_path = tmp_path / "coords" / path.name
+            assert coords.coords_available(stored_path)
+            assert coords.read_coords_text(stored_path) == path.read_text()
+        assert not coords.coords_available(tmp_path / "coords" / "coords_8.csv")
+        with pytest.raises(FileNotFoundError, match=r"coords_8\.csv"):
+            coords.read_coords_text(tmp_path / "coords" / "coords_8.csv")
+
+    def test_samples_are_added_and_replaced(self, tmp_path):
+        store_path = tmp_path / coords.release_store_name
+        coords.save_release_store(store_path, GRID, np.array([[0], [1]]), 0)
+        coords.save_release_store(store_path, GRID, np.array([[2], [2]]), 1)
+        _, labels, indices = coords.load_release_store(store_path)
+        np.testing.assert_array_equal(labels, [0, 1, 2])
+        np.testing.assert_array_equal(indices[:, 0], [0, 2, 2])
+
+        with pytest.raises(ValueError, match="Coordinates differ"):
+            coords.save_release_store(store_path, GRID[:3], np.array([[0]]), 3)
+
+    def test_extend(self, tmp_path):
+        store_path = tmp_path / coords.release_store_name
+        coords.save_release_store(store_path, GRID, np.array([[0, 1], [1, 2]]), 0)
+        added = coords.extend_release_store(store_path, 2, 3, rng=0)
+        assert added.shape == (3, 2)
+        stored_coords, labels, indices = coords.load_release_store(store_path)
+        np.testing.assert_array_equal(stored_coords, GRID)
+        np.testing.assert_array_equal(labels, [0, 1, 2, 3, 4])
+        np.testing.assert_array_equal(indices[2:], added)
+        assert coords.coords_available(tmp_path / "coords" / "coords_4.csv")
+
+    def test_coords_file(self, tmp_path):
+        coords.save_release_store(
+            tmp_path / coords.release_store_name, GRID, np.array([[3]]), 0
+        )
+        coords_path = tmp_path / "coords" / "coords_0.csv"
+        scratch = tmp_path / "scratch"
+        with coords.coords_file(coords_path, scratch) as written:
+            assert written is not None
+            assert written.parent == scratch
+            assert written.read_text().endswith("1.0\t1.0\ty\n")
+        assert list(scratch.iterdir()) == []
+        assert not coords_path.exists()
+
+        with coords.coords_file(None) as written:
+            assert written is None
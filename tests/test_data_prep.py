@@ -1,10 +1,20 @@
 from pathlib import Path
+from unittest.mock import patch
 
+import numpy as np
 import pytest
 import yaml
 
 from mozzie import data_prep
-from mozzie.generate import parameter_order
+from mozzie.coords import release_store_name, save_release_store
+from mozzie.generate import (
+    parameter_order,
+    params_table_name,
+    params_text,
+    run_custom,
+    save_params_table,
+    wild_allele_lost,
+)
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
 METAPOP_LOC = REPO_ROOT / "GeneralMetapop" / "build" / "gdsimsapp"
@@ -50,6 +60,16 @@ class TestReadConfig:
         with pytest.raises(ValueError, match=r"dictionary"):
             data_prep.read_config(config_data)
 
+    def test_wrong_design(self):
+        config_path = TEST_DATA_DIR / "test_config.yaml"
+        config_data = yaml.safe_load(config_path.read_text())
+        config_data["design"] = "sobol"
+        data_prep.read_config(config_data)
+
+        config_data["design"] = "grid"
+        with pytest.raises(ValueError, match=r"design must be one of"):
+            data_prep.read_config(config_data)
+
     def test_wrong_to_sample(self):
         config_path = TEST_DATA_DIR / "test_config.yaml"
         config_data = yaml.safe_load(config_path.read_text())
@@ -134,3 +154,339 @@ class TestReadValuesFromParams:
         assert isinstance(sample_values, dict)
         assert sample_values["mu_j"] == 0.05
         assert sample_values["mu_a"] == 0.125
+
+
+class TestLoadSamplesValues:
+    def test_params_table_matches_files(self, tmp_path: Path):
+        base = np.array((TEST_DATA_DIR / "test_params.txt").read_text().split(), float)
+        values = np.tile(base, (4, 1))
+        values[:, parameter_order.index("mu_j")] = [0.1, 0.2, 0.3, 0.4]
+        values[:, parameter_order.index("set_label")] = [10, 11, 12, 13]
+        config = {"start_index": 11, "num_samples": 2, "to_sample": {"mu_j": {}}}
+
+        # One params file per sample
+        files_dir = tmp_path / "files"
+        (files_dir / "params").mkdir(parents=True)
+        for row in values:
+            label = int(row[-1])
+            (files_dir / "params" / f"params_{label}.txt").write_text(params_text(row))
+        from_files = data_prep.load_samples_values(files_dir, config)
+
+        # The same samples in a parameter table
+        table_dir = tmp_path / "table"
+        (table_dir / "params").mkdir(parents=True)
+        save_params_table(table_dir / "params" / params_table_name, values)
+        from_table = data_prep.load_samples_values(table_dir, config)
+
+        assert from_table == from_files == {11: {"mu_j": 0.2}, 12: {"mu_j": 0.3}}
+        config["num_samples"] = 4
+        with pytest.raises(FileNotFoundError, match="Sample index 14"):
+            data_prep.load_samples_values(table_dir, config)
+
+    def test_add_sites_from_store(self, tmp_path: Path):
+        (tmp_path / "params").mkdir()
+        base = np.array((TEST_DATA_DIR / "test_params.txt").read_text().split(), float)
+        values = np.tile(base, (2, 1))
+        values[:, parameter_order.index("set_label")] = [0, 1]
+        save_params_table(tmp_path / "params" / params_table_name, values)
+        grid = np.array([[0.0, 0.0], [0.5, 1.0], [1.0, 1.0]])
+        save_release_store(tmp_path / release_store_name, grid, np.array([[1], [0]]), 0)
+
+        config = {"start_index": 0, "num_samples": 2, "to_sample": {"mu_j": {}}}
+        samples = data_prep.load_samples_values(tmp_path, config, add_sites=True)
+        assert samples[0] == {"mu_j": 0.05, "x_1": 0.5, "y_1": 1.0}
+        assert samples[1] == {"mu_j": 0.05, "x_1": 0.0, "y_1": 0.0}
+
+
+class TestStoppedRuns:
+    @pytest.fixture()
+    def stopped_run(self, stopping_gdsims: Path, tmp_path: Path) -> Path:
+        """A campaign with one run stopped early, once the wild type was lost."""
+        (tmp_path / "params").mkdir()
+        values = (TEST_DATA_DIR / "test_params.txt").read_text().split()
+        values[parameter_order.index("num_runs")] = "1"
+        values[parameter_order.index("set_label")] = "0"
+        params_path = tmp_path / "params" / "params_0.txt"
+        params_path.write_text("\n".join(values) + "\n")
+        run_custom(
+            stopping_gdsims, tmp_path, params_path, stopping_rule=wild_allele_lost(3)
+        )
+        return tmp_path
+
+    def test_stop_day(self, stopped_run: Path):
+        config = {"start_index": 0, "num_samples": 1}
+        stop_day = data_prep.load_stop_days(stopped_run, config)[0]
+        assert stop_day is not None
+        assert 7 <= stop_day < 100
+
+    def test_totals_are_padded(self, stopped_run: Path):
+        config = {"start_index": 0, "num_samples": 1}
+        totals = data_prep.load_total_values(stopped_run, config)[0]
+        # Days 0 to max_t, with the state after the stop held
+        assert totals.shape == (101, 6)
+        np.testing.assert_array_equal(totals[-1], [0, 0, 100, 0, 0, 0])
+
+    def test_local_state_is_held(self, stopped_run: Path):
+        config = {
+            "start_index": 0,
+            "num_samples": 1,
+            "analysis_range": {"start": 0, "end": 20, "step": 5},
+        }
+        local_data = data_prep.load_local_values(stopped_run, config)[0]
+        # Day 10 was only partly written, so day 5 is the last state
+        for time_point in (10, 15):
+            np.testing.assert_array_equal(local_data[time_point], local_data[5])
+
+        state = data_prep.load_state_values(stopped_run, config, 50)[0]
+        np.testing.assert_array_equal(state, local_data[5])
+
+    def test_ensemble_store(self, stopped_run: Path):
+        config = {
+            "start_index": 0,
+            "num_samples": 1,
+            "analysis_range": {"start": 0, "end": 20, "step": 5},
+        }
+        totals = data_prep.load_total_values(stopped_run, config)[0]
+        local_data = data_prep.load_local_values(stopped_run, config)[0]
+
+        data_prep.build_ensemble_store(stopped_run, config)
+        np.testing.assert_array_equal(
+            data_prep.load_total_values(stopped_run, config)[0], totals
+        )
+        stored = data_prep.load_local_values(stopped_run, config)[0]
+        for time_point in (5, 10, 15):
+            np.testing.assert_array_equal(stored[time_point], local_data[time_point])
+
+
+class TestReplicates:
+    @pytest.fixture()
+    def replicated_run(self, fake_gdsims: Path, tmp_path: Path) -> Path:
+        """A campaign with one run of three replicates."""
+        (tmp_path / "params").mkdir()
+        params_path = tmp_path / "params" / "params_0.txt"
+        params_path.write_text("3\n0\n")
+        run_custom(fake_gdsims, tmp_path, params_path)
+        return tmp_path
+
+    def test_total_values(self, replicated_run: Path):
+        config = {"start_index": 0, "num_samples": 1}
+        first = data_prep.load_total_values(replicated_run, config)[0]
+        stacked = data_prep.load_total_values(replicated_run, config, "stack")[0]
+        moments = data_prep.load_total_values(replicated_run, config, "moments")[0]
+
+        assert first.shape == (11, 6)
+        assert stacked.shape == (3, 11, 6)
+        np.testing.assert_array_equal(stacked[0], first)
+        np.testing.assert_array_equal(stacked[2, :, 0], first[:, 0] + 2)
+        np.testing.assert_allclose(moments[0], stacked.mean(axis=0))
+        np.testing.assert_allclose(moments[1], stacked.var(axis=0))
+
+    def test_local_and_state_values(self, replicated_run: Path):
+        config = {
+            "start_index": 0,
+            "num_samples": 1,
+            "analysis_range": {"start": 0, "end": 11, "step": 5},
+        }
+        local_data = data_prep.load_local_values(replicated_run, config, "stack")[0]
+        assert sorted(local_data) == [0, 5, 10]
+        assert local_data[5].shape == (3, 2, 6)
+        np.testing.assert_array_equal(local_data[5][:, 0, 0], [45, 46, 47])
+
+        state = data_prep.load_state_values(replicated_run, config, 10, "moments")[0]
+        np.testing.assert_allclose(state[0], local_data[10].mean(axis=0))
+        np.testing.assert_allclose(state[1], local_data[10].var(axis=0))
+
+    def test_unknown_mode(self, replicated_run: Path):
+        config = {"start_index": 0, "num_samples": 1}
+        with pytest.raises(ValueError, match="replicates must be one of"):
+            data_prep.load_total_values(replicated_run, config, "median")
+
+
+ENSEMBLE_CONFIG = {
+    "start_index": 0,
+    "num_samples": 3,
+    "analysis_range": {"start": 0, "end": 11, "step": 5},
+}
+
+
+@pytest.fixture()
+def campaign(fake_gdsims: Path, tmp_path: Path) -> Path:
+    """A campaign with three finished runs."""
+    (tmp_path / "params").mkdir()
+    for label in range(3):
+        params_path = tmp_path / "params" / f"params_{label}.txt"
+        params_path.write_text(f"1\n{label}\n")
+        run_custom(fake_gdsims, tmp_path, params_path)
+    return tmp_path
+
+
+class TestSidecarCache:
+    def test_second_load_reads_the_sidecars(self, campaign: Path):
+        totals = data_prep.load_total_values(campaign, ENSEMBLE_CONFIG)
+        states = data_prep.load_state_values(campaign, ENSEMBLE_CONFIG, [0, 10])
+        output_dir = campaign / "output_files"
+        assert not list(output_dir.glob(".*.npy"))
+
+        config = ENSEMBLE_CONFIG
+        data_prep.load_total_values(campaign, config, replicates="stack", cache=True)
+        data_prep.load_local_values(campaign, config, replicates="stack", cache=True)
+        assert len(list(output_dir.glob(".Totals*.npy"))) == 6
+        assert len(list(output_dir.glob(".LocalData*.npy"))) == 6
+
+        # The text files are not parsed again
+        with (
+            patch("mozzie.parsing._parse_total_data", side_effect=AssertionError),
+            patch("mozzie.parsing._parse_local_data", side_effect=AssertionError),
+        ):
+            cached_totals = data_prep.load_total_values(campaign, config, cache=True)
+            cached_states = data_prep.load_state_values(
+                campaign, config, [0, 10], cache=True
+            )
+        for label in range(3):
+            np.testing.assert_array_equal(cached_totals[label], totals[label])
+        np.testing.assert_array_equal(cached_states, states)
+
+
+class TestEnsembleStore:
+    def test_loaders_slice_the_store(self, campaign: Path):
+        totals = data_prep.load_total_values(campaign, ENSEMBLE_CONFIG)
+        local_data = data_prep.load_local_values(campaign, ENSEMBLE_CONFIG)
+        state = data_prep.load_state_values(campaign, ENSEMBLE_CONFIG, 5)
+
+        data_prep.build_ensemble_store(campaign, ENSEMBLE_CONFIG)
+        store = data_prep.load_ensemble_store(campaign)
+        np.testing.assert_array_equal(store["labels"], [0, 1, 2])
+        np.testing.assert_array_equal(store["local_days"], [0, 5, 10])
+        assert store["local"].shape == (3, 3, 2, 6)
+        assert store["totals"].shape == (3, 11, 6)
+
+        # The output files are not read again
+        with (
+            patch("mozzie.data_prep.read_total_data", side_effect=AssertionError),
+            patch("mozzie.data_prep.read_local_data", side_effect=AssertionError),
+        ):
+            stored_totals = data_prep.load_total_values(campaign, ENSEMBLE_CONFIG)
+            stored_local = data_prep.load_local_values(campaign, ENSEMBLE_CONFIG)
+            stored_state = data_prep.load_state_values(campaign, ENSEMBLE_CONFIG, 5)
+        for label in range(3):
+            # Copies, not read-only views of the store
+            assert not isinstance(stored_totals[label], np.memmap)
+            assert stored_totals[label].flags.writeable
+            assert stored_state[label].flags.writeable
+            assert stored_local[label][5].flags.writeable
+            np.testing.assert_array_equal(stored_totals[label], totals[label])
+            np.testing.assert_array_equal(stored_state[label], state[label])
+            for time_point in (0, 5, 10):
+                np.testing.assert_array_equal(
+                    stored_local[label][time_point], local_data[label][time_point]
+                )
+
+    def test_changed_outputs_are_read_again(self, campaign: Path):
+        data_prep.build_ensemble_store(campaign, ENSEMBLE_CONFIG)
+        totals_path = campaign / "output_files" / "Totals1run1.txt"
+        totals_path.write_text(
+            totals_path.read_text().replace("\n0\t100\t", "\n0\t7\t")
+        )
+
+        totals = data_prep.load_total_values(campaign, ENSEMBLE_CONFIG)
+        assert totals[1][0, 0] == 7
+
+        data_prep.build_ensemble_store(campaign, ENSEMBLE_CONFIG)
+        with patch("mozzie.data_prep.read_total_data", side_effect=AssertionError):
+            stored = data_prep.load_total_values(campaign, ENSEMBLE_CONFIG)
+        assert stored[1][0, 0] == 7
+        assert len(list((campaign / "ensemble").glob("*.npy"))) == 2
+
+    def test_store_grows_by_range(self, campaign: Path):
+        data_prep.build_ensemble_store(campaign, {"start_index": 0, "num_samples": 2})
+        data_prep.build_ensemble_store(campaign, {"start_index": 2, "num_samples": 1})
+        store = data_prep.load_ensemble_store(campaign)
+        np.testing.assert_array_equal(store["labels"], [0, 1, 2])
+        np.testing.assert_array_equal(store["local"][2, 1, 0, 0], 45)
+
+
+class TestParallelLoading:
+    def test_matches_one_at_a_time(self, campaign: Path):
+        totals = data_prep.load_total_values(campaign, ENSEMBLE_CONFIG)
+        parallel = data_prep.load_total_values(
+            campaign, ENSEMBLE_CONFIG, workers=3, progress=True
+        )
+        assert list(parallel) == [0, 1, 2]
+        for label in range(3):
+            np.testing.assert_array_equal(parallel[label], totals[label])
+
+        local_data = data_prep.load_local_values(campaign, ENSEMBLE_CONFIG, workers=3)
+        state = data_prep.load_state_values(campaign, ENSEMBLE_CONFIG, 10, workers=3)
+        assert list(local_data) == list(state) == [0, 1, 2]
+        np.testing.assert_array_equal(state[2], local_data[2][10])
+
+    def test_failures_are_reported_together(self, campaign: Path):
+        (campaign / "output_files" / "LocalData0run1.txt").unlink()
+        (campaign / "output_files" / "LocalData2run1.txt").write_text("corrupt\n")
+
+        with pytest.raises(ExceptionGroup) as info:
+            data_prep.load_local_values(campaign, ENSEMBLE_CONFIG, workers=2)
+        assert str(info.value).startswith("2 of 3 runs could not be loaded")
+        first, second = info.value.exceptions
+        assert isinstance(first, FileNotFoundError)
+        assert first.__notes__ == ["While loading run 0."]
+        assert isinstance(second, ValueError)
+        assert second.__notes__ == ["While loading run 2."]
+
+    def test_any_error_is_reported(self, campaign: Path):
+        (campaign / "output_files" / "Totals0run1.txt").unlink()
+        read_total_data = data_prep.read_total_data
+
+        def read_or_fail(file_path: Path, *args, **kwargs):
+            if file_path.name == "Totals2run1.txt":
+                msg = "WW"
+                raise KeyError(msg)
+            return read_total_data(file_path, *args, **kwargs)
+
+        with (
+            patch("mozzie.data_prep.read_total_data", side_effect=read_or_fail),
+            pytest.raises(ExceptionGroup) as info,
+        ):
+            data_prep.load_total_values(campaign, ENSEMBLE_CONFIG, workers=2)
+        first, second = info.value.exceptions
+        assert isinstance(first, FileNotFoundError)
+        assert isinstance(second, KeyError)
+        assert second.__notes__ == ["While loading run 2."]
+
+    def test_one_failure_is_raised_as_is(self, campaign: Path):
+        (campaign / "output_files" / "Totals1run1.txt").unlink()
+        with pytest.raises(FileNotFoundError, match="does not exist"):
+            data_prep.load_total_values(campaign, ENSEMBLE_CONFIG, workers=2)
+
+
+class TestMultipleTimestamps:
+    def test_matches_single_timestamps(self, campaign: Path):
+        states = data_prep.load_state_values(campaign, ENSEMBLE_CONFIG, range(0, 11, 5))
+        assert states.shape == (3, 3, 2, 6)
+        for tidx, timestamp in enumerate((0, 5, 10)):
+            single = data_prep.load_state_values(campaign, ENSEMBLE_CONFIG, timestamp)
+            for label in range(3):
+                np.testing.assert_array_equal(states[label, tidx], single[label])
+
+        data_prep.build_ensemble_store(campaign, ENSEMBLE_CONFIG)
+        stored = data_prep.load_state_values(campaign, ENSEMBLE_CONFIG, [10, 0])
+        np.testing.assert_array_equal(stored, states[:, [2, 0]])
+
+    def test_replicates(self, fake_gdsims: Path, tmp_path: Path):
+        (tmp_path / "params").mkdir()
+        params_path = tmp_path / "params" / "params_0.txt"
+        params_path.write_text("3\n0\n")
+        run_custom(fake_gdsims, tmp_path, params_path)
+
+        config = {"start_index": 0, "num_samples": 1}
+        states = data_prep.load_state_values(tmp_path, config, [5, 10], "stack")
+        assert states.shape == (1, 3, 2, 2, 6)
+        np.testing.assert_array_equal(states[0, :, 0, 0, 0], [45, 46, 47])
+
+    def test_missing_timestamp(self, campaign: Path):
+        with pytest.raises(ExceptionGroup) as info:
+            data_prep.load_state_values(campaign, ENSEMBLE_CONFIG, [5, 7])
+        assert all(
+            str(e) == f"Timestamp 7 not found in LocalData{label}run1.txt."
+            for label, e in enumerate(info.value.exceptions)
+        )
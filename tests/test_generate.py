@@ -1,6 +1,12 @@
+import asyncio
+import os
+import subprocess
+import threading
+import time
 from pathlib import Path
 from unittest.mock import patch
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -131,3 +137,678 @@ def test_run_custom_stdin_error(working_dir: Path):
 
         with pytest.raises(RuntimeError, match="Failed to open stdin for the process."):
             mozzie.generate.run_custom(METAPOP_LOC, working_custom_dir, params_path)
+
+
+def test_drive_gdsims_answers_prompts(fake_gdsims: Path, working_dir: Path):
+    """
+    Test that each answer is given once the matching prompt appears.
+    """
+    params_path = REPO_ROOT / "tests" / "test_data" / "test_params.txt"
+    output = mozzie.generate.run_custom(fake_gdsims, working_dir, params_path)
+    assert "Program run time" in output
+    answers = (working_dir / "answers.txt").read_text().splitlines()
+    assert answers == ["100", str(params_path), "y"]
+    assert (working_dir / "output_files" / "Totals1001run1.txt").is_file()
+
+
+def test_run_custom_async_answers_prompts(fake_gdsims: Path, working_dir: Path):
+    """
+    Test that the asyncio driver gives the same answers as the threaded one.
+    """
+    params_path = REPO_ROOT / "tests" / "test_data" / "test_params.txt"
+    output = asyncio.run(
+        mozzie.generate.run_custom_async(fake_gdsims, working_dir, params_path)
+    )
+    assert "Program run time" in output
+    answers = (working_dir / "answers.txt").read_text().splitlines()
+    assert answers == ["100", str(params_path), "y"]
+    assert (working_dir / "output_files" / "Totals1001run1.txt").is_file()
+
+
+def test_prompt_is_unfinished_line():
+    """
+    Test that a finished line ending like a prompt is not answered.
+    """
+    output = mozzie.generate._OutputTail()
+    menu = mozzie.generate._Menu(["100", "y"])
+    output.extend(b"GDSiMS: Gene Drive Simulator of Mosquito Spread\nOptions:\n")
+    assert menu.reply(output) is None
+    output.extend(b"  1) Default parameters\n  100) Custom parameters\n")
+    assert menu.reply(output) is None
+    output.extend(b"Enter the parameter set: ")
+    assert menu.reply(output) == b"100\n"
+    assert menu.reply(output) is None
+    output.extend(b"100\nContinue? (y/n)")
+    assert menu.reply(output) == b"y\n"
+    assert menu.done
+
+
+def test_drive_gdsims_prompt_timeout(fake_gdsims: Path, working_dir: Path):
+    """
+    Test that a prompt which never comes raises a TimeoutError.
+    """
+    with pytest.raises(TimeoutError, match="No prompt from GDSiMS"):
+        mozzie.generate.drive_gdsims(
+            fake_gdsims, working_dir, ["hang", "y"], prompt_timeout=0.5
+        )
+
+
+def test_drive_gdsims_early_exit(fake_gdsims: Path, working_dir: Path):
+    """
+    Test that the process exiting before all answers are given is reported.
+    """
+    with pytest.raises(RuntimeError, match="exited before all answers"):
+        mozzie.generate.drive_gdsims(fake_gdsims, working_dir, ["1", "y", "y"])
+
+
+def test_run_many(fake_gdsims: Path, tmp_path: Path):
+    """
+    Test running several simulations concurrently with the asyncio runner.
+    """
+    jobs = []
+    for label in range(5):
+        run_dir = tmp_path / f"run_{label}"
+        run_dir.mkdir()
+        params_path = run_dir / "params.txt"
+        params_path.write_text(f"1\n{label}\n")
+        jobs.append((fake_gdsims, run_dir, params_path, None))
+
+    finished: list[int] = []
+    outputs = asyncio.run(
+        mozzie.generate.run_many(
+            jobs, max_concurrency=2, callback=lambda i, *_: finished.append(i)
+        )
+    )
+
+    assert len(outputs) == 5
+    assert all(
+        isinstance(output, str) and "Program run time" in output for output in outputs
+    )
+    assert sorted(finished) == list(range(5))
+    for label in range(5):
+        assert (
+            tmp_path / f"run_{label}" / "output_files" / f"Totals{label}run1.txt"
+        ).is_file()
+
+
+def test_run_custom_async_prompt_timeout(fake_gdsims: Path, working_dir: Path):
+    """
+    Test that the asyncio driver also times out when a prompt never comes.
+    """
+    with pytest.raises(TimeoutError, match="No prompt from GDSiMS"):
+        asyncio.run(
+            mozzie.generate.drive_gdsims_async(
+                fake_gdsims, working_dir, ["hang", "y"], prompt_timeout=0.5
+            )
+        )
+
+
+def test_run_custom_in_scratch_dir(
+    fake_gdsims: Path, working_dir: Path, tmp_path: Path
+):
+    """
+    Test that a run in a scratch directory publishes its outputs and cleans up.
+    """
+    scratch_root = tmp_path / "scratch"
+    params_path = REPO_ROOT / "tests" / "test_data" / "test_params.txt"
+    output = mozzie.generate.run_custom(
+        fake_gdsims, working_dir, params_path, scratch_root=scratch_root
+    )
+    assert "Program run time" in output
+
+    out_file_dir = working_dir / "output_files"
+    assert sorted(p.name for p in out_file_dir.iterdir()) == [
+        "LocalData1001run1.txt",
+        "Totals1001run1.txt",
+    ]
+    assert not (working_dir / "answers.txt").exists()
+    assert list(scratch_root.iterdir()) == []
+
+
+def test_run_custom_coords_in_scratch_dir(working_dir: Path, tmp_path: Path):
+    """
+    Test that a coordinates file from a release site store is written in the
+    run's own scratch directory, not shared with other runs.
+    """
+    grid = np.array([[0.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    mozzie.coords.save_release_store(
+        tmp_path / mozzie.coords.release_store_name, grid, np.array([[1]]), 4
+    )
+    scratch_root = tmp_path / "scratch"
+    params_path = REPO_ROOT / "tests" / "test_data" / "test_params.txt"
+    seen = []
+
+    def drive(script_path, run_dir, answers, *args, **kwargs):
+        seen.append((run_dir, Path(answers[-2])))
+        completed = subprocess.CompletedProcess([script_path], 0, b"", b"")
+        return completed, mozzie.generate.RunUsage(0.0, 0.0, 0.0, 0)
+
+    with patch("mozzie.generate._drive_gdsims", side_effect=drive):
+        mozzie.generate.run_custom(
+            "gdsimsapp",
+            working_dir,
+            params_path,
+            tmp_path / "coords" / "coords_4.csv",
+            scratch_root=scratch_root,
+        )
+
+    [(run_dir, coords_path)] = seen
+    assert coords_path.parent == run_dir.parent
+    assert coords_path.parent.parent == scratch_root
+    assert list(scratch_root.iterdir()) == []
+
+
+def test_publish_outputs(tmp_path: Path):
+    """
+    Test that publishing replaces existing outputs and leaves no partial files.
+    """
+    run_dir = tmp_path / "run"
+    (run_dir / "output_files").mkdir(parents=True)
+    (run_dir / "output_files" / "Totals1run1.txt").write_text("new")
+    working_dir = tmp_path / "campaign"
+    (working_dir / "output_files").mkdir(parents=True)
+    (working_dir / "output_files" / "Totals1run1.txt").write_text("old")
+
+    published = mozzie.generate.publish_outputs(run_dir, working_dir)
+
+    assert published == [working_dir / "output_files" / "Totals1run1.txt"]
+    assert published[0].read_text() == "new"
+    assert list((working_dir / "output_files").iterdir()) == published
+
+
+def test_publish_outputs_interrupted(tmp_path: Path):
+    """
+    Test that a run whose publishing is cut short has no outputs listed.
+    """
+    run_dir = tmp_path / "run"
+    (run_dir / "output_files").mkdir(parents=True)
+    for name in ("LocalData1run1.txt", "Totals1run1.txt"):
+        (run_dir / "output_files" / name).write_text("new")
+    working_dir = tmp_path / "campaign"
+    working_dir.mkdir()
+
+    replace = os.replace
+
+    def fail_on_totals(src: Path, dest: Path) -> None:
+        if Path(dest).name.startswith("Totals"):
+            msg = "disk full"
+            raise OSError(msg)
+        replace(src, dest)
+
+    with (
+        patch("mozzie.generate.os.replace", side_effect=fail_on_totals),
+        pytest.raises(OSError, match="disk full"),
+    ):
+        mozzie.generate.publish_outputs(run_dir, working_dir)
+
+    assert (working_dir / "output_files" / "LocalData1run1.txt").is_file()
+    assert mozzie.generate.output_files_for(working_dir, 1) == []
+
+    (run_dir / "output_files" / "Totals1run1.txt").write_text("new")
+    (run_dir / "output_files" / "LocalData1run1.txt").write_text("new")
+    mozzie.generate.publish_outputs(run_dir, working_dir)
+    assert [p.name for p in mozzie.generate.output_files_for(working_dir, 1)] == [
+        "LocalData1run1.txt",
+        "Totals1run1.txt",
+    ]
+
+
+def test_run_custom_cache_hit(fake_gdsims: Path, hanging_gdsims: Path, tmp_path: Path):
+    """
+    Test that the same parameters with a different label reuse the cached run.
+    """
+    cache_dir = tmp_path / "cache"
+    params = (REPO_ROOT / "tests" / "test_data" / "test_params.txt").read_text()
+
+    first_dir = tmp_path / "first"
+    first_dir.mkdir()
+    first_params = first_dir / "params.txt"
+    first_params.write_text(params)
+    output = mozzie.generate.run_custom(
+        fake_gdsims, first_dir, first_params, cache_dir=cache_dir
+    )
+    assert (first_dir / "answers.txt").is_file()
+
+    second_dir = tmp_path / "second"
+    second_dir.mkdir()
+    second_params = second_dir / "params.txt"
+    second_params.write_text(params.replace("1001", "2002"))
+    cached_output = mozzie.generate.run_custom(
+        fake_gdsims, second_dir, second_params, cache_dir=cache_dir
+    )
+
+    assert cached_output == output
+    assert not (second_dir / "answers.txt").exists()
+    first_totals = first_dir / "output_files" / "Totals1001run1.txt"
+    second_totals = second_dir / "output_files" / "Totals2002run1.txt"
+    assert second_totals.read_text() == first_totals.read_text()
+    assert second_totals.stat().st_ino == first_totals.stat().st_ino
+
+    # Running again in place does not write through the links to the cache
+    totals_text = first_totals.read_text()
+    with pytest.raises(TimeoutError):
+        mozzie.generate.run_custom(
+            hanging_gdsims, second_dir, second_params, timeout=1.0
+        )
+    assert second_totals.read_text() == "Total males\n"
+    assert first_totals.read_text() == totals_text
+
+
+def test_cache_key_ignores_label(tmp_path: Path):
+    """
+    Test that the cache key depends on the parameter values but not the label.
+    """
+    script_path = tmp_path / "gdsimsapp"
+    script_path.write_text("binary")
+    values = (REPO_ROOT / "tests" / "test_data" / "test_params.txt").read_text()
+    params_a = tmp_path / "a.txt"
+    params_a.write_text(values)
+    params_b = tmp_path / "b.txt"
+    params_b.write_text(values.replace("1001", "7"))
+    params_c = tmp_path / "c.txt"
+    params_c.write_text(values.replace("0.05", "0.050"))
+    params_d = tmp_path / "d.txt"
+    params_d.write_text(values.replace("0.05", "0.06"))
+
+    key = mozzie.generate.cache_key(script_path, params_a)
+    assert mozzie.generate.cache_key(script_path, params_b) == key
+    assert mozzie.generate.cache_key(script_path, params_c) == key
+    assert mozzie.generate.cache_key(script_path, params_d) != key
+
+
+def test_evict_cache(tmp_path: Path):
+    """
+    Test that eviction removes the least recently used entries first.
+    """
+    for age, name in enumerate(["newest", "middle", "oldest"]):
+        entry_dir = tmp_path / name
+        entry_dir.mkdir()
+        (entry_dir / "Totalsrun1.txt").write_text("x" * 100)
+        os.utime(entry_dir, (1000 - age, 1000 - age))
+
+    removed = mozzie.generate.evict_cache(tmp_path, max_bytes=250)
+
+    assert removed == [tmp_path / "oldest"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["middle", "newest"]
+
+    # Files still linked from a campaign take no space of the cache's own
+    campaign_dir = tmp_path.parent / f"{tmp_path.name}_campaign"
+    campaign_dir.mkdir()
+    os.link(tmp_path / "middle" / "Totalsrun1.txt", campaign_dir / "Totals1run1.txt")
+    assert mozzie.generate.evict_cache(tmp_path, max_bytes=100) == []
+
+
+def test_run_custom_ledger(
+    fake_gdsims: Path, failing_gdsims: Path, working_dir: Path, tmp_path: Path
+):
+    """
+    Test that each run appends its resource use to the ledger.
+    """
+    ledger_path = tmp_path / "ledger"
+    params = (REPO_ROOT / "tests" / "test_data" / "test_params.txt").read_text()
+    params_path = tmp_path / "params.txt"
+    params_path.write_text(params)
+    mozzie.generate.run_custom(
+        fake_gdsims, working_dir, params_path, ledger_path=ledger_path
+    )
+    asyncio.run(
+        mozzie.generate.run_custom_async(
+            fake_gdsims, working_dir, params_path, ledger_path=ledger_path
+        )
+    )
+    totals_size = (working_dir / "output_files" / "Totals1001run1.txt").stat().st_size
+
+    failing_path = tmp_path / "failing.txt"
+    failing_path.write_text(params)
+    with pytest.raises(subprocess.CalledProcessError):
+        mozzie.generate.run_custom(
+            failing_gdsims, working_dir, failing_path, ledger_path=ledger_path
+        )
+
+    ledger = mozzie.generate.load_ledger(ledger_path)
+    assert list(ledger.columns) == mozzie.generate.ledger_columns
+    assert list(ledger["exit_status"]) == [0, 0, 3]
+    assert list(ledger["set_label"]) == [1001, 1001, 1001]
+    assert (ledger["max_rss_kb"] > 0).all()
+    assert (ledger["wall_time"] > 0).all()
+    assert (ledger["user_time"] >= 0).all()
+    # The failed run removed the old outputs first and wrote none of its own
+    assert list(ledger["totals_bytes"]) == [totals_size, totals_size, 0]
+    assert (ledger["output_bytes"][:2] > ledger["local_data_bytes"][:2]).all()
+    assert list(ledger["params"]) == ["params.txt", "params.txt", "failing.txt"]
+
+
+def test_ledger_columns(tmp_path: Path):
+    """
+    Test reading single columns and dropping a row cut short by a crash.
+    """
+    ledger_path = tmp_path / "ledger"
+    params_path = tmp_path / "params_3.txt"
+    params_path.write_text("1\n3\n")
+    usage = mozzie.generate.RunUsage(2.0, 1.5, 0.5, 1024)
+    mozzie.generate.append_ledger(ledger_path, params_path, tmp_path, 0, usage)
+    # A crash part way through the next row
+    with open(ledger_path / "set_label.bin", "ab") as file:
+        file.write(np.array([9], dtype="<i8").tobytes())
+    assert len(mozzie.generate.load_ledger(ledger_path)) == 1
+
+    mozzie.generate.append_ledger(ledger_path, params_path, tmp_path, 0, cached=True)
+    ledger = mozzie.generate.load_ledger(ledger_path, ["set_label", "wall_time"])
+    assert list(ledger.columns) == ["set_label", "wall_time"]
+    assert list(ledger["set_label"]) == [3, 3]
+    assert ledger["wall_time"][0] == 2.0
+    assert np.isnan(ledger["wall_time"][1])
+    with pytest.raises(ValueError, match="Unknown ledger columns: runtime"):
+        mozzie.generate.load_ledger(ledger_path, ["runtime"])
+
+
+def process_is_gone(pid: int) -> bool:
+    """Whether a process has exited, counting zombies waiting to be reaped."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except FileNotFoundError:
+        return True
+    return "State:\tZ" in status
+
+
+@pytest.mark.parametrize(
+    ("limits", "message"),
+    [
+        ({"timeout": 1.0}, "did not finish within"),
+        ({"stall_timeout": 1.0}, "did not grow"),
+    ],
+)
+def test_run_custom_hang(
+    hanging_gdsims: Path,
+    working_dir: Path,
+    tmp_path: Path,
+    limits: dict,
+    message: str,
+):
+    """
+    Test that a hung run is killed along with the processes it started.
+    """
+    params_path = tmp_path / "params.txt"
+    params_path.write_text("1\n7\n")
+    with pytest.raises(TimeoutError, match=message):
+        mozzie.generate.run_custom(hanging_gdsims, working_dir, params_path, **limits)
+
+    child_pid = int((tmp_path / "params.txt.child").read_text())
+    for _ in range(50):
+        if process_is_gone(child_pid):
+            break
+        time.sleep(0.1)
+    assert process_is_gone(child_pid)
+
+
+def test_run_custom_async_hang(hanging_gdsims: Path, working_dir: Path, tmp_path: Path):
+    """
+    Test that the asyncio runner also kills a run that stops making progress.
+    """
+    params_path = tmp_path / "params.txt"
+    params_path.write_text("1\n7\n")
+    with pytest.raises(TimeoutError, match="did not grow"):
+        asyncio.run(
+            mozzie.generate.run_custom_async(
+                hanging_gdsims, working_dir, params_path, stall_timeout=1.0
+            )
+        )
+
+
+def test_run_custom_async_polls_off_loop(
+    fake_gdsims: Path,
+    working_dir: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    Test that the asyncio runner reads the output files away from the event loop.
+    """
+    poll_child = mozzie.generate._poll_child
+    threads: list[threading.Thread] = []
+
+    def record_thread(process, watchdog=None, monitor=None):
+        if watchdog is not None:
+            threads.append(threading.current_thread())
+        return poll_child(process, watchdog, monitor)
+
+    monkeypatch.setattr(mozzie.generate, "_poll_child", record_thread)
+    params_path = tmp_path / "params.txt"
+    params_path.write_text("1\n7\n")
+    output = asyncio.run(
+        mozzie.generate.run_custom_async(
+            fake_gdsims, working_dir, params_path, stall_timeout=10.0
+        )
+    )
+    assert "Program run time" in output
+    assert threads
+    assert threading.main_thread() not in threads
+
+
+def test_run_custom_retries(flaky_gdsims: Path, working_dir: Path, tmp_path: Path):
+    """
+    Test that a failed run is tried again when retries are allowed.
+    """
+    params_path = tmp_path / "params.txt"
+    params_path.write_text("1\n7\n")
+    with pytest.raises(subprocess.CalledProcessError):
+        mozzie.generate.run_custom(flaky_gdsims, working_dir, params_path)
+
+    (tmp_path / "params.txt.attempted").unlink()
+    output = mozzie.generate.run_custom(
+        flaky_gdsims, working_dir, params_path, retries=1, retry_backoff=0.0
+    )
+    assert "Program run time" in output
+    # The partial output of the failed attempt is gone
+    outputs = mozzie.generate.output_files_for(working_dir, 7)
+    assert [p.name for p in outputs] == ["LocalData7run1.txt", "Totals7run1.txt"]
+
+
+def test_run_many_failure_report(
+    fake_gdsims: Path, failing_gdsims: Path, tmp_path: Path
+):
+    """
+    Test that failed runs are reported without stopping the other runs.
+    """
+    jobs = []
+    for label, script_path in enumerate([fake_gdsims, failing_gdsims, fake_gdsims]):
+        run_dir = tmp_path / f"run_{label}"
+        run_dir.mkdir()
+        params_path = run_dir / f"params_{label}.txt"
+        params_path.write_text(f"1\n{label}\n")
+        jobs.append((script_path, run_dir, params_path, None))
+
+    results = asyncio.run(
+        mozzie.generate.run_many(jobs, max_concurrency=1, return_exceptions=True)
+    )
+    assert isinstance(results[0], str)
+    assert "Program run time" in results[0]
+    assert isinstance(results[1], subprocess.CalledProcessError)
+    assert isinstance(results[2], str)
+    assert "Program run time" in results[2]
+
+    report = mozzie.generate.failure_report(jobs, results)
+    assert list(report["params"]) == ["params_1.txt"]
+    assert list(report["error"]) == ["CalledProcessError"]
+    assert "num_runs must be positive" in report["message"][0]
+
+
+def test_run_custom_logs(fake_gdsims: Path, working_dir: Path, tmp_path: Path):
+    """
+    Test that the output is streamed to log files and only its end is returned.
+    """
+    params_path = tmp_path / "params_3.txt"
+    params_path.write_text("3\n5\n")
+    log_dir = tmp_path / "logs"
+    output = mozzie.generate.run_custom(
+        fake_gdsims, working_dir, params_path, log_dir=log_dir
+    )
+    assert len(output) <= mozzie.generate.OUTPUT_TAIL_BYTES
+    assert output.endswith("Program run time: 0.0 s\n")
+
+    stdout_log = (log_dir / "params_3.stdout.log").read_text()
+    assert stdout_log.startswith("GDSiMS")
+    assert stdout_log.endswith(output)
+    assert stdout_log.count("\n") > 4000
+    assert (log_dir / "params_3.stderr.log").read_text().count("\n") == 4000
+
+    asyncio.run(
+        mozzie.generate.run_custom_async(
+            fake_gdsims, working_dir, params_path, log_dir=log_dir
+        )
+    )
+    assert (log_dir / "params_3.stdout.log").stat().st_size == 2 * len(stdout_log)
+
+
+def test_run_custom_stopping_rule(
+    fake_gdsims: Path, stopping_gdsims: Path, working_dir: Path, tmp_path: Path
+):
+    """
+    Test that a run is stopped and marked once its stopping rule holds.
+    """
+    params_path = tmp_path / "params.txt"
+    params_path.write_text("1\n7\n")
+    marker_path = mozzie.generate.stop_marker_path(working_dir, 7)
+    start_time = time.monotonic()
+    asyncio.run(
+        mozzie.generate.run_custom_async(
+            stopping_gdsims,
+            working_dir,
+            params_path,
+            stopping_rule=mozzie.generate.wild_allele_lost(3),
+        )
+    )
+    assert time.monotonic() - start_time < 5
+    stop_day = int(marker_path.read_text().split()[-1])
+    assert 7 <= stop_day < 100
+
+    # Without a rule the run goes on to the end and the marker is removed
+    mozzie.generate.run_custom(fake_gdsims, working_dir, params_path)
+    assert not marker_path.exists()
+
+
+def test_stopping_rule_with_replicates(
+    stopping_gdsims: Path, working_dir: Path, tmp_path: Path
+):
+    """
+    Test that a run with several replicates is not stopped part way through
+    them, which would leave it with fewer replicates than the other runs.
+    """
+    params_path = tmp_path / "params.txt"
+    params_path.write_text("2\n7\n")
+    with pytest.raises(ValueError, match="2 replicates"):
+        mozzie.generate.run_custom(
+            stopping_gdsims,
+            working_dir,
+            params_path,
+            stopping_rule=mozzie.generate.wild_allele_lost(3),
+        )
+    with pytest.raises(ValueError, match="2 replicates"):
+        asyncio.run(
+            mozzie.generate.run_custom_async(
+                stopping_gdsims,
+                working_dir,
+                params_path,
+                stopping_rule=mozzie.generate.wild_allele_lost(3),
+            )
+        )
+    assert mozzie.generate.output_files_for(working_dir, 7) == []
+    assert not (working_dir / "answers.txt").exists()
+
+
+def test_stopping_rules():
+    """
+    Test the stopping rules on a small Totals table.
+    """
+    totals = np.array(
+        [[0, 5, 0, 0, 0, 0, 0], [1, 0, 0, 1, 0, 0, 0], [2, 0, 0, 0, 0, 0, 0]]
+    )
+    assert mozzie.generate.wild_allele_lost(2)(totals)
+    assert not mozzie.generate.wild_allele_lost(3)(totals)
+    assert mozzie.generate.population_eliminated(1)(totals)
+    assert not mozzie.generate.population_eliminated(2)(totals)
+
+
+def test_benchmark(fake_gdsims: Path, tmp_path: Path):
+    """
+    Test that a benchmark times each run and fits a cost model to the timings.
+    """
+    params_path = tmp_path / "params.txt"
+    values = (REPO_ROOT / "tests" / "test_data" / "test_params.txt").read_text().split()
+    values[mozzie.generate.parameter_order.index("num_runs")] = "1"
+    params_path.write_text("\n".join(values) + "\n")
+    model_path = tmp_path / "model.json"
+
+    timings, model = mozzie.generate.benchmark(
+        fake_gdsims,
+        params_path,
+        tmp_path,
+        {"num_pat": [10, 20], "max_t": [100, 200]},
+        model_path=model_path,
+    )
+    assert len(timings) == 4
+    assert (timings["wall_time"] > 0).all()
+    np.testing.assert_allclose(timings["dispersal"], [1e4, 2e4, 4e4, 8e4], rtol=1e-12)
+    assert list(tmp_path.glob("gdsims_*")) == []
+
+    loaded = mozzie.generate.CostModel.load(model_path)
+    assert loaded == model
+    assert loaded.script_hash == mozzie.generate.file_hash(fake_gdsims)
+    predicted = loaded.predict(params_path)
+    assert 0 < predicted < 10 * timings["wall_time"].max()
+
+    with pytest.raises(ValueError, match="num_patches"):
+        mozzie.generate.benchmark(
+            fake_gdsims, params_path, tmp_path, {"num_patches": [1]}
+        )
+
+
+def test_params_table(tmp_path: Path):
+    """
+    Test that runs in a parameter table read like their own params files.
+    """
+    base = np.array(
+        (REPO_ROOT / "tests" / "test_data" / "test_params.txt").read_text().split(),
+        dtype=float,
+    )
+    values = np.tile(base, (2, 1))
+    values[:, mozzie.generate.parameter_order.index("set_label")] = [3, 1]
+    table_path = tmp_path / mozzie.generate.params_table_name
+    table = mozzie.generate.save_params_table(table_path, values)
+    np.testing.assert_array_equal(table[:, -1], [1, 3])
+
+    # Rows with a label already in the table replace the old ones
+    values[0, 0] = 2
+    table = mozzie.generate.save_params_table(table_path, values[:1])
+    np.testing.assert_array_equal(table[:, 0], [1, 2])
+    np.testing.assert_array_equal(mozzie.generate.load_params_table(table_path), table)
+
+    params_path = tmp_path / "params_3.txt"
+    text = mozzie.generate.read_params_text(params_path)
+    assert text.split()[0] == "2"
+    assert mozzie.generate.read_set_label(params_path) == 3
+    with mozzie.generate.params_file(params_path) as written:
+        assert written.read_text() == text
+        assert mozzie.generate.params_hash(params_path) == (
+            mozzie.generate.file_hash(written)
+        )
+    assert not params_path.exists()
+
+    with pytest.raises(FileNotFoundError, match=r"params_2\.txt"):
+        mozzie.generate.read_params_text(tmp_path / "params_2.txt")
+
+
+def test_coords_hash_from_store(tmp_path: Path):
+    """
+    Test that a coordinates file kept in a release site store hashes the same
+    as the file it stands for.
+    """
+    grid = np.array([[0.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    mozzie.coords.save_release_store(
+        tmp_path / mozzie.coords.release_store_name, grid, np.array([[1]]), 4
+    )
+    written = mozzie.coords.write_coords_files(grid, np.array([[1]]), tmp_path, 4)
+    coords_path = tmp_path / "coords" / "coords_4.csv"
+    assert mozzie.generate.coords_hash(coords_path) == mozzie.generate.file_hash(
+        written[0]
+    )
@@ -243,6 +243,48 @@ class TestReadLocalData:
         expected_timestamps = [0, 100, 200, 300, 400, 500, 600, 700, 800, 900, 1000]
         np.testing.assert_array_equal(timestamps, expected_timestamps)
 
+    def test_read_local_data_integer_counts(self):
+        """Test that whole number counts are stored as int32."""
+        data_3d, _timestamps = parsing.read_local_data(
+            TEST_DATA_DIR / "LocalDataExample.txt"
+        )
+        assert data_3d.dtype == np.int32
+
+    def test_read_local_data_unordered_rows(self, tmp_path):
+        """Test that rows out of order are put in place."""
+        lines = (TEST_DATA_DIR / "LocalDataExample.txt").read_text().splitlines()
+        rows = lines[2:]
+        np.random.default_rng(0).shuffle(rows)
+        file_path = tmp_path / "LocalData.txt"
+        file_path.write_text("\n".join(lines[:2] + rows) + "\n")
+
+        expected, expected_timestamps = parsing.read_local_data(
+            TEST_DATA_DIR / "LocalDataExample.txt"
+        )
+        data_3d, timestamps = parsing.read_local_data(file_path)
+        np.testing.assert_array_equal(data_3d, expected)
+        np.testing.assert_array_equal(timestamps, expected_timestamps)
+
+    @pytest.mark.parametrize(
+        ("drop", "repeat", "match"),
+        [
+            (3, None, "No data found for Day 0, Site 3"),
+            (None, 53, "Multiple entries found for Day 100, Site 2"),
+        ],
+    )
+    def test_read_local_data_missing_or_repeated(self, tmp_path, drop, repeat, match):
+        """Test that a missing or repeated (day, site) pair is reported."""
+        lines = (TEST_DATA_DIR / "LocalDataExample.txt").read_text().splitlines()
+        if drop is not None:
+            del lines[drop + 1]
+        if repeat is not None:
+            lines.append(lines[repeat])
+        file_path = tmp_path / "LocalData.txt"
+        file_path.write_text("\n".join(lines) + "\n")
+
+        with pytest.raises(ValueError, match=match):
+            parsing.read_local_data(file_path)
+
 
 class TestAggregateMosquitoData:
     def test_aggregate_2d_total_drive(self):
@@ -413,3 +455,44 @@ class TestAggregateMosquitoData:
         # Test drive_frequency aggregation
         result_drive_freq = parsing.aggregate_mosquito_data(data_3d, "drive_frequency")
         assert result_drive_freq.shape == (data_3d.shape[0], data_3d.shape[1])
+
+
+class TestCachedArrays:
+    def test_sidecars_are_reused(self, tmp_path):
+        """Test that a parsed file is loaded from its sidecars the second time."""
+        file_path = tmp_path / "LocalData1run1.txt"
+        file_path.write_text((TEST_DATA_DIR / "LocalDataExample.txt").read_text())
+
+        data_3d, timestamps = parsing.read_local_data(file_path, cache=True)
+        assert len(list(tmp_path.glob(".LocalData1run1.txt.*.npy"))) == 2
+
+        cached_3d, cached_timestamps = parsing.read_local_data(file_path, cache=True)
+        assert isinstance(cached_3d, np.memmap)
+        assert not cached_3d.flags.writeable
+        np.testing.assert_array_equal(cached_3d, data_3d)
+        np.testing.assert_array_equal(cached_timestamps, timestamps)
+
+    def test_changed_file_is_parsed_again(self, tmp_path):
+        """Test that the sidecars are replaced once the file changes."""
+        file_path = tmp_path / "Totals1run1.txt"
+        text = (TEST_DATA_DIR / "TotalsDataExample.txt").read_text()
+        file_path.write_text(text)
+        first = parsing.read_total_data(file_path, cache=True)
+
+        lines = text.splitlines()
+        file_path.write_text("\n".join(lines[:-1]) + "\n")
+        second = parsing.read_total_data(file_path, cache=True)
+        assert len(second) == len(first) - 1
+        pd.testing.assert_frame_equal(second, first.iloc[:-1])
+        assert len(list(tmp_path.glob(".Totals1run1.txt.*.npy"))) == 2
+
+    def test_without_cache(self, tmp_path):
+        """Test that no sidecars are written unless the cache is asked for."""
+        file_path = tmp_path / "Totals1run1.txt"
+        file_path.write_text((TEST_DATA_DIR / "TotalsDataExample.txt").read_text())
+
+        result = parsing.read_total_data(file_path)
+        assert list(tmp_path.iterdir()) == [file_path]
+        pd.testing.assert_frame_equal(
+            result, parsing.read_total_data(file_path, cache=True)
+        )